@@ -0,0 +1,172 @@
+"""
+Result packaging and served artifacts, shared by the API apps
+
+Parse results are assembled in memory (MemoryDataWriter) and packaged as a
+ZIP straight from there. Entries that are already compressed (jpeg/png
+crops) are stored as is, the rest is deflated. Packages served by url are
+kept in an ArtifactStore below the static dir, which drops them after a TTL
+and once it grows past a size cap.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+ZIP_STORED_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.gz')
+ZIP_SPOOL_MAX_SIZE = 64 * 1024 * 1024
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+
+ARTIFACT_TTL_SECONDS = int(os.getenv("MONKEYOCR_ARTIFACT_TTL", 3600))
+ARTIFACT_MAX_BYTES = int(os.getenv("MONKEYOCR_ARTIFACT_MAX_MB", 2048)) * 1024 * 1024
+
+
+def write_zip(files: dict, fileobj) -> None:
+    """Write `files` (archive name -> bytes) as a ZIP into `fileobj`."""
+    with zipfile.ZipFile(fileobj, 'w') as zipf:
+        for name in sorted(files):
+            compress_type = zipfile.ZIP_STORED if name.lower().endswith(ZIP_STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+            zipf.writestr(name, files[name], compress_type=compress_type)
+
+
+def zip_response(files: dict, filename: str) -> StreamingResponse:
+    """Stream `files` back as a ZIP download.
+
+    The archive is built in a spooled file, it only reaches the disk when it
+    is larger than ZIP_SPOOL_MAX_SIZE.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_SIZE)
+    write_zip(files, spool)
+    size = spool.tell()
+    spool.seek(0)
+
+    def body():
+        try:
+            while True:
+                chunk = spool.read(ZIP_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
+
+    return StreamingResponse(
+        body(),
+        media_type='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Content-Length': str(size),
+        },
+    )
+
+
+class ArtifactStore:
+    """Files and directories served under `url_prefix`, removed once older
+    than `ttl_seconds` or, oldest first, while the store is larger than
+    `max_bytes`. Cleanup runs on every put and on sweep(), it skips files
+    still being written and entries leased by a running request."""
+
+    def __init__(self, root: str, url_prefix: str, ttl_seconds: int = ARTIFACT_TTL_SECONDS,
+                 max_bytes: int = ARTIFACT_MAX_BYTES):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._leases = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def url(self, name: str) -> str:
+        return f"{self.url_prefix}/{name}"
+
+    @contextmanager
+    def lease(self, name: str):
+        """Keep the entry `name` out of cleanup while a request is using it,
+        its TTL starts over when the last lease ends."""
+        with self._lock:
+            self._leases[name] = self._leases.get(name, 0) + 1
+        try:
+            yield self.path(name)
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+                if not self._leases[name]:
+                    del self._leases[name]
+                    try:
+                        os.utime(self.path(name))
+                    except OSError:
+                        pass
+
+    def put_zip(self, name: str, files: dict) -> str:
+        """Package `files` as the ZIP artifact `name` and return its url."""
+        tmp_path = self.path(f".{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            write_zip(files, f)
+        os.replace(tmp_path, self.path(name))
+        self.sweep()
+        return self.url(name)
+
+    @staticmethod
+    def _entry_size(path: str) -> int:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def sweep(self) -> None:
+        """Remove expired artifacts, then the oldest ones until the store is
+        under its size cap."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name in self._leases:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                    size = self._entry_size(entry.path)
+                except OSError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    # still being written, unless left behind by a crashed request long ago
+                    if now - mtime > self.ttl_seconds:
+                        self._remove(entry.path)
+                    continue
+                if now - mtime > self.ttl_seconds:
+                    self._remove(entry.path)
+                    logger.info(f"Removed expired artifact {entry.name}")
+                else:
+                    entries.append((mtime, size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                logger.info(f"Removed artifact {os.path.basename(path)} to stay under the store size cap")
@@ -0,0 +1,48 @@
+"""
+Debug endpoints, shared by the API apps
+
+GET /debug/profile samples the stacks of every server thread for a few
+seconds and reports where the time and the new memory went. It only exists
+when MONKEYOCR_DEBUG_TOKEN is set, and callers pass that token in the
+X-Debug-Token header; one profile runs at a time.
+"""
+
+import asyncio
+import hmac
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import PlainTextResponse
+
+from magic_pdf.libs.profiling import sample_process
+
+DEBUG_TOKEN = os.getenv("MONKEYOCR_DEBUG_TOKEN")
+MAX_PROFILE_SECONDS = 300
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_response(seconds: float, output_format: str, token: Optional[str]) -> PlainTextResponse:
+    """Sample the live server for `seconds`.
+
+    Args:
+        seconds (float): sampling duration
+        output_format (str): `text` (top functions and allocations) or
+            `collapsed` (collapsed stacks for flamegraph.pl / speedscope)
+        token (str | None): value of the X-Debug-Token header
+    """
+    if not DEBUG_TOKEN or not hmac.compare_digest((token or '').encode(), DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+    if output_format not in ('text', 'collapsed'):
+        raise HTTPException(status_code=400, detail="format must be text or collapsed")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with _profile_lock:
+        report = await asyncio.get_event_loop().run_in_executor(
+            None, sample_process, seconds, 0.01, output_format == 'text'
+        )
+    return PlainTextResponse(report.to_collapsed() if output_format == 'collapsed' else report.to_text())
@@ -0,0 +1,349 @@
+"""
+Asynchronous parse jobs, shared by the API apps
+
+POST /jobs stores the upload and returns a job id at once, a bounded pool of
+workers drains the queue. Jobs live in a sqlite file next to their inputs
+and results, queued and interrupted jobs are picked up again after a
+restart. A job runs the parse of its app, its ZIP holds the same files as
+/parse/zip; GET /jobs/{id} reports the stage the job is in. Finished jobs
+are removed with their files after JOB_TTL_SECONDS.
+"""
+
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import FileResponse
+from loguru import logger
+from pydantic import BaseModel
+
+from api.artifacts import write_zip
+from magic_pdf.model.model_manager import model_manager
+
+JOB_WORKERS = int(os.getenv("MONKEYOCR_JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = 5
+JOB_TTL_SECONDS = int(os.getenv("MONKEYOCR_JOB_TTL", 24 * 3600))
+JOB_SWEEP_INTERVAL = 600
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    filename: str
+    split_pages: bool = False
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result_url: Optional[str] = None
+
+
+class JobStore:
+    """Jobs persisted in a sqlite file, safe to use from several threads."""
+
+    def __init__(self, path: str):
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, filename TEXT, input_path TEXT, split_pages INTEGER, '
+            'status TEXT, pages_done INTEGER DEFAULT 0, pages_total INTEGER, error TEXT, '
+            'result_path TEXT, created_at REAL, started_at REAL, finished_at REAL, stage TEXT)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        self._db.commit()
+
+    def create(self, job_id: str, filename: str, input_path: str, split_pages: bool) -> dict:
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, filename, input_path, split_pages, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, filename, input_path, int(split_pages), JOB_QUEUED, time.time()),
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._db.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+            self._db.commit()
+
+    def claim_next(self) -> Optional[dict]:
+        """Mark the oldest queued job as running and return it."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, pages_done = 0, stage = NULL WHERE id = ?',
+                (JOB_RUNNING, time.time(), row['id']),
+            )
+            self._db.commit()
+        return self.get(row['id'])
+
+    def requeue_running(self) -> int:
+        """Queue the jobs interrupted by a restart again."""
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE jobs SET status = ?, pages_done = 0, started_at = NULL, stage = NULL WHERE status = ?',
+                (JOB_QUEUED, JOB_RUNNING),
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def finished_before(self, before: float) -> list:
+        """Done and failed jobs finished before the `before` timestamp."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT * FROM jobs WHERE status IN (?, ?) AND finished_at < ?', (JOB_DONE, JOB_FAILED, before)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            self._db.commit()
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (status,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """Bounded pool of workers draining the job store.
+
+    Recognition of sync-only models is serialized by the model lock, so one
+    job's post-processing overlaps the next job's inference.
+    """
+
+    def __init__(self, root: str, result_url_prefix: str, workers: int = JOB_WORKERS,
+                 ttl_seconds: int = JOB_TTL_SECONDS):
+        self.root = root
+        self.result_url_prefix = result_url_prefix.rstrip('/')
+        self.workers = max(workers, 1)
+        self.ttl_seconds = ttl_seconds
+        self.parse_files = None
+        self.input_dir = os.path.join(root, 'inputs')
+        self.result_dir = os.path.join(root, 'results')
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(root, 'jobs.sqlite'))
+        self._wakeup = None
+        self._tasks = []
+
+    async def start(self, parse_files) -> None:
+        """Start the workers.
+
+        Args:
+            parse_files: the parse of the app, an async function
+                (file_bytes, file_ext, name, split_pages, progress, page_done) -> dict of archive name -> bytes,
+                the files /parse packages; progress(stage, pages_total) and page_done(), once for
+                every page post-processed, are called from worker threads
+        """
+        self.parse_files = parse_files
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted job(s)")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"Started {self.workers} job worker(s), {self.store.count(JOB_QUEUED)} job(s) queued")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+    def to_response(self, job: dict) -> JobResponse:
+        result_url = f"{self.result_url_prefix}/{job['id']}/result" if job['status'] == JOB_DONE else None
+        return JobResponse(
+            job_id=job['id'],
+            status=job['status'],
+            stage=job['stage'],
+            filename=job['filename'],
+            split_pages=bool(job['split_pages']),
+            pages_done=job['pages_done'] or 0,
+            pages_total=job['pages_total'],
+            error=job['error'],
+            created_at=job['created_at'],
+            started_at=job['started_at'],
+            finished_at=job['finished_at'],
+            result_url=result_url,
+        )
+
+    async def submit(self, file: UploadFile, split_pages: bool = False) -> JobResponse:
+        """Store the upload and queue a job for it."""
+        if not model_manager.get_model():
+            raise HTTPException(status_code=500, detail="Model not initialized")
+        allowed_extensions = {'.pdf', '.jpg', '.jpeg', '.png'}
+        file_ext = Path(file.filename or '').suffix.lower()
+        if file_ext not in allowed_extensions:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type: {file_ext}. Allowed: {', '.join(allowed_extensions)}"
+            )
+
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.input_dir, f"{job_id}{file_ext}")
+        content = await file.read()
+
+        def save_input():
+            with open(input_path, 'wb') as f:
+                f.write(content)
+            return self.store.create(job_id, file.filename, input_path, split_pages)
+
+        job = await asyncio.get_event_loop().run_in_executor(None, save_input)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.to_response(job)
+
+    def status(self, job_id: str) -> JobResponse:
+        job = self.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        return self.to_response(job)
+
+    def result(self, job_id: str) -> FileResponse:
+        job = self.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        if job['status'] == JOB_FAILED:
+            raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+        if job['status'] != JOB_DONE:
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        if not job['result_path'] or not os.path.exists(job['result_path']):
+            raise HTTPException(status_code=410, detail="Job result is no longer available")
+        return FileResponse(
+            job['result_path'],
+            media_type='application/zip',
+            filename=f"{Path(job['filename']).stem}_parsed.zip",
+        )
+
+    async def _worker(self, worker_id: int) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            job = await loop.run_in_executor(None, self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                await loop.run_in_executor(None, functools.partial(
+                    self.store.update, job['id'], status=JOB_FAILED, error=str(e), finished_at=time.time(),
+                ))
+
+    def sweep(self) -> None:
+        """Remove the jobs finished more than ttl_seconds ago with their input
+        and result, and files of jobs that no longer exist."""
+        before = time.time() - self.ttl_seconds
+        expired = self.store.finished_before(before)
+        for job in expired:
+            for path in (job['input_path'], job['result_path']):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self.store.delete(job['id'])
+        if expired:
+            logger.info(f"Removed {len(expired)} expired job(s)")
+        for dir_name in (self.input_dir, self.result_dir):
+            for entry in os.scandir(dir_name):
+                # inputs are named {job_id}{ext}, results {job_id}.zip, unfinished writes {job_id}.zip.tmp
+                job_id = entry.name.split('.')[0]
+                try:
+                    if entry.stat().st_mtime < before and self.store.get(job_id) is None:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    async def _sweeper(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception as e:
+                logger.error(f"Job sweep failed: {e}")
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+
+    async def _run(self, job: dict) -> None:
+        logger.info(f"Running job {job['id']} ({job['filename']})")
+        loop = asyncio.get_event_loop()
+
+        def read_input():
+            with open(job['input_path'], 'rb') as f:
+                return f.read()
+
+        job_pages = {'total': None, 'done': 0}
+        pages_lock = threading.Lock()
+
+        def progress(stage, pages_total=None):
+            fields = {'stage': stage}
+            if pages_total is not None:
+                job_pages['total'] = fields['pages_total'] = pages_total
+            self.store.update(job['id'], **fields)
+
+        def page_done():
+            # split pages are post-processed by concurrent threads
+            with pages_lock:
+                job_pages['done'] += 1
+                self.store.update(job['id'], pages_done=job_pages['done'])
+
+        file_bytes = await loop.run_in_executor(None, read_input)
+        name = Path(job['filename']).stem
+        split_pages = bool(job['split_pages'])
+        files = await self.parse_files(
+            file_bytes, Path(job['input_path']).suffix.lower(), name, split_pages, progress, page_done,
+        )
+
+        def save_result():
+            progress('package')
+            result_path = os.path.join(self.result_dir, f"{job['id']}.zip")
+            tmp_path = f"{result_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                write_zip(files, f)
+            os.replace(tmp_path, result_path)
+            os.remove(job['input_path'])
+            self.store.update(
+                job['id'], status=JOB_DONE, stage=None, pages_done=job_pages['total'] or 0,
+                result_path=result_path, finished_at=time.time(),
+            )
+
+        await loop.run_in_executor(None, save_result)
+        logger.info(f"Job {job['id']} done")
@@ -11,17 +11,21 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
 from tempfile import gettempdir
-import zipfile
 from loguru import logger
 import time
 
 from magic_pdf.model.model_manager import model_manager
+from magic_pdf.libs.metrics import REGISTRY, register_model_collector
+from api.artifacts import ArtifactStore, zip_response
+from api.debug import profile_response
+from api.jobs import JobResponse, JobRunner
+from api.streaming import streaming_parse_response
 import uvicorn
 import gradio as gr
 
@@ -52,14 +56,17 @@ async def lifespan(app: FastAPI):
     """Lifespan event handler"""
     # Startup
     try:
-        initialize_model()
+        register_model_collector(initialize_model())
     except Exception as e:
         logger.info(f"❌ Failed to initialize MonkeyOCR model: {e}")
         raise
+    artifact_store.sweep()
+    await job_runner.start(parse_result_files)
     
     yield
     
     # Shutdown
+    await job_runner.stop()
     global executor
     executor.shutdown(wait=True)
     logger.info("🔄 Application shutdown complete")
@@ -74,6 +81,8 @@ app = FastAPI(
 temp_dir = os.getenv("TMPDIR", gettempdir())
 logger.info(f"Using temporary directory: {temp_dir}")
 os.makedirs(temp_dir, exist_ok=True)
+artifact_store = ArtifactStore(os.path.join(temp_dir, "artifacts"), "/static/artifacts")
+job_runner = JobRunner(os.getenv("MONKEYOCR_JOBS_DIR", os.path.join(temp_dir, "monkeyocr_jobs")), "/jobs")
 app.mount("/static", StaticFiles(directory=temp_dir), name="static")
 
 @app.get("/")
@@ -86,6 +95,17 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "model_loaded": model_manager.is_model_loaded()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(seconds: float = Query(10), format: str = Query("text"),
+                        x_debug_token: Optional[str] = Header(None)):
+    """Sample the live server, needs MONKEYOCR_DEBUG_TOKEN"""
+    return await profile_response(seconds, format, x_debug_token)
+
 @app.post("/ocr/text", response_model=TaskResponse)
 async def extract_text(file: UploadFile = File(...)):
     """Extract text from image or PDF"""
@@ -111,14 +131,39 @@ async def parse_document_split(file: UploadFile = File(...)):
     """Parse complete document and split result by pages (PDF or image)"""
     return await parse_document_internal(file, split_pages=True)
 
-async def async_parse_file(input_file_path: str, output_dir: str, split_pages: bool = False):
+@app.post("/parse/zip")
+async def parse_document_zip(file: UploadFile = File(...), split_pages: bool = Query(False)):
+    """Parse document and return the results as a ZIP download"""
+    return await parse_document_internal(file, split_pages=split_pages, as_zip=True)
+
+@app.post("/parse/stream")
+async def parse_document_stream(file: UploadFile = File(...), format: str = Query("ndjson", description="ndjson or sse")):
+    """Parse document and stream every page as NDJSON (default) or Server-Sent Events"""
+    return await streaming_parse_response(file, format, artifact_store)
+
+@app.post("/jobs", response_model=JobResponse)
+async def submit_job(file: UploadFile = File(...), split_pages: bool = Query(False)):
+    """Submit a parse job, returns its id at once"""
+    return await job_runner.submit(file, split_pages)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status and progress of a parse job"""
+    return job_runner.status(job_id)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Download the results of a finished parse job"""
+    return job_runner.result(job_id)
+
+async def async_parse_file(file_bytes: bytes, file_ext: str, name_without_suff: str,
+                           result_writer, split_pages: bool = False, progress=None, page_done=None):
     """
-    Optimized async version of parse_file that breaks down processing into async chunks
+    Optimized async version of parse_file that breaks down processing into async chunks,
+    results are written through result_writer (a MemoryDataWriter),
+    progress(stage, pages_total) is called from a worker thread when a stage starts,
+    page_done() for every page post-processed
     """
-    import asyncio
-    from concurrent.futures import ThreadPoolExecutor
-    import uuid
-    
     monkey_ocr_model = model_manager.get_model()
     supports_async = model_manager.get_async_support()
     model_lock = model_manager.get_model_lock()
@@ -126,50 +171,17 @@ async def async_parse_file(input_file_path: str, output_dir: str, split_pages: b
     if not monkey_ocr_model:
         raise HTTPException(status_code=500, detail="Model not initialized")
     
-    # Get filename with unique identifier to avoid conflicts
-    name_without_suff = '.'.join(os.path.basename(input_file_path).split(".")[:-1])
-    unique_id = str(uuid.uuid4())[:8]  # Short unique identifier
-    safe_name = f"{name_without_suff}_{unique_id}"
-    
-    # Prepare output directory with unique name
-    local_image_dir = os.path.join(output_dir, safe_name, "images")
-    local_md_dir = os.path.join(output_dir, safe_name)
-    image_dir = os.path.basename(local_image_dir)
-    
-    # Create directories asynchronously with better error handling
-    def create_dir_safe(path):
-        try:
-            os.makedirs(path, exist_ok=True)
-        except FileExistsError:
-            # Directory already exists, that's fine
-            pass
-        except Exception as e:
-            logger.error(f"Failed to create directory {path}: {e}")
-            raise
-    
-    await asyncio.get_event_loop().run_in_executor(None, create_dir_safe, local_image_dir)
-    await asyncio.get_event_loop().run_in_executor(None, create_dir_safe, local_md_dir)
-    
-    logger.info(f"Output dir: {local_md_dir}")
-    
-    # Read file content in thread pool
-    def read_file_sync():
-        from magic_pdf.data.data_reader_writer import FileBasedDataReader
-        reader = FileBasedDataReader()
-        return reader.read(input_file_path)
-    
-    file_bytes = await asyncio.get_event_loop().run_in_executor(None, read_file_sync)
-    
     # Create dataset instance in thread pool
     def create_dataset_sync():
         from magic_pdf.data.dataset import PymuDocDataset, ImageDataset
-        file_extension = input_file_path.split(".")[-1].lower()
-        if file_extension == "pdf":
+        if file_ext == ".pdf":
             return PymuDocDataset(file_bytes)
         else:
             return ImageDataset(file_bytes)
     
     ds = await asyncio.get_event_loop().run_in_executor(None, create_dataset_sync)
+    if progress is not None:
+        await asyncio.get_event_loop().run_in_executor(None, progress, 'analyze', len(ds))
     
     # Run inference in thread pool
     def run_inference_sync():
@@ -190,27 +202,45 @@ async def async_parse_file(input_file_path: str, output_dir: str, split_pages: b
     
     parsing_time = time.time() - start_time
     logger.info(f"Parsing time: {parsing_time:.2f}s")
+    if progress is not None:
+        await asyncio.get_event_loop().run_in_executor(None, progress, 'post_process')
     
     # Process results asynchronously
     await process_inference_results_async(
-        infer_result, output_dir, safe_name,
-        local_image_dir, local_md_dir, image_dir, split_pages, monkey_ocr_model
+        infer_result, name_without_suff, result_writer, split_pages, monkey_ocr_model, page_done
     )
-    
-    return local_md_dir
 
-async def process_inference_results_async(infer_result, output_dir, name_without_suff,
-                                        local_image_dir, local_md_dir, image_dir, split_pages, monkey_ocr_model):
+async def parse_result_files(file_bytes: bytes, file_ext: str, name: str, split_pages: bool = False,
+                             progress=None, page_done=None) -> dict:
+    """
+    Parse a document into archive name -> bytes, the files /parse packages,
+    served from the result cache for documents already parsed
+    """
+    monkey_ocr_model = model_manager.get_model()
+    loop = asyncio.get_event_loop()
+
+    # Documents already parsed with the same config are served from the result cache
+    result_cache = monkey_ocr_model.result_cache
+    if result_cache is not None:
+        cache_key = result_cache.make_key(file_bytes, split_pages=split_pages)
+        result_files = await loop.run_in_executor(None, result_cache.get, cache_key, name)
+        if result_files is not None:
+            logger.info(f"Result cache hit for {name}")
+            return result_files
+
+    from magic_pdf.data.data_reader_writer import MemoryDataWriter
+    result_writer = MemoryDataWriter()
+    await async_parse_file(file_bytes, file_ext, name, result_writer, split_pages, progress, page_done)
+    result_files = result_writer.files()
+    if result_cache is not None:
+        await loop.run_in_executor(None, result_cache.put, cache_key, name, result_files)
+    return result_files
+
+async def process_inference_results_async(infer_result, name_without_suff, result_writer, split_pages, monkey_ocr_model,
+                                          page_done=None):
     """
     Process inference results asynchronously
     """
-    from magic_pdf.data.data_reader_writer import FileBasedDataWriter
-    
-    def create_writers():
-        image_writer = FileBasedDataWriter(local_image_dir)
-        md_writer = FileBasedDataWriter(local_md_dir)
-        return image_writer, md_writer
-    
     # Check if infer_result is a list (split pages)
     if isinstance(infer_result, list):
         logger.info(f"Processing {len(infer_result)} pages separately...")
@@ -219,89 +249,65 @@ async def process_inference_results_async(infer_result, output_dir, name_without
         tasks = []
         for page_idx, page_infer_result in enumerate(infer_result):
             task = process_single_page_async(
-                page_infer_result, page_idx, output_dir, name_without_suff, monkey_ocr_model
+                page_infer_result, page_idx, name_without_suff, result_writer, monkey_ocr_model, page_done
             )
             tasks.append(task)
         
         # Wait for all page processing to complete
         await asyncio.gather(*tasks)
         
-        logger.info(f"All {len(infer_result)} pages processed and saved in separate subdirectories")
+        logger.info(f"All {len(infer_result)} pages processed")
     else:
         # Process single result
         logger.info("Processing as single result...")
         await process_single_result_async(
-            infer_result, name_without_suff, local_image_dir, local_md_dir, image_dir, monkey_ocr_model
+            infer_result, name_without_suff, result_writer, monkey_ocr_model, page_done
         )
 
-async def process_single_page_async(page_infer_result, page_idx, output_dir, name_without_suff, monkey_ocr_model):
+async def process_single_page_async(page_infer_result, page_idx, name_without_suff, result_writer, monkey_ocr_model,
+                                    page_done=None):
     """
-    Process a single page result asynchronously
+    Process a single page result asynchronously, written below page_{page_idx}/
     """
-    import uuid
-    
-    page_dir_name = f"page_{page_idx}"
-    page_local_image_dir = os.path.join(output_dir, name_without_suff, page_dir_name, "images")
-    page_local_md_dir = os.path.join(output_dir, name_without_suff, page_dir_name)
-    page_image_dir = os.path.basename(page_local_image_dir)
-    
-    # Create page-specific directories with better error handling
-    def create_dir_safe(path):
-        try:
-            os.makedirs(path, exist_ok=True)
-        except FileExistsError:
-            # Directory already exists, that's fine
-            pass
-        except Exception as e:
-            logger.error(f"Failed to create page directory {path}: {e}")
-            raise
-    
-    await asyncio.get_event_loop().run_in_executor(None, create_dir_safe, page_local_image_dir)
-    await asyncio.get_event_loop().run_in_executor(None, create_dir_safe, page_local_md_dir)
-    
     def process_page_sync():
-        from magic_pdf.data.data_reader_writer import FileBasedDataWriter
-        
         # Create page-specific writers
-        page_image_writer = FileBasedDataWriter(page_local_image_dir)
-        page_md_writer = FileBasedDataWriter(page_local_md_dir)
+        page_md_writer = result_writer.sub_writer(f"page_{page_idx}")
+        page_image_writer = page_md_writer.sub_writer("images")
         
-        logger.info(f"Processing page {page_idx} - Output dir: {page_local_md_dir}")
+        logger.info(f"Processing page {page_idx}")
         
         # Pipeline processing for this page
-        page_pipe_result = page_infer_result.pipe_ocr_mode(page_image_writer, MonkeyOCR_model=monkey_ocr_model)
+        page_pipe_result = page_infer_result.pipe_ocr_mode(page_image_writer, MonkeyOCR_model=monkey_ocr_model,
+                                                           page_done=page_done)
         
         # Save page-specific results
-        page_infer_result.draw_model(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_model.pdf"))
-        page_pipe_result.draw_layout(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_layout.pdf"))
-        page_pipe_result.draw_span(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_spans.pdf"))
-        page_pipe_result.dump_md(page_md_writer, f"{name_without_suff}_page_{page_idx}.md", page_image_dir)
-        page_pipe_result.dump_content_list(page_md_writer, f"{name_without_suff}_page_{page_idx}_content_list.json", page_image_dir)
+        page_infer_result.draw_model(f"{name_without_suff}_page_{page_idx}_model.pdf", writer=page_md_writer)
+        page_pipe_result.draw_layout(f"{name_without_suff}_page_{page_idx}_layout.pdf", writer=page_md_writer)
+        page_pipe_result.draw_span(f"{name_without_suff}_page_{page_idx}_spans.pdf", writer=page_md_writer)
+        page_pipe_result.dump_md(page_md_writer, f"{name_without_suff}_page_{page_idx}.md", "images")
+        page_pipe_result.dump_content_list(page_md_writer, f"{name_without_suff}_page_{page_idx}_content_list.json", "images")
         page_pipe_result.dump_middle_json(page_md_writer, f'{name_without_suff}_page_{page_idx}_middle.json')
     
     # Run page processing in thread pool
     await asyncio.get_event_loop().run_in_executor(None, process_page_sync)
 
-async def process_single_result_async(infer_result, name_without_suff, local_image_dir, local_md_dir, image_dir, monkey_ocr_model):
+async def process_single_result_async(infer_result, name_without_suff, result_writer, monkey_ocr_model, page_done=None):
     """
     Process single result asynchronously
     """
     def process_single_sync():
-        from magic_pdf.data.data_reader_writer import FileBasedDataWriter
-        
-        image_writer = FileBasedDataWriter(local_image_dir)
-        md_writer = FileBasedDataWriter(local_md_dir)
+        image_writer = result_writer.sub_writer("images")
         
         # Pipeline processing for single result
-        pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=monkey_ocr_model)
+        pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=monkey_ocr_model, page_done=page_done)
         
         # Save single result
-        infer_result.draw_model(os.path.join(local_md_dir, f"{name_without_suff}_model.pdf"))
-        pipe_result.draw_layout(os.path.join(local_md_dir, f"{name_without_suff}_layout.pdf"))
-        pipe_result.draw_span(os.path.join(local_md_dir, f"{name_without_suff}_spans.pdf"))
-        pipe_result.dump_md(md_writer, f"{name_without_suff}.md", image_dir)
-        pipe_result.dump_content_list(md_writer, f"{name_without_suff}_content_list.json", image_dir)
-        pipe_result.dump_middle_json(md_writer, f'{name_without_suff}_middle.json')
+        infer_result.draw_model(f"{name_without_suff}_model.pdf", writer=result_writer)
+        pipe_result.draw_layout(f"{name_without_suff}_layout.pdf", writer=result_writer)
+        pipe_result.draw_span(f"{name_without_suff}_spans.pdf", writer=result_writer)
+        pipe_result.dump_md(result_writer, f"{name_without_suff}.md", "images")
+        pipe_result.dump_content_list(result_writer, f"{name_without_suff}_content_list.json", "images")
+        pipe_result.dump_middle_json(result_writer, f'{name_without_suff}_middle.json')
     
     # Run processing in thread pool
     await asyncio.get_event_loop().run_in_executor(None, process_single_sync)
@@ -424,8 +430,12 @@ async def async_single_task_recognition(input_file_path: str, output_dir: str, t
     
     return local_md_dir
 
-async def parse_document_internal(file: UploadFile, split_pages: bool = False):
-    """Internal function to parse document with optional page splitting"""
+async def parse_document_internal(file: UploadFile, split_pages: bool = False, as_zip: bool = False):
+    """Internal function to parse document with optional page splitting.
+
+    Results are assembled in memory and packaged as a ZIP, returned directly
+    when as_zip is set, otherwise kept in the artifact store for download.
+    """
     try:
         monkey_ocr_model = model_manager.get_model()
         if not monkey_ocr_model:
@@ -444,120 +454,41 @@ async def parse_document_internal(file: UploadFile, split_pages: bool = False):
         # Get original filename without extension
         original_name = '.'.join(file.filename.split('.')[:-1])
         
-        # Save uploaded file temporarily with unique name to avoid conflicts
         import uuid
         unique_suffix = str(uuid.uuid4())[:8]
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext_with_dot, prefix=f"upload_{unique_suffix}_") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        file_bytes = await file.read()
+        loop = asyncio.get_event_loop()
+        result_files = await parse_result_files(file_bytes, file_ext_with_dot, original_name, split_pages)
         
-        try:
-            # Create output directory with unique name
-            output_dir = tempfile.mkdtemp(prefix=f"monkeyocr_parse_{unique_suffix}_")
-            
-            # Use optimized async parse function
-            result_dir = await async_parse_file(temp_file_path, output_dir, split_pages)
-            
-            # List generated files
-            files = []
-            if os.path.exists(result_dir):
-                for root, dirs, filenames in os.walk(result_dir):
-                    for filename in filenames:
-                        rel_path = os.path.relpath(os.path.join(root, filename), result_dir)
-                        files.append(rel_path)
-            
-            # Create download URL with original filename and timestamp
-            suffix = "_split" if split_pages else "_parsed"
-            timestamp = int(time.time() * 1000)  # Use milliseconds for better uniqueness
-            zip_filename = f"{original_name}{suffix}_{timestamp}_{unique_suffix}.zip"
-            zip_path = os.path.join(temp_dir, zip_filename)
-            
-            # Create ZIP file asynchronously
-            await create_zip_file_async(result_dir, zip_path, original_name, split_pages)
-            
-            download_url = f"/static/{zip_filename}"
-            
-            # Determine file type for response message
-            file_type = "PDF" if file_ext_with_dot == '.pdf' else "image"
-            parse_type = "with page splitting" if split_pages else "standard"
-            
-            return ParseResponse(
-                success=True,
-                message=f"{file_type} parsing ({parse_type}) completed successfully",
-                output_dir=result_dir,
-                files=files,
-                download_url=download_url
-            )
-            
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except Exception as cleanup_error:
-                logger.warning(f"Failed to cleanup temp file {temp_file_path}: {cleanup_error}")
+        # Create download name with original filename and timestamp
+        suffix = "_split" if split_pages else "_parsed"
+        timestamp = int(time.time() * 1000)  # Use milliseconds for better uniqueness
+        zip_filename = f"{original_name}{suffix}_{timestamp}_{unique_suffix}.zip"
+        
+        if as_zip:
+            return await loop.run_in_executor(None, zip_response, result_files, zip_filename)
+        
+        # Create ZIP file asynchronously
+        download_url = await loop.run_in_executor(
+            None, artifact_store.put_zip, zip_filename, result_files
+        )
+        
+        # Determine file type for response message
+        file_type = "PDF" if file_ext_with_dot == '.pdf' else "image"
+        parse_type = "with page splitting" if split_pages else "standard"
+        
+        return ParseResponse(
+            success=True,
+            message=f"{file_type} parsing ({parse_type}) completed successfully",
+            files=sorted(result_files),
+            download_url=download_url
+        )
             
     except Exception as e:
         logger.error(f"Parsing failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Parsing failed: {str(e)}")
 
-async def create_zip_file_async(result_dir, zip_path, original_name, split_pages):
-    """Create ZIP file asynchronously"""
-    def create_zip_sync():
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, filenames in os.walk(result_dir):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
-                    rel_path = os.path.relpath(file_path, result_dir)
-                    
-                    if split_pages:
-                        # For split pages, maintain the page directory structure
-                        # but add original name prefix
-                        if rel_path.startswith('page_'):
-                            # Keep the page structure: page_0/filename -> page_0/original_name_filename
-                            parts = rel_path.split('/', 1)
-                            if len(parts) == 2:
-                                page_dir, filename_part = parts
-                                if filename_part.startswith('images/'):
-                                    # Handle images: page_0/images/img.jpg -> page_0/images/original_name_img.jpg
-                                    img_name = filename_part.replace('images/', '')
-                                    new_filename = f"{page_dir}/images/{img_name}"
-                                else:
-                                    # Handle other files in page directories
-                                    new_filename = f"{page_dir}/{original_name}_{filename_part}"
-                            else:
-                                new_filename = f"{original_name}_{rel_path}"
-                        else:
-                            new_filename = f"{original_name}_{rel_path}"
-                    else:
-                        # Handle different file types
-                        if filename.endswith('.md'):
-                            new_filename = f"{original_name}.md"
-                        elif filename.endswith('_content_list.json'):
-                            new_filename = f"{original_name}_content_list.json"
-                        elif filename.endswith('_middle.json'):
-                            new_filename = f"{original_name}_middle.json"
-                        elif filename.endswith('_model.pdf'):
-                            new_filename = f"{original_name}_model.pdf"
-                        elif filename.endswith('_layout.pdf'):
-                            new_filename = f"{original_name}_layout.pdf"
-                        elif filename.endswith('_spans.pdf'):
-                            new_filename = f"{original_name}_spans.pdf"
-                        else:
-                            # For images and other files, keep relative path structure but rename
-                            if 'images/' in rel_path:
-                                # Keep images in images subfolder with original name prefix
-                                image_name = os.path.basename(rel_path)
-                                new_filename = f"images/{image_name}"
-                            else:
-                                new_filename = f"{original_name}_{filename}"
-                    
-                    zipf.write(file_path, new_filename)
-    
-    # Run ZIP creation in thread pool to avoid blocking
-    await asyncio.get_event_loop().run_in_executor(None, create_zip_sync)
-
 async def perform_ocr_task(file: UploadFile, task_type: str) -> TaskResponse:
     """Perform OCR task on uploaded file"""
     try:
@@ -9,16 +9,15 @@ import sys
 import tempfile
 import time
 import uuid
-import zipfile
 import asyncio
 from typing import Optional, List
 from pathlib import Path
 from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
 from tempfile import gettempdir
@@ -30,6 +29,11 @@ import gradio as gr
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from magic_pdf.model.model_manager import model_manager
+from magic_pdf.libs.metrics import REGISTRY, register_model_collector
+from api.artifacts import ArtifactStore, zip_response
+from api.debug import profile_response
+from api.jobs import JobResponse, JobRunner
+from api.streaming import streaming_parse_response
 
 # Response models
 class TaskResponse(BaseModel):
@@ -64,12 +68,15 @@ def initialize_model():
 async def lifespan(app: FastAPI):
     """Lifespan event handler"""
     try:
-        initialize_model()
+        register_model_collector(initialize_model())
         logger.info("✅ MonkeyOCR model initialized")
     except Exception as e:
         logger.error(f"❌ Model initialization failed: {e}")
         raise
+    artifact_store.sweep()
+    await job_runner.start(parse_result_files)
     yield
+    await job_runner.stop()
     executor.shutdown(wait=True)
     logger.info("🔄 Shutdown complete")
 
@@ -97,6 +104,8 @@ app = FastAPI(
 # Setup temp directory
 temp_dir = os.getenv("TMPDIR", gettempdir())
 os.makedirs(temp_dir, exist_ok=True)
+artifact_store = ArtifactStore(os.path.join(temp_dir, "artifacts"), "/static/artifacts")
+job_runner = JobRunner(os.getenv("MONKEYOCR_JOBS_DIR", os.path.join(temp_dir, "monkeyocr_jobs")), "/jobs")
 app.mount("/static", StaticFiles(directory=temp_dir), name="static")
 
 # ============== Health & Status ==============
@@ -115,6 +124,17 @@ async def health_check():
         "timestamp": time.time()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(seconds: float = Query(10), format: str = Query("text"),
+                        x_debug_token: Optional[str] = Header(None)):
+    """Sample the live server, needs MONKEYOCR_DEBUG_TOKEN"""
+    return await profile_response(seconds, format, x_debug_token)
+
 @app.get("/gpu/status", response_model=GPUStatus)
 async def gpu_status():
     """获取 GPU 状态"""
@@ -173,6 +193,31 @@ async def parse_document_split(file: UploadFile = File(...)):
     """文档解析 (按页分割)"""
     return await parse_document_internal(file, split_pages=True)
 
+@app.post("/parse/zip")
+async def parse_document_zip(file: UploadFile = File(...), split_pages: bool = Query(False)):
+    """文档解析 (直接返回 ZIP)"""
+    return await parse_document_internal(file, split_pages=split_pages, as_zip=True)
+
+@app.post("/parse/stream")
+async def parse_document_stream(file: UploadFile = File(...), format: str = Query("ndjson", description="ndjson or sse")):
+    """文档解析 (逐页流式返回, NDJSON / SSE)"""
+    return await streaming_parse_response(file, format, artifact_store)
+
+@app.post("/jobs", response_model=JobResponse)
+async def submit_job(file: UploadFile = File(...), split_pages: bool = Query(False)):
+    """提交异步解析任务 (立即返回任务 ID)"""
+    return await job_runner.submit(file, split_pages)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """查询任务状态与进度"""
+    return job_runner.status(job_id)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """下载任务结果 (ZIP)"""
+    return job_runner.result(job_id)
+
 # ============== Internal Functions ==============
 
 TASK_INSTRUCTIONS = {
@@ -236,8 +281,62 @@ async def perform_ocr_task(file: UploadFile, task_type: str) -> TaskResponse:
         logger.error(f"OCR error: {e}")
         return TaskResponse(success=False, task_type=task_type, content="", message=str(e))
 
-async def parse_document_internal(file: UploadFile, split_pages: bool = False) -> ParseResponse:
-    """Parse document"""
+async def parse_result_files(file_bytes: bytes, file_ext: str, original_name: str, split_pages: bool = False,
+                             progress=None, page_done=None) -> dict:
+    """Parse a document into archive name -> bytes, the files /parse packages, served from the result cache
+    for documents already parsed; progress(stage, pages_total) is called from a worker thread when a stage starts,
+    page_done() for every page post-processed"""
+    model = model_manager.get_model()
+    
+    def do_parse():
+        from magic_pdf.data.data_reader_writer import MemoryDataWriter
+        from magic_pdf.data.dataset import PymuDocDataset, ImageDataset
+        from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
+        
+        if file_ext == '.pdf':
+            ds = PymuDocDataset(file_bytes)
+        else:
+            ds = ImageDataset(file_bytes)
+        
+        md_writer = MemoryDataWriter()
+        
+        if progress is not None:
+            progress('analyze', len(ds))
+        infer_result = ds.apply(doc_analyze_llm, MonkeyOCR_model=model, split_pages=split_pages)
+        if progress is not None:
+            progress('post_process')
+        
+        if isinstance(infer_result, list):
+            for idx, page_result in enumerate(infer_result):
+                page_writer = md_writer.sub_writer(f"page_{idx}")
+                pipe_result = page_result.pipe_ocr_mode(page_writer.sub_writer("images"), MonkeyOCR_model=model,
+                                                        page_done=page_done)
+                pipe_result.dump_md(page_writer, f"{original_name}_page_{idx}.md", "images")
+        else:
+            pipe_result = infer_result.pipe_ocr_mode(md_writer.sub_writer("images"), MonkeyOCR_model=model,
+                                                     page_done=page_done)
+            infer_result.draw_model(f"{original_name}_model.pdf", writer=md_writer)
+            pipe_result.draw_layout(f"{original_name}_layout.pdf", writer=md_writer)
+            pipe_result.dump_md(md_writer, f"{original_name}.md", "images")
+            pipe_result.dump_middle_json(md_writer, f"{original_name}_middle.json")
+        
+        return md_writer.files()
+    
+    loop = asyncio.get_event_loop()
+    result_cache = model.result_cache
+    if result_cache is not None:
+        cache_key = result_cache.make_key(file_bytes, split_pages=split_pages, output='aio')
+        result_files = await loop.run_in_executor(None, result_cache.get, cache_key, original_name)
+        if result_files is not None:
+            return result_files
+    
+    result_files = await loop.run_in_executor(None, do_parse)
+    if result_cache is not None:
+        await loop.run_in_executor(None, result_cache.put, cache_key, original_name, result_files)
+    return result_files
+
+async def parse_document_internal(file: UploadFile, split_pages: bool = False, as_zip: bool = False):
+    """Parse document, results are packaged in memory and returned as ZIP (as_zip) or stored for download"""
     try:
         model = model_manager.get_model()
         if not model:
@@ -251,88 +350,28 @@ async def parse_document_internal(file: UploadFile, split_pages: bool = False) -
         
         original_name = Path(file.filename).stem
         unique_id = str(uuid.uuid4())[:8]
+        file_bytes = await file.read()
         
-        # Save temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext, prefix=f"parse_{unique_id}_") as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+        result_files = await parse_result_files(file_bytes, file_ext, original_name, split_pages)
+        loop = asyncio.get_event_loop()
         
-        try:
-            output_dir = tempfile.mkdtemp(prefix=f"monkeyocr_{unique_id}_")
-            
-            # Parse
-            def do_parse():
-                from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
-                from magic_pdf.data.dataset import PymuDocDataset, ImageDataset
-                from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
-                
-                name = f"{original_name}_{unique_id}"
-                local_md_dir = os.path.join(output_dir, name)
-                local_image_dir = os.path.join(local_md_dir, "images")
-                os.makedirs(local_image_dir, exist_ok=True)
-                
-                reader = FileBasedDataReader()
-                file_bytes = reader.read(tmp_path)
-                
-                if file_ext == '.pdf':
-                    ds = PymuDocDataset(file_bytes)
-                else:
-                    ds = ImageDataset(file_bytes)
-                
-                image_writer = FileBasedDataWriter(local_image_dir)
-                md_writer = FileBasedDataWriter(local_md_dir)
-                
-                infer_result = ds.apply(doc_analyze_llm, MonkeyOCR_model=model, split_pages=split_pages)
-                
-                if isinstance(infer_result, list):
-                    for idx, page_result in enumerate(infer_result):
-                        page_dir = os.path.join(local_md_dir, f"page_{idx}")
-                        os.makedirs(os.path.join(page_dir, "images"), exist_ok=True)
-                        page_writer = FileBasedDataWriter(page_dir)
-                        page_img_writer = FileBasedDataWriter(os.path.join(page_dir, "images"))
-                        pipe_result = page_result.pipe_ocr_mode(page_img_writer, MonkeyOCR_model=model)
-                        pipe_result.dump_md(page_writer, f"{original_name}_page_{idx}.md", "images")
-                else:
-                    pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=model)
-                    infer_result.draw_model(os.path.join(local_md_dir, f"{original_name}_model.pdf"))
-                    pipe_result.draw_layout(os.path.join(local_md_dir, f"{original_name}_layout.pdf"))
-                    pipe_result.dump_md(md_writer, f"{original_name}.md", "images")
-                    pipe_result.dump_middle_json(md_writer, f"{original_name}_middle.json")
-                
-                return local_md_dir
-            
-            result_dir = await asyncio.get_event_loop().run_in_executor(None, do_parse)
-            
-            # List files
-            files = []
-            for root, dirs, filenames in os.walk(result_dir):
-                for fn in filenames:
-                    rel = os.path.relpath(os.path.join(root, fn), result_dir)
-                    files.append(rel)
-            
-            # Create ZIP
-            timestamp = int(time.time() * 1000)
-            zip_name = f"{original_name}_parsed_{timestamp}.zip"
-            zip_path = os.path.join(temp_dir, zip_name)
-            
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for root, dirs, filenames in os.walk(result_dir):
-                    for fn in filenames:
-                        fp = os.path.join(root, fn)
-                        arcname = os.path.relpath(fp, result_dir)
-                        zf.write(fp, arcname)
-            
-            return ParseResponse(
-                success=True,
-                message="Parsing completed",
-                output_dir=result_dir,
-                files=files,
-                download_url=f"/static/{zip_name}"
-            )
-            
-        finally:
-            os.unlink(tmp_path)
+        # Create ZIP
+        timestamp = int(time.time() * 1000)
+        zip_name = f"{original_name}_parsed_{timestamp}_{unique_id}.zip"
+        
+        if as_zip:
+            return await loop.run_in_executor(None, zip_response, result_files, zip_name)
+        
+        download_url = await loop.run_in_executor(
+            None, artifact_store.put_zip, zip_name, result_files
+        )
+        
+        return ParseResponse(
+            success=True,
+            message="Parsing completed",
+            files=sorted(result_files),
+            download_url=download_url
+        )
             
     except Exception as e:
         logger.error(f"Parse error: {e}")
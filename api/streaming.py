@@ -0,0 +1,171 @@
+"""
+Streaming document parsing, shared by the API apps
+
+The document is processed in page chunks (1, 2, 4, ... up to
+STREAM_MAX_CHUNK_PAGES pages), every page is emitted as soon as its chunk is
+post-processed, so the first page arrives long before the last one is
+recognized. Events are sent as NDJSON lines or Server-Sent Events.
+
+Every chunk is parsed as a document of its own pages. Paragraphs are merged
+across the pages of a chunk only, a paragraph running over a chunk boundary
+is streamed as two paragraphs where /parse returns one.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import fitz
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from magic_pdf.model.model_manager import model_manager
+
+STREAM_FIRST_CHUNK_PAGES = 1
+STREAM_MAX_CHUNK_PAGES = 16
+
+STREAM_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+
+def iter_page_chunks(page_count, first_chunk=STREAM_FIRST_CHUNK_PAGES, max_chunk=STREAM_MAX_CHUNK_PAGES):
+    """Inclusive (start, end) page ranges, doubling in size so the first page
+    comes back quickly while later chunks still batch the models well."""
+    start = 0
+    size = max(first_chunk, 1)
+    while start < page_count:
+        end = min(start + size, page_count) - 1
+        yield start, end
+        start = end + 1
+        size = min(size * 2, max_chunk)
+
+
+def page_range_dataset(ds, start_page, end_page):
+    """A dataset of the pages start_page..end_page (inclusive) of ds, so
+    analyzing and post-processing a chunk only costs its own pages."""
+    from magic_pdf.data.dataset import PymuDocDataset
+
+    if start_page == 0 and end_page == len(ds) - 1:
+        return ds
+    chunk_doc = fitz.open()
+    chunk_doc.insert_pdf(fitz.open('pdf', ds.data_bits()), from_page=start_page, to_page=end_page)
+    return PymuDocDataset(chunk_doc.tobytes())
+
+
+def format_event(event: dict, fmt: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if fmt == 'sse':
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def stream_parse_events(file_bytes: bytes, file_ext: str, output_dir: str, image_url_prefix: str):
+    """Parse a document and yield one event per page.
+
+    Events:
+        start: {'event': 'start', 'pages': N}
+        page:  {'event': 'page', 'page_idx', 'markdown', 'content_list'}
+        done:  {'event': 'done', 'pages': N, 'elapsed': seconds}
+        error: {'event': 'error', 'message'}
+    """
+    from magic_pdf.data.data_reader_writer import BufferedDataWriter, FileBasedDataWriter
+    from magic_pdf.data.dataset import ImageDataset, PymuDocDataset
+    from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
+
+    monkey_ocr_model = model_manager.get_model()
+    supports_async = model_manager.get_async_support()
+    model_lock = model_manager.get_model_lock()
+    loop = asyncio.get_event_loop()
+    start_time = time.time()
+
+    try:
+        def create_dataset_sync():
+            if file_ext == '.pdf':
+                return PymuDocDataset(file_bytes)
+            return ImageDataset(file_bytes)
+
+        ds = await loop.run_in_executor(None, create_dataset_sync)
+        page_count = len(ds)
+        yield {'event': 'start', 'pages': page_count}
+
+        local_image_dir = os.path.join(output_dir, 'images')
+        image_writer = BufferedDataWriter(FileBasedDataWriter(local_image_dir))
+
+        for start_page, end_page in iter_page_chunks(page_count):
+            chunk_ds = await loop.run_in_executor(None, page_range_dataset, ds, start_page, end_page)
+
+            def run_inference_sync():
+                return chunk_ds.apply(doc_analyze_llm, MonkeyOCR_model=monkey_ocr_model)
+
+            if supports_async:
+                infer_result = await loop.run_in_executor(None, run_inference_sync)
+            else:
+                async with model_lock:
+                    infer_result = await loop.run_in_executor(None, run_inference_sync)
+
+            def post_process_sync():
+                pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=monkey_ocr_model)
+                events = []
+                for chunk_page_idx in range(len(chunk_ds)):
+                    content_list = pipe_result.get_page_content_list(chunk_page_idx, image_url_prefix)
+                    # pages are numbered within the chunk, events carry the page index in the document
+                    for content in content_list:
+                        content['page_idx'] = start_page + chunk_page_idx
+                    events.append({
+                        'event': 'page',
+                        'page_idx': start_page + chunk_page_idx,
+                        'markdown': pipe_result.get_page_markdown(chunk_page_idx, image_url_prefix),
+                        'content_list': content_list,
+                    })
+                return events
+
+            for event in await loop.run_in_executor(None, post_process_sync):
+                yield event
+
+        yield {'event': 'done', 'pages': page_count, 'elapsed': round(time.time() - start_time, 2)}
+    except Exception as e:
+        logger.error(f"Streaming parse failed: {e}")
+        yield {'event': 'error', 'message': str(e)}
+
+
+async def streaming_parse_response(file: UploadFile, fmt: str, artifact_store) -> StreamingResponse:
+    """Validate the upload and stream its pages.
+
+    Images are written to a directory of `artifact_store` (an api.artifacts.ArtifactStore)
+    and referenced from the markdown with their url.
+    """
+    if not model_manager.get_model():
+        raise HTTPException(status_code=500, detail="Model not initialized")
+    if fmt not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}. Allowed: {', '.join(STREAM_MEDIA_TYPES)}")
+
+    allowed_extensions = {'.pdf', '.jpg', '.jpeg', '.png'}
+    file_ext = Path(file.filename or '').suffix.lower()
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file_ext}. Allowed: {', '.join(allowed_extensions)}"
+        )
+
+    file_bytes = await file.read()
+    stream_name = f"monkeyocr_stream_{Path(file.filename).stem}_{str(uuid.uuid4())[:8]}"
+    output_dir = artifact_store.path(stream_name)
+    image_url_prefix = artifact_store.url(f"{stream_name}/images")
+
+    async def body():
+        # the images of the stream must outlive a sweep running while pages are still coming
+        with artifact_store.lease(stream_name):
+            async for event in stream_parse_events(file_bytes, file_ext, output_dir, image_url_prefix):
+                yield format_event(event, fmt)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,8 @@
+"""GPU-free benchmarks of the parsing pipeline, run from the repository root:
+
+    python -m benchmarks.bench_pipeline --help
+    python -m benchmarks.bench_postprocess --help
+    python -m benchmarks.standin_server --help
+    python -m benchmarks.load_test --help
+    python -m benchmarks.compare_backends --help
+"""
@@ -0,0 +1,211 @@
+"""End-to-end pipeline benchmark with fake models, no GPU or weights needed.
+
+Synthetic PDFs go through doc_analyze_llm -> pipe_ocr_mode -> dump_md with
+the fake models of benchmarks/fake_models.py. Reports pages/s, peak RSS,
+the time of every stage and a digest of every markdown output, and compares
+them with a stored baseline:
+
+    python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+    # ... change the pipeline ...
+    python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json
+
+With --workers N the corpus goes through parse.py's folder path instead,
+drawings and dumps included, N > 1 being the pipelined run of
+`parse.py <folder> --workers N`:
+
+    python -m benchmarks.bench_pipeline --workers 1 --layout-latency 0.2 --chat-latency-per-call 0.1
+    python -m benchmarks.bench_pipeline --workers 4 --layout-latency 0.2 --chat-latency-per-call 0.1
+"""
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from magic_pdf.data.data_reader_writer import BufferedDataWriter, FileBasedDataWriter
+from magic_pdf.data.dataset import PymuDocDataset
+from magic_pdf.libs.metrics import STAGE_SECONDS
+from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
+
+from benchmarks.fake_models import FakeMonkeyOCR
+from benchmarks.synthetic_pdf import make_corpus
+
+STAGES = ('rasterize', 'layout', 'crop', 'recognition', 'reading_order', 'post_process', 'write')
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process and of its finished children."""
+    # ru_maxrss is in kilobytes on linux, in bytes on macos
+    unit = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * unit / 2 ** 20
+
+
+def stage_seconds() -> dict:
+    totals = STAGE_SECONDS.totals()
+    return {stage: totals.get((stage,), (0, 0.0))[1] for stage in STAGES}
+
+
+def parse_document(pdf_path: str, out_dir: str, model) -> str:
+    """Parse one PDF like parse.py does, returns the md5 of the markdown."""
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    md_dir = os.path.join(out_dir, name)
+    image_dir = os.path.join(md_dir, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    image_writer = BufferedDataWriter(FileBasedDataWriter(image_dir))
+    md_writer = FileBasedDataWriter(md_dir)
+
+    with open(pdf_path, 'rb') as f:
+        ds = PymuDocDataset(f.read())
+    infer_result = ds.apply(doc_analyze_llm, MonkeyOCR_model=model)
+    pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=model)
+    pipe_result.dump_md(md_writer, f'{name}.md', 'images')
+    image_writer.flush()
+
+    with open(os.path.join(md_dir, f'{name}.md'), 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def parse_corpus(pdf_paths, out_dir, model, workers: int) -> dict:
+    """Parse the PDFs like `parse.py <folder> --workers N`, returns the md5
+    of every markdown by file name."""
+    # parse.py imports torch, only runs with --workers need it
+    import parse
+
+    if workers > 1:
+        _, failed = parse.parse_files_pipelined(pdf_paths, out_dir, model, workers)
+        if failed:
+            raise RuntimeError(f'failed to parse {failed}')
+    else:
+        for pdf_path in pdf_paths:
+            parse.parse_file(pdf_path, out_dir, model)
+
+    outputs = {}
+    for pdf_path in pdf_paths:
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        with open(os.path.join(out_dir, name, f'{name}.md'), 'rb') as f:
+            outputs[os.path.basename(pdf_path)] = hashlib.md5(f.read()).hexdigest()
+    return outputs
+
+
+def run(args) -> dict:
+    corpus_dir = args.corpus or os.path.join(tempfile.gettempdir(), 'monkeyocr_bench_corpus')
+    pdf_paths = make_corpus(corpus_dir, args.docs, args.pages, seed=args.seed)
+    model = FakeMonkeyOCR(
+        args.config,
+        layout_latency=args.layout_latency,
+        reader_latency=args.reader_latency,
+        chat_latency_per_call=args.chat_latency_per_call,
+        chat_latency_per_item=args.chat_latency_per_item,
+    )
+    out_dir = tempfile.mkdtemp(prefix='monkeyocr_bench_')
+    try:
+        for _ in range(args.warmup):
+            parse_document(pdf_paths[0], out_dir, model)
+
+        stages_before = stage_seconds()
+        outputs = {}
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            if args.workers:
+                outputs.update(parse_corpus(pdf_paths, out_dir, model, args.workers))
+                continue
+            for pdf_path in pdf_paths:
+                outputs[os.path.basename(pdf_path)] = parse_document(pdf_path, out_dir, model)
+        seconds = time.perf_counter() - start
+        stages_after = stage_seconds()
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    pages = args.docs * args.pages * args.repeat
+    return {
+        'params': {
+            'docs': args.docs, 'pages': args.pages, 'seed': args.seed, 'repeat': args.repeat,
+            'config': args.config, 'layout_latency': args.layout_latency, 'reader_latency': args.reader_latency,
+            'chat_latency_per_call': args.chat_latency_per_call, 'chat_latency_per_item': args.chat_latency_per_item,
+            'workers': args.workers,
+        },
+        'pages': pages,
+        'seconds': seconds,
+        'pages_per_second': pages / seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage: (stages_after[stage] - stages_before[stage]) / args.repeat for stage in STAGES},
+        'outputs': outputs,
+    }
+
+
+def print_result(result: dict) -> None:
+    print(f"{result['pages']} pages in {result['seconds']:.2f}s: {result['pages_per_second']:.2f} pages/s, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    print('stage seconds per pass (post-processing workers, if any, are not broken down):')
+    for stage, seconds in result['stages'].items():
+        print(f'  {stage:<14}{seconds:>10.3f}')
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Differences from the baseline beyond `tolerance`, as messages."""
+    problems = []
+    if baseline['params'] != result['params']:
+        problems.append(f"parameters differ from the baseline: {baseline['params']}")
+    if result['pages_per_second'] < baseline['pages_per_second'] * (1 - tolerance):
+        problems.append(f"throughput {result['pages_per_second']:.2f} pages/s, baseline {baseline['pages_per_second']:.2f}")
+    if result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        problems.append(f"peak RSS {result['peak_rss_mb']:.0f} MB, baseline {baseline['peak_rss_mb']:.0f} MB")
+    for stage, seconds in result['stages'].items():
+        base = baseline['stages'].get(stage, 0.0)
+        # ignore noise on stages taking a few milliseconds
+        if seconds > base * (1 + tolerance) and seconds - base > 0.05:
+            problems.append(f'stage {stage} {seconds:.3f}s, baseline {base:.3f}s')
+    changed = sorted(name for name, digest in result['outputs'].items() if baseline['outputs'].get(name) != digest)
+    if changed:
+        problems.append(f"markdown output changed for {', '.join(changed)}")
+    return problems
+
+
+def main():
+    parser = ArgumentParser(description='GPU-free end-to-end pipeline benchmark with deterministic fake models')
+    parser.add_argument('--docs', type=int, default=4, help='synthetic PDFs (default: 4)')
+    parser.add_argument('--pages', type=int, default=10, help='pages per PDF (default: 10)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='timed passes over the corpus (default: 1)')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed documents parsed first (default: 1)')
+    parser.add_argument('--corpus', help='directory of the generated PDFs (default: a temp dir, reused)')
+    parser.add_argument('-c', '--config', default='model_configs.yaml',
+                        help='model config for batching, caches and post-processing options (default: model_configs.yaml)')
+    parser.add_argument('--layout-latency', type=float, default=0.0, help='simulated seconds per page of layout')
+    parser.add_argument('--reader-latency', type=float, default=0.0, help='simulated seconds per reading order call')
+    parser.add_argument('--chat-latency-per-call', type=float, default=0.0, help='simulated seconds per recognition call')
+    parser.add_argument('--chat-latency-per-item', type=float, default=0.0, help='simulated seconds per recognized crop')
+    parser.add_argument('--workers', type=int, default=0,
+                        help="parse the corpus like parse.py's folder run with this many --workers (default: 0, parse_document only)")
+    parser.add_argument('--baseline', help='compare with this result file')
+    parser.add_argument('--save-baseline', help='write the result to this file')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative slack before reporting a regression (default: 0.10)')
+    parser.add_argument('--json', help='also write the result to this file')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_result(result)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION: {problem}')
+        if problems:
+            sys.exit(1)
+        print(f'no regression against {args.baseline} (tolerance {args.tolerance:.0%})')
+
+
+if __name__ == '__main__':
+    main()
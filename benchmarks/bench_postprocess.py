@@ -0,0 +1,202 @@
+"""Micro-benchmarks of the post-processing on synthetic layouts.
+
+Times MagicModel construction, the pre_proc geometry of every page, the
+xy-cut reading order and the grouping of the blocks, para_split,
+ocr_mk_markdown_with_para_core_v2 and union_make on the model output of
+benchmarks/synthetic_layout.py, for every combination of page and block
+counts. The time per block is printed next to every result: when it grows
+with the size of the input, the stage scales worse than linearly.
+
+    python -m benchmarks.bench_postprocess --pages 10,100 --blocks 20,80 --json postprocess.json
+
+The JSON output follows the layout of pytest-benchmark, one entry per
+benchmark and size with min/max/mean/stddev/median/rounds/ops, so results
+of successive runs can be tracked with the same tools.
+"""
+import copy
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+from magic_pdf.config.enums import SupportedPdfParseMethod
+from magic_pdf.config.make_content_config import DropMode, MakeMode
+from magic_pdf.data.dataset import PymuDocDataset
+from magic_pdf.dict2md.ocr_mkcontent import ocr_mk_markdown_with_para_core_v2, union_make
+from magic_pdf.libs.convert_utils import dict_to_list
+from magic_pdf.model.magic_model import MagicModel
+from magic_pdf.pdf_parse_union_core_v2_llm import finish_page_core, get_page_model_result, prepare_page_core
+from magic_pdf.post_proc.para_split_v3 import para_split
+
+from benchmarks.synthetic_layout import make_blank_pdf, make_model_json
+
+BENCHMARKS = ('magic_model', 'page_model_result', 'pre_proc', 'finish_page', 'para_split', 'markdown', 'union_make')
+
+
+def bench(fn, setup, rounds: int, warmup: int) -> dict:
+    """Time `fn(*setup())`, setup excluded, and return pytest-benchmark style stats."""
+    times = []
+    for i in range(warmup + rounds):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    mean = statistics.mean(times)
+    return {
+        'min': min(times),
+        'max': max(times),
+        'mean': mean,
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'median': statistics.median(times),
+        'rounds': len(times),
+        'ops': 1 / mean if mean else 0.0,
+    }
+
+
+def _prepare_pages(page_model_results):
+    states = []
+    for page_id, page_model_result in enumerate(page_model_results):
+        # no page and no image writer: OCR mode and no crops, the geometry only
+        _, page_state = prepare_page_core(
+            None, page_model_result, page_id, 'bench', None, SupportedPdfParseMethod.OCR, None
+        )
+        states.append(page_state)
+    return states
+
+
+def _finish_pages(page_states):
+    pdf_info_dict = {}
+    for page_state in page_states:
+        if page_state is not None:
+            # no sorted boxes: the xy-cut ordering, no reading order model needed
+            pdf_info_dict[f"page_{page_state['page_id']}"] = finish_page_core(page_state, None)
+    return pdf_info_dict
+
+
+def _markdown(pdf_info_list):
+    for page_info in pdf_info_list:
+        ocr_mk_markdown_with_para_core_v2(page_info.get('para_blocks') or [], 'mm', 'images')
+
+
+def run_size(num_pages: int, num_blocks: int, args) -> list:
+    """All benchmarks on one size of input."""
+    model_json = make_model_json(num_pages, num_blocks, density=args.density, overlap=args.overlap,
+                                 columns=args.columns, seed=args.seed)
+    dataset = PymuDocDataset(make_blank_pdf(num_pages))
+
+    # the inputs of every stage, computed once from the output of the previous one
+    magic_model = MagicModel(copy.deepcopy(model_json), dataset)
+    page_model_results = [get_page_model_result(magic_model, page_id) for page_id in range(num_pages)]
+    page_states = _prepare_pages(copy.deepcopy(page_model_results))
+    pdf_info_dict = _finish_pages(copy.deepcopy(page_states))
+    split_info_dict = copy.deepcopy(pdf_info_dict)
+    para_split(split_info_dict)
+    pdf_info_list = dict_to_list(split_info_dict)
+
+    cases = {
+        'magic_model': (lambda model_list: MagicModel(model_list, dataset), lambda: (copy.deepcopy(model_json),)),
+        'page_model_result': (
+            lambda: [get_page_model_result(magic_model, page_id) for page_id in range(num_pages)], lambda: (),
+        ),
+        'pre_proc': (_prepare_pages, lambda: (copy.deepcopy(page_model_results),)),
+        'finish_page': (_finish_pages, lambda: (copy.deepcopy(page_states),)),
+        'para_split': (para_split, lambda: (copy.deepcopy(pdf_info_dict),)),
+        'markdown': (_markdown, lambda: (pdf_info_list,)),
+        'union_make': (
+            lambda pages: union_make(pages, MakeMode.MM_MD, DropMode.NONE, 'images'), lambda: (pdf_info_list,),
+        ),
+    }
+
+    params = {'pages': num_pages, 'blocks_per_page': num_blocks, 'density': args.density, 'overlap': args.overlap,
+              'columns': args.columns, 'seed': args.seed}
+    results = []
+    for name in args.only or BENCHMARKS:
+        fn, setup = cases[name]
+        stats = bench(fn, setup, args.rounds, args.warmup)
+        results.append({
+            'group': name,
+            'name': f'{name}[{num_pages}x{num_blocks}]',
+            'params': params,
+            'extra_info': {'seconds_per_block': stats['median'] / (num_pages * num_blocks)},
+            'stats': stats,
+        })
+    return results
+
+
+def machine_info() -> dict:
+    return {
+        'node': platform.node(),
+        'processor': platform.processor(),
+        'machine': platform.machine(),
+        'python_version': platform.python_version(),
+        'system': platform.system(),
+        'release': platform.release(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def commit_info() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain'], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    return {'id': commit, 'dirty': dirty}
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = ArgumentParser(description='Micro-benchmarks of the post-processing on synthetic layouts')
+    parser.add_argument('--pages', type=_int_list, default=[10, 100], help='comma separated page counts (default: 10,100)')
+    parser.add_argument('--blocks', type=_int_list, default=[20, 80],
+                        help='comma separated layout boxes per page (default: 20,80)')
+    parser.add_argument('--density', type=float, default=0.6,
+                        help='share of every column covered by boxes (default: 0.6)')
+    parser.add_argument('--overlap', type=float, default=0.0,
+                        help='share of the next box every box reaches into (default: 0)')
+    parser.add_argument('--columns', type=int, default=1, help='columns per page (default: 1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rounds', type=int, default=5, help='timed rounds per benchmark (default: 5)')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed rounds first (default: 1)')
+    parser.add_argument('--only', type=lambda v: v.split(','), help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    unknown = set(args.only or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = []
+    print(f"{'benchmark':<36}{'median (ms)':>14}{'stddev (ms)':>14}{'us/block':>12}")
+    for num_pages in args.pages:
+        for num_blocks in args.blocks:
+            for result in run_size(num_pages, num_blocks, args):
+                results.append(result)
+                stats = result['stats']
+                print(f"{result['name']:<36}{stats['median'] * 1e3:>14.2f}{stats['stddev'] * 1e3:>14.2f}"
+                      f"{result['extra_info']['seconds_per_block'] * 1e6:>12.2f}")
+            sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'machine_info': machine_info(),
+                'commit_info': commit_info(),
+                'benchmarks': results,
+                'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'version': 'monkeyocr-bench-1',
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
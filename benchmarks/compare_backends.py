@@ -0,0 +1,459 @@
+"""Speed x accuracy comparison of recognition backends and queue settings.
+
+A matrix file lists the document set and the variants to compare. A variant
+is a model config: a base config, overrides of its keys, and sweeps that
+expand it into one variant per combination of values:
+
+    base_config: model_configs.yaml
+    documents: path/to/docs       # PDFs and images, ground truth in <name>.md next to them
+    variants:
+      - name: lmdeploy
+        overrides: {chat_config: {backend: lmdeploy}}
+      - name: lmdeploy_queue
+        overrides: {chat_config: {backend: lmdeploy_queue}}
+        sweep:
+          chat_config.queue_config.max_batch_size: [64, 256]
+          chat_config.queue_config.queue_timeout: [0.1, 1]
+      - name: qwen3vl
+        config: model_configs_qwen3vl.yaml
+
+Every variant runs in a subprocess of its own, so model memory is released
+and metrics start from zero. The run records:
+
+- pages/min, excluding the model load
+- latency of the crops, and recognition seconds per crop
+- generated tokens
+- peak device memory
+- character error rate (CER) against the ground truth
+
+It writes a markdown report, which recommends the fastest variant whose
+CER is within --max-cer-delta of the best one:
+
+    python -m benchmarks.compare_backends benchmarks/compare_backends.yaml --report comparison.md
+
+With `fake_layout: true` the layout and reading order models are the fakes
+of benchmarks/fake_models.py. Only the `api` chat backend is then real.
+benchmarks/compare_ci.yaml runs that way against the OpenAI-compatible
+stand-in of benchmarks/openai_standin.py, without a GPU or weights.
+"""
+import copy
+import datetime
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+import numpy as np
+import torch
+import yaml
+
+from magic_pdf.data.data_reader_writer import MemoryDataWriter
+from magic_pdf.data.dataset import ImageDataset, PymuDocDataset
+from magic_pdf.libs.metrics import GENERATED_TOKENS, STAGE_SECONDS
+from magic_pdf.libs.tracing import trace
+from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
+
+DOCUMENT_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+
+# ---------------------------------------------------------------- accuracy
+
+def normalize_text(text: str) -> str:
+    """Text of a markdown document without markup and whitespace, for CER."""
+    text = re.sub(r'!\[[^\]]*\]\([^)]*\)', '', text)
+    text = re.sub(r'<[^>]+>', ' ', text)
+    text = re.sub(r'[#*_|`$>\\-]', '', text)
+    return re.sub(r'\s+', '', text)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance, one numpy pass per character of the longer string."""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    b_codes = np.frombuffer(b.encode('utf-32-le'), dtype=np.uint32)
+    offsets = np.arange(len(b) + 1)
+    row = offsets.copy()
+    for ch in a:
+        substitute = row[:-1] + (b_codes != ord(ch))
+        current = np.empty_like(row)
+        current[0] = row[0] + 1
+        current[1:] = np.minimum(substitute, row[1:] + 1)
+        # insertions: current[j] = min over k <= j of current[k] + (j - k)
+        row = np.minimum.accumulate(current - offsets) + offsets
+    return int(row[-1])
+
+
+def char_error_rate(hypothesis: str, reference: str) -> tuple:
+    """(edits, reference length) of the normalized texts."""
+    hypothesis, reference = normalize_text(hypothesis), normalize_text(reference)
+    return edit_distance(hypothesis, reference), len(reference)
+
+
+# ---------------------------------------------------------------- variants
+
+def set_dotted(config: dict, dotted_key: str, value) -> None:
+    keys = dotted_key.split('.')
+    for key in keys[:-1]:
+        if not isinstance(config.get(key), dict):
+            config[key] = {}
+        config = config[key]
+    config[keys[-1]] = value
+
+
+def merge(base: dict, overrides: dict) -> dict:
+    merged = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def expand_variants(matrix: dict) -> list:
+    """One entry per variant and sweep combination, with its full model config."""
+    variants = []
+    for variant in matrix['variants']:
+        config_path = variant.get('config', matrix.get('base_config', 'model_configs.yaml'))
+        with open(config_path, 'r', encoding='utf-8') as f:
+            base = yaml.load(f, Loader=yaml.FullLoader) or {}
+        config = merge(base, variant.get('overrides'))
+        sweep = variant.get('sweep') or {}
+        keys = list(sweep)
+        for values in itertools.product(*(sweep[key] for key in keys)):
+            swept = copy.deepcopy(config)
+            for key, value in zip(keys, values):
+                set_dotted(swept, key, value)
+            suffix = ','.join(f'{key.rsplit(".", 1)[-1]}={value}' for key, value in zip(keys, values))
+            variants.append({
+                'name': f"{variant['name']}[{suffix}]" if suffix else variant['name'],
+                'config': swept,
+                'fake_layout': variant.get('fake_layout', matrix.get('fake_layout', False)),
+            })
+    return variants
+
+
+def resolve_documents(matrix: dict) -> list:
+    """(document path, ground truth path or None) pairs."""
+    if 'synthetic' in matrix:
+        from benchmarks.synthetic_pdf import make_corpus
+        synthetic = matrix['synthetic']
+        corpus_dir = synthetic.get('dir') or os.path.join(tempfile.gettempdir(), 'monkeyocr_compare_corpus')
+        paths = make_corpus(corpus_dir, synthetic.get('docs', 2), synthetic.get('pages', 3),
+                            seed=synthetic.get('seed', 0), ground_truth=True)
+    else:
+        doc_dir = matrix['documents']
+        paths = sorted(os.path.join(doc_dir, name) for name in os.listdir(doc_dir)
+                       if name.lower().endswith(DOCUMENT_EXTENSIONS))
+    documents = []
+    for path in paths:
+        truth = os.path.splitext(path)[0] + '.md'
+        documents.append((path, truth if os.path.exists(truth) else None))
+    if not documents:
+        raise ValueError('no documents to compare on')
+    return documents
+
+
+# ---------------------------------------------------------------- one variant, in its subprocess
+
+class DeviceMemorySampler(threading.Thread):
+    """Peak memory in use on the cuda devices, whatever the allocator (torch, vllm, lmdeploy)."""
+
+    def __init__(self, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_bytes = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if not torch.cuda.is_available():
+            return
+        while True:
+            used = 0
+            for device in range(torch.cuda.device_count()):
+                free, total = torch.cuda.mem_get_info(device)
+                used += total - free
+            self.peak_bytes = max(self.peak_bytes or 0, used)
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def build_model(config_path: str, fake_layout: bool, fake_latency: dict):
+    if fake_layout:
+        from benchmarks.fake_models import FakeMonkeyOCR
+        return FakeMonkeyOCR(
+            config_path,
+            layout_latency=fake_latency.get('layout', 0.0),
+            reader_latency=fake_latency.get('reader', 0.0),
+            chat_latency_per_call=fake_latency.get('chat_per_call', 0.0),
+            chat_latency_per_item=fake_latency.get('chat_per_item', 0.0),
+        )
+    from magic_pdf.model.custom_model import MonkeyOCR
+    return MonkeyOCR(config_path)
+
+
+def parse_document(path: str, model) -> tuple:
+    """(markdown, pages, recognize_crop spans) of one document."""
+    with open(path, 'rb') as f:
+        file_bytes = f.read()
+    ds = PymuDocDataset(file_bytes) if path.lower().endswith('.pdf') else ImageDataset(file_bytes)
+    with trace(os.path.basename(path)) as doc_trace:
+        infer_result = ds.apply(doc_analyze_llm, MonkeyOCR_model=model)
+        pipe_result = infer_result.pipe_ocr_mode(MemoryDataWriter('images'), MonkeyOCR_model=model)
+        markdown = pipe_result.get_markdown('images')
+    return markdown, len(ds), [s for s in doc_trace.spans if s.name == 'recognize_crop']
+
+
+def percentile(values: list, q: float):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_variant(spec: dict) -> dict:
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8') as f:
+        yaml.safe_dump(spec['config'], f)
+        config_path = f.name
+    memory = DeviceMemorySampler()
+    memory.start()
+    try:
+        load_start = time.perf_counter()
+        model = build_model(config_path, spec['fake_layout'], spec.get('fake_latency') or {})
+        load_seconds = time.perf_counter() - load_start
+
+        documents = spec['documents']
+        for path, _ in documents[:spec.get('warmup', 1)]:
+            parse_document(path, model)
+
+        tokens_before = sum(GENERATED_TOKENS.totals().values())
+        recognition_before = STAGE_SECONDS.totals().get(('recognition',), (0, 0.0))[1]
+        pages, crops, edits, reference_chars, failed = 0, [], 0, 0, {}
+        start = time.perf_counter()
+        for path, truth_path in documents:
+            try:
+                markdown, doc_pages, doc_crops = parse_document(path, model)
+            except Exception as e:
+                failed[os.path.basename(path)] = f'{type(e).__name__}: {e}'
+                continue
+            pages += doc_pages
+            crops.extend(doc_crops)
+            if truth_path:
+                with open(truth_path, 'r', encoding='utf-8') as f:
+                    doc_edits, doc_chars = char_error_rate(markdown, f.read())
+                edits += doc_edits
+                reference_chars += doc_chars
+        seconds = time.perf_counter() - start
+        recognition_seconds = STAGE_SECONDS.totals().get(('recognition',), (0, 0.0))[1] - recognition_before
+        tokens = sum(GENERATED_TOKENS.totals().values()) - tokens_before
+    finally:
+        memory.stop()
+        os.unlink(config_path)
+
+    latencies = [s.attributes['latency'] for s in crops]
+    chat_config = spec['config'].get('chat_config', {}) or {}
+    return {
+        'name': spec['name'],
+        'backend': chat_config.get('backend'),
+        'queue_config': chat_config.get('queue_config') if str(chat_config.get('backend')).endswith('_queue') else None,
+        'batching': (chat_config.get('batching') or {}).get('enabled', False),
+        'fake_layout': spec['fake_layout'],
+        'load_seconds': load_seconds,
+        'documents': len(documents) - len(failed),
+        'failed': failed,
+        'pages': pages,
+        'seconds': seconds,
+        'pages_per_minute': pages / seconds * 60 if seconds else 0.0,
+        'crops': len(crops),
+        'seconds_per_crop': recognition_seconds / len(crops) if crops else None,
+        'crop_latency_p50': percentile(latencies, 50),
+        'crop_latency_p95': percentile(latencies, 95),
+        'tokens': tokens,
+        'tokens_per_second': tokens / recognition_seconds if recognition_seconds else None,
+        'device_memory_peak_gb': memory.peak_bytes / 2 ** 30 if memory.peak_bytes else None,
+        'cer': edits / reference_chars if reference_chars else None,
+    }
+
+
+# ---------------------------------------------------------------- report
+
+def _fmt(value, spec='.2f', suffix=''):
+    return 'n/a' if value is None else f'{value:{spec}}{suffix}'
+
+
+def recommend(results: list, max_cer_delta: float):
+    """The fastest variant whose CER is within max_cer_delta of the best CER."""
+    ok = [r for r in results if 'error' not in r and r['pages']]
+    if not ok:
+        return None
+    cers = [r['cer'] for r in ok if r['cer'] is not None]
+    if cers:
+        best_cer = min(cers)
+        ok = [r for r in ok if r['cer'] is not None and r['cer'] <= best_cer + max_cer_delta]
+    return max(ok, key=lambda r: r['pages_per_minute'])
+
+
+def commit_id() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def markdown_report(results: list, documents: list, matrix_path: str, max_cer_delta: float) -> str:
+    gpu = ', '.join(torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())) or 'none'
+    lines = [
+        '# Backend comparison',
+        '',
+        '| | |',
+        '|---|---|',
+        f'| Date | {datetime.date.today().isoformat()} |',
+        f'| Commit | {commit_id()} |',
+        f'| GPU | {gpu} |',
+        f'| Matrix | `{matrix_path}` |',
+        f'| Documents | {len(documents)}, {sum(1 for _, t in documents if t)} with ground truth |',
+        '',
+        '| Variant | Backend | Pages/min | Speed ratio | s/crop | Crop p50 s | Crop p95 s | Tokens | Tokens/s '
+        '| Peak VRAM | CER | Load s |',
+        '|---|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|',
+    ]
+    ok = [r for r in results if 'error' not in r]
+    reference = ok[0]['pages_per_minute'] if ok and ok[0]['pages_per_minute'] else None
+    for r in results:
+        if 'error' in r:
+            lines.append(f"| {r['name']} | {r.get('backend') or ''} | failed | | | | | | | | | |")
+            continue
+        ratio = r['pages_per_minute'] / reference if reference else None
+        lines.append(
+            f"| {r['name']} | {r['backend']}{' (fake layout)' if r['fake_layout'] else ''} "
+            f"| {r['pages_per_minute']:.1f} | {_fmt(ratio, '.2f', 'x')} | {_fmt(r['seconds_per_crop'], '.3f')} "
+            f"| {_fmt(r['crop_latency_p50'], '.2f')} | {_fmt(r['crop_latency_p95'], '.2f')} | {r['tokens']} "
+            f"| {_fmt(r['tokens_per_second'], '.0f')} | {_fmt(r['device_memory_peak_gb'], '.1f', ' GB')} "
+            f"| {_fmt(r['cer'] * 100 if r['cer'] is not None else None, '.2f', '%')} | {r['load_seconds']:.1f} |"
+        )
+
+    best = recommend(results, max_cer_delta)
+    lines.append('')
+    if best:
+        lines.append(f"**Recommended:** `{best['name']}`. It is the fastest variant with a CER within "
+                     f"{max_cer_delta * 100:.1f} points of the best.")
+    lines.append('')
+    lines.append('The speed ratio is relative to the first variant. Pages/min leaves out the model load and one '
+                 'warm-up document. s/crop is the recognition time divided by the crops. The crop latencies run '
+                 'from the start of the recognition call to the answer of each crop. VRAM is the peak memory in '
+                 'use on the devices.')
+    for r in results:
+        if 'error' in r:
+            lines.append('')
+            lines.append(f"`{r['name']}` failed:")
+            lines.append('')
+            lines.append('```')
+            lines.append(r['error'])
+            lines.append('```')
+        elif r['failed']:
+            lines.append('')
+            lines.append(f"`{r['name']}` failed on {', '.join(sorted(r['failed']))}.")
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------- main
+
+def run_matrix(args) -> tuple:
+    with open(args.matrix, 'r', encoding='utf-8') as f:
+        matrix = yaml.load(f, Loader=yaml.FullLoader)
+    documents = resolve_documents(matrix)
+    variants = expand_variants(matrix)
+    if args.only:
+        variants = [v for v in variants if any(v['name'].startswith(prefix) for prefix in args.only)]
+
+    standin = None
+    if matrix.get('standin'):
+        from benchmarks.openai_standin import start_in_thread
+        standin = start_in_thread(**matrix['standin'])
+
+    results = []
+    try:
+        for variant in variants:
+            print(f"running {variant['name']}", flush=True)
+            spec = dict(variant, documents=documents, warmup=matrix.get('warmup', 1),
+                        fake_latency=matrix.get('fake_latency'))
+            with tempfile.TemporaryDirectory(prefix='monkeyocr_compare_') as tmp_dir:
+                spec_path, result_path = os.path.join(tmp_dir, 'spec.json'), os.path.join(tmp_dir, 'result.json')
+                with open(spec_path, 'w', encoding='utf-8') as f:
+                    json.dump(spec, f)
+                try:
+                    process = subprocess.run(
+                        [sys.executable, '-m', 'benchmarks.compare_backends', '--run-variant', spec_path,
+                         '--result', result_path],
+                        capture_output=True, text=True, timeout=args.timeout,
+                    )
+                except subprocess.TimeoutExpired:
+                    process = None
+                if process is not None and process.returncode == 0 and os.path.exists(result_path):
+                    with open(result_path, 'r', encoding='utf-8') as f:
+                        result = json.load(f)
+                else:
+                    if process is None:
+                        error = f'timed out after {args.timeout:g} seconds'
+                    else:
+                        error = '\n'.join((process.stderr or process.stdout).strip().splitlines()[-15:])
+                    result = {'name': variant['name'], 'backend': (variant['config'].get('chat_config') or {}).get('backend'),
+                              'error': error}
+            results.append(result)
+            if 'error' in result:
+                print(f"  failed: {result['error'].splitlines()[-1] if result['error'] else ''}", flush=True)
+            else:
+                print(f"  {result['pages_per_minute']:.1f} pages/min, CER {_fmt(result['cer'], '.4f')}", flush=True)
+    finally:
+        if standin is not None:
+            standin.shutdown()
+    return results, documents
+
+
+def main():
+    parser = ArgumentParser(description='Compare recognition backends and queue settings on a fixed document set')
+    parser.add_argument('matrix', nargs='?', help='matrix file, see the module docstring')
+    parser.add_argument('--report', default='backend_comparison.md', help='markdown report (default: backend_comparison.md)')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--only', type=lambda v: v.split(','), help='comma separated variant name prefixes to run')
+    parser.add_argument('--max-cer-delta', type=float, default=0.01,
+                        help='CER above the best one still acceptable for the recommendation (default: 0.01)')
+    parser.add_argument('--timeout', type=float, default=6 * 3600, help='seconds per variant (default: 6 hours)')
+    # internal: run one variant in this process, called by run_matrix
+    parser.add_argument('--run-variant', help=SUPPRESS)
+    parser.add_argument('--result', help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_variant:
+        with open(args.run_variant, 'r', encoding='utf-8') as f:
+            result = run_variant(json.load(f))
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+    if not args.matrix:
+        parser.error('the matrix file is required')
+
+    results, documents = run_matrix(args)
+    report = markdown_report(results, documents, args.matrix, args.max_cer_delta)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(f'report written to {args.report}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if any('error' in r or r['failed'] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
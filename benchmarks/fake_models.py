@@ -0,0 +1,277 @@
+"""Deterministic stand-ins for the layout, reading-order and chat models.
+
+They return the same boxes and text for the same pages on every run and
+sleep for a configurable time per call and per item, to stand in for the
+GPU. FakeMonkeyOCR assembles them like MonkeyOCR does, from the same
+model_configs.yaml (batching, queues, caches, post-processing and image
+options), without loading any weights. The `api` chat backend needs no
+weights and is used for real, e.g. against benchmarks/openai_standin.py.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import yaml
+
+from magic_pdf.config.constants import MODEL_NAME
+from magic_pdf.libs.metrics import BATCH_SIZE
+from magic_pdf.model.batch_scheduler import LayoutBatcher, RecognitionBatcher
+from magic_pdf.model.sub_modules.reading_oreder.layoutreader.cache import ReadingOrderCache
+
+# ink rows closer than this (pixels at 200 dpi) belong to the same block
+BLOCK_ROW_GAP = 20
+
+
+def detect_blocks(image: np.ndarray) -> list:
+    """Layout of a rendered synthetic page, from its ink projection.
+
+    Bands of ink rows become blocks: the first one is the title, dense ones
+    are figures, ones crossed by several full-width rules are tables, the
+    rest is text.
+    """
+    ink = image.min(axis=2) < 200
+    rows = np.flatnonzero(ink.any(axis=1))
+    if len(rows) == 0:
+        return []
+    splits = np.flatnonzero(np.diff(rows) > BLOCK_ROW_GAP)
+    bands = zip(np.concatenate(([rows[0]], rows[splits + 1])), np.concatenate((rows[splits], [rows[-1]])))
+
+    blocks = []
+    for top, bottom in bands:
+        cols = np.flatnonzero(ink[top:bottom + 1].any(axis=0))
+        left, right = int(cols[0]), int(cols[-1])
+        region = ink[top:bottom + 1, left:right + 1]
+        if not blocks:
+            category_id = 0
+        elif region.mean() > 0.6:
+            category_id = 3
+        elif (region.mean(axis=1) > 0.9).sum() >= 3:
+            category_id = 5
+        else:
+            category_id = 1
+        top, bottom = int(top), int(bottom)
+        blocks.append({
+            'category_id': category_id,
+            'poly': [left, top, right, top, right, bottom, left, bottom],
+            'score': 0.95,
+        })
+    return blocks
+
+
+class FakeLayoutModel:
+    def __init__(self, latency_per_page: float = 0.0):
+        self.latency_per_page = latency_per_page
+
+    def batch_predict(self, images: list, batch_size: int) -> list:
+        time.sleep(self.latency_per_page * len(images))
+        return [detect_blocks(np.asarray(image.convert('RGB'))) for image in images]
+
+
+class FakeLayoutReader(torch.nn.Module):
+    """Orders boxes top to bottom, then left to right."""
+
+    def __init__(self, latency_per_call: float = 0.0):
+        super().__init__()
+        self.latency_per_call = latency_per_call
+
+    @property
+    def device(self):
+        return torch.device('cpu')
+
+    @property
+    def dtype(self):
+        return torch.float32
+
+    def forward(self, input_ids, bbox, attention_mask):
+        time.sleep(self.latency_per_call)
+        batch, seq_len = input_ids.shape
+        logits = torch.zeros(batch, seq_len, seq_len)
+        for b in range(batch):
+            length = int(attention_mask[b].sum()) - 2
+            boxes = bbox[b, 1:length + 1].tolist()
+            order = sorted(range(length), key=lambda i: (boxes[i][1], boxes[i][0], i))
+            for position, i in enumerate(order):
+                logits[b, i + 1, position] = 1.0
+        return SimpleNamespace(logits=logits)
+
+
+class FakeChatModel:
+    """Answers every instruction with text sized after the crop."""
+
+    model_name = 'fake-chat'
+
+    def __init__(self, latency_per_call: float = 0.0, latency_per_item: float = 0.0):
+        self.latency_per_call = latency_per_call
+        self.latency_per_item = latency_per_item
+
+    @staticmethod
+    def answer(image, question: str) -> str:
+        width, height = image.size
+        if 'table' in question:
+            rows, cols = max(1, height // 45), 4
+            cells = ''.join(
+                '<tr>' + ''.join(f'<td>r{r}c{c}</td>' for c in range(cols)) + '</tr>' for r in range(rows)
+            )
+            return f'<table>{cells}</table>'
+        if 'LaTeX' in question:
+            return f'x_{{{width}}} + y^{{{height}}} = z'
+        if 'NO_TEXT_DETECTED' in question:
+            return 'NO_TEXT_DETECTED'
+        words = max(1, width * height // 6000)
+        return ' '.join(f'word{(width + i * height) % 997}' for i in range(words))
+
+    def batch_inference(self, images: list, questions: list) -> list:
+        time.sleep(self.latency_per_call + self.latency_per_item * len(images))
+        return [self.answer(image, question) for image, question in zip(images, questions)]
+
+
+class FakeQueueChatModel:
+    """FakeChatModel behind a request queue, like the lmdeploy_queue and
+    vllm_queue backends: a background thread takes up to `max_batch_size`
+    queued requests, collected for at most `queue_timeout` seconds, and
+    requests beyond `max_queue_size` are rejected with an error text."""
+
+    def __init__(self, chat_model: FakeChatModel, max_batch_size: int = 32, queue_timeout: float = 0.1,
+                 max_queue_size: int = 1000):
+        self.chat_model = chat_model
+        self.model_name = chat_model.model_name
+        self.max_batch_size = max_batch_size
+        self.queue_timeout = queue_timeout
+        self.max_queue_size = max_queue_size
+        self.request_queue = deque()
+        self.queue_lock = threading.Lock()
+        self.processing = False
+        self.shutdown_flag = False
+        self.processor_thread = threading.Thread(target=self._background_processor, daemon=True)
+        self.processor_thread.start()
+
+    def _background_processor(self):
+        while not self.shutdown_flag:
+            batch = []
+            start = time.time()
+            while len(batch) < self.max_batch_size and time.time() - start < self.queue_timeout:
+                with self.queue_lock:
+                    if self.request_queue:
+                        batch.append(self.request_queue.popleft())
+                        continue
+                if batch:
+                    break
+                time.sleep(0.001)
+            if not batch:
+                continue
+            self.processing = True
+            try:
+                outputs = self.chat_model.batch_inference([r[0] for r in batch], [r[1] for r in batch])
+                BATCH_SIZE.observe(len(batch), stage='recognition_batch')
+                for (_, _, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_result(f'Error: {e}')
+            finally:
+                self.processing = False
+
+    def _submit(self, image, question) -> Future:
+        future = Future()
+        with self.queue_lock:
+            if len(self.request_queue) >= self.max_queue_size:
+                future.set_result('Error: Request queue full')
+            else:
+                self.request_queue.append((image, question, future))
+        return future
+
+    def batch_inference(self, images: list, questions: list) -> list:
+        futures = [self._submit(image, question) for image, question in zip(images, questions)]
+        return [future.result() for future in futures]
+
+    async def async_batch_inference(self, images: list, questions: list) -> list:
+        futures = [asyncio.wrap_future(self._submit(image, question)) for image, question in zip(images, questions)]
+        return await asyncio.gather(*futures)
+
+    def get_queue_status(self):
+        with self.queue_lock:
+            return {
+                'queue_size': len(self.request_queue),
+                'max_queue_size': self.max_queue_size,
+                'processing': self.processing,
+                'processor_thread_alive': self.processor_thread.is_alive(),
+                'shutdown_flag': self.shutdown_flag,
+            }
+
+    def shutdown(self):
+        self.shutdown_flag = True
+        self.processor_thread.join(timeout=5)
+
+
+class FakeMonkeyOCR:
+    """The model holder handed to doc_analyze_llm and pipe_ocr_mode."""
+
+    def __init__(self, config_path: str = None, layout_latency: float = 0.0, reader_latency: float = 0.0,
+                 chat_latency_per_call: float = 0.0, chat_latency_per_item: float = 0.0):
+        """Initialized method.
+
+        Args:
+            config_path (str, optional): model config read like MonkeyOCR does, weights aside. Defaults to None.
+            layout_latency (float, optional): seconds per page of layout detection. Defaults to 0.
+            reader_latency (float, optional): seconds per reading order call. Defaults to 0.
+            chat_latency_per_call (float, optional): seconds per recognition call. Defaults to 0.
+            chat_latency_per_item (float, optional): seconds per recognized crop. Defaults to 0.
+        """
+        configs = {}
+        if config_path:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                configs = yaml.load(f, Loader=yaml.FullLoader) or {}
+        self.configs = configs
+        self.device = 'cpu'
+        self.layout_model_name = MODEL_NAME.DocLayout_YOLO
+
+        layout_config = configs.get('layout_config', {}) or {}
+        layout_batching_config = layout_config.get('batching', {}) or {}
+        self.layout_model = FakeLayoutModel(layout_latency)
+        self.layout_lock = threading.Lock()
+        if layout_batching_config.get('enabled', False):
+            self.layout_model = LayoutBatcher(
+                self.layout_model,
+                batch_size=layout_batching_config.get('batch_size', 8),
+                max_batch_size=layout_batching_config.get('max_batch_size', 64),
+                max_wait=layout_batching_config.get('max_wait', 0.01),
+            )
+            self.layout_lock = nullcontext()
+
+        self.layoutreader_model = FakeLayoutReader(reader_latency)
+        reader_config = layout_config.get('reader', {}) or {}
+        cache_size = reader_config.get('cache_size', 0)
+        self.layoutreader_cache = ReadingOrderCache(max_size=cache_size) if cache_size and cache_size > 0 else None
+
+        self.postprocess_config = configs.get('postprocess_config', {}) or {}
+        self.image_config = configs.get('image_config', {}) or {}
+        self.result_cache = None
+
+        chat_config = configs.get('chat_config', {}) or {}
+        chat_backend = str(chat_config.get('backend', ''))
+        if chat_backend == 'api':
+            # needs no weights, the configured server is used for real
+            from magic_pdf.model.custom_model import MonkeyChat_OpenAIAPI
+            api_config = configs.get('api_config', {}) or {}
+            self.chat_model = MonkeyChat_OpenAIAPI(
+                url=api_config.get('url'),
+                model_name=api_config.get('model_name'),
+                api_key=api_config.get('api_key', None),
+            )
+        else:
+            self.chat_model = FakeChatModel(chat_latency_per_call, chat_latency_per_item)
+        if chat_backend.endswith('_queue'):
+            self.chat_model = FakeQueueChatModel(self.chat_model, **(chat_config.get('queue_config', {}) or {}))
+        chat_batching_config = chat_config.get('batching', {}) or {}
+        if chat_batching_config.get('enabled', False) and not hasattr(self.chat_model, 'async_batch_inference'):
+            self.chat_model = RecognitionBatcher(
+                self.chat_model,
+                max_batch_size=chat_batching_config.get('max_batch_size', 256),
+                max_wait=chat_batching_config.get('max_wait', 0.05),
+            )
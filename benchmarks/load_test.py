@@ -0,0 +1,404 @@
+"""Load generator replaying a file of API requests at a target rate or concurrency.
+
+Every line of the requests file is one request:
+
+    {"endpoint": "/parse", "file": "docs/report.pdf"}
+    {"endpoint": "/ocr/table", "synthetic": {"pages": 1, "seed": 3}}
+    {"endpoint": "/jobs", "synthetic": {"pages": 8, "seed": 4}, "params": {"split_pages": true}, "at": 2.5}
+
+`file` is relative to the requests file, `synthetic` generates the PDF with
+benchmarks/synthetic_pdf.py instead. `params` are query parameters. Jobs
+are submitted, then polled until they finish. Their latency runs from the
+submission to the end of the job and the time they spent queued is
+reported on its own. `at` is the send time in seconds from the start, used
+with --replay-timing.
+
+Three modes:
+
+- `--rate R`: open loop, R requests/s whatever the server does (poisson or uniform arrivals)
+- `--concurrency N`: closed loop, N clients sending one request after the other
+- `--replay-timing`: open loop at the `at` times of the file
+
+In the open modes, latency is measured from the time a request was due, not
+from when a client thread got to send it. A saturated client therefore
+cannot hide the server's queueing.
+
+While the load runs, /metrics is sampled. The report gives the depth of
+the server-side batching queues and the recognition batch sizes next to
+the p50/p95/p99 latencies, the throughput and the error rates:
+
+    python -m benchmarks.load_test --url http://127.0.0.1:7861 --requests benchmarks/load_requests.jsonl \\
+        --rate 2 --duration 60 --json load.json
+"""
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.parse
+import urllib.request
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic_pdf import make_pdf
+
+CONTENT_TYPES = {'.pdf': 'application/pdf', '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg'}
+METRIC_LINE = re.compile(r'^(\w+)(?:\{([^}]*)\})? (\S+)$')
+
+
+def load_requests(path: str) -> list:
+    """Parse the requests file, file contents are read once and shared."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    payloads = {}
+    requests = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            spec = json.loads(line)
+            if 'endpoint' not in spec:
+                raise ValueError(f'{path}:{line_no}: no endpoint')
+            if 'synthetic' in spec:
+                synthetic = spec['synthetic']
+                key = ('synthetic', synthetic.get('pages', 1), synthetic.get('seed', 0))
+                filename = f'synthetic_{key[2]}_{key[1]}p.pdf'
+                if key not in payloads:
+                    payloads[key] = make_pdf(key[1], seed=key[2])
+            elif 'file' in spec:
+                file_path = os.path.join(base_dir, spec['file'])
+                key = ('file', file_path)
+                filename = os.path.basename(file_path)
+                if key not in payloads:
+                    with open(file_path, 'rb') as pf:
+                        payloads[key] = pf.read()
+            else:
+                raise ValueError(f'{path}:{line_no}: needs a file or a synthetic document')
+            requests.append({
+                'endpoint': spec['endpoint'],
+                'params': spec.get('params', {}),
+                'at': spec.get('at'),
+                'filename': filename,
+                'data': payloads[key],
+            })
+    if not requests:
+        raise ValueError(f'{path}: no requests')
+    return requests
+
+
+def _multipart(filename: str, data: bytes):
+    boundary = uuid.uuid4().hex
+    content_type = CONTENT_TYPES.get(os.path.splitext(filename)[1].lower(), 'application/octet-stream')
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+        f'Content-Type: {content_type}\r\n\r\n'.encode(),
+        data,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _params(params: dict) -> str:
+    if not params:
+        return ''
+    values = {k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()}
+    return '?' + urllib.parse.urlencode(values)
+
+
+def _call(method: str, url: str, timeout: float, body: bytes = None, content_type: str = None) -> bytes:
+    headers = {'Content-Type': content_type} if content_type else {}
+    request = urllib.request.Request(url, data=body, headers=headers, method=method)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+class LoadClient:
+    def __init__(self, url: str, timeout: float, job_poll_interval: float, fetch_job_results: bool):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.job_poll_interval = job_poll_interval
+        self.fetch_job_results = fetch_job_results
+
+    def send(self, request: dict, due: float) -> dict:
+        """Send one request, returns its outcome. `due` is the perf_counter time it was due."""
+        result = {'endpoint': request['endpoint'], 'status': 'ok', 'queue_wait': None}
+        body, content_type = _multipart(request['filename'], request['data'])
+        try:
+            response = _call('POST', f"{self.url}{request['endpoint']}{_params(request['params'])}", self.timeout,
+                             body, content_type)
+            if request['endpoint'] == '/jobs':
+                result.update(self._wait_job(json.loads(response), due))
+            elif request['endpoint'].startswith('/ocr/'):
+                task = json.loads(response)
+                # queue backends answer "Error: ..." in place of the text
+                if not task.get('success', True) or str(task.get('content', '')).startswith('Error:'):
+                    result['status'] = 'model_error'
+        except urllib.error.HTTPError as e:
+            result['status'] = f'http_{e.code}'
+        except (TimeoutError, OSError) as e:
+            result['status'] = 'timeout' if 'timed out' in str(e) else f'connection:{type(e).__name__}'
+        except ValueError:
+            result['status'] = 'bad_response'
+        result['latency'] = time.perf_counter() - due
+        return result
+
+    def _wait_job(self, job: dict, due: float) -> dict:
+        job_url = f"{self.url}/jobs/{job['job_id']}"
+        while job['status'] in ('queued', 'running'):
+            if time.perf_counter() - due > self.timeout:
+                return {'status': 'timeout'}
+            time.sleep(self.job_poll_interval)
+            job = json.loads(_call('GET', job_url, self.timeout))
+        outcome = {'status': 'ok' if job['status'] == 'done' else f"job_{job['status']}"}
+        if job.get('started_at') is not None:
+            outcome['queue_wait'] = job['started_at'] - job['created_at']
+        if job['status'] == 'done' and self.fetch_job_results:
+            _call('GET', f'{job_url}/result', self.timeout)
+        return outcome
+
+
+class MetricsSampler(threading.Thread):
+    """Samples the queue depths of /metrics, and the batch size histogram at the start and the end."""
+
+    def __init__(self, url: str, interval: float):
+        super().__init__(daemon=True)
+        self.url = url.rstrip('/') + '/metrics'
+        self.interval = interval
+        self.queue_depths = defaultdict(list)
+        self.first = None
+        self.last = None
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def scrape(self) -> dict:
+        samples = {}
+        for line in _call('GET', self.url, 10).decode('utf-8').splitlines():
+            match = METRIC_LINE.match(line)
+            if match:
+                samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+        return samples
+
+    def run(self):
+        while True:
+            try:
+                samples = self.scrape()
+            except (OSError, ValueError):
+                self.errors += 1
+            else:
+                self.first = self.first or samples
+                self.last = samples
+                for (name, labels), value in samples.items():
+                    if name == 'monkeyocr_queue_depth':
+                        self.queue_depths[labels].append(value)
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def report(self) -> dict:
+        queues = {
+            labels: {'mean': sum(values) / len(values), 'max': max(values), 'samples': len(values)}
+            for labels, values in self.queue_depths.items()
+        }
+        batches = {}
+        if self.first and self.last:
+            for (name, labels), value in self.last.items():
+                if name == 'monkeyocr_batch_size_count':
+                    count = value - self.first.get((name, labels), 0)
+                    total = self.last.get(('monkeyocr_batch_size_sum', labels), 0) - \
+                        self.first.get(('monkeyocr_batch_size_sum', labels), 0)
+                    if count:
+                        batches[labels] = {'batches': int(count), 'mean_size': total / count}
+        return {'queue_depth': queues, 'batch_size': batches, 'scrape_errors': self.errors}
+
+
+def percentile(values: list, q: float) -> float:
+    """Linear interpolation between the closest ranks, q in [0, 100]."""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(results: list, seconds: float) -> dict:
+    def stats(items):
+        latencies = [r['latency'] for r in items if r['status'] == 'ok']
+        errors = defaultdict(int)
+        for r in items:
+            if r['status'] != 'ok':
+                errors[r['status']] += 1
+        queue_waits = [r['queue_wait'] for r in items if r.get('queue_wait') is not None]
+        summary = {
+            'requests': len(items),
+            'ok': len(latencies),
+            'error_rate': (len(items) - len(latencies)) / len(items) if items else 0.0,
+            'errors': dict(errors),
+            'throughput': len(latencies) / seconds if seconds else 0.0,
+            'latency': {f'p{q}': percentile(latencies, q) for q in (50, 95, 99)},
+        }
+        summary['latency']['max'] = max(latencies) if latencies else float('nan')
+        if queue_waits:
+            summary['job_queue_wait'] = {f'p{q}': percentile(queue_waits, q) for q in (50, 95, 99)}
+        return summary
+
+    by_endpoint = defaultdict(list)
+    for r in results:
+        by_endpoint[r['endpoint']].append(r)
+    return {'total': stats(results), 'endpoints': {e: stats(items) for e, items in sorted(by_endpoint.items())}}
+
+
+def _schedule(args, requests):
+    """(due offset in seconds, request) pairs for the open-loop modes."""
+    if args.replay_timing:
+        timed = sorted((r for r in requests if r['at'] is not None), key=lambda r: r['at'])
+        if not timed:
+            raise ValueError('--replay-timing needs "at" in the requests file')
+        return [(r['at'] / args.speed, r) for r in timed]
+
+    rng = random.Random(args.seed)
+    count = args.num_requests or (int(args.duration * args.rate) if args.duration else len(requests))
+    offset, schedule = 0.0, []
+    for request in itertools.islice(itertools.cycle(requests), count):
+        schedule.append((offset, request))
+        offset += rng.expovariate(args.rate) if args.arrival == 'poisson' else 1 / args.rate
+    return schedule
+
+
+def run_open_loop(client, args, requests) -> tuple:
+    schedule = _schedule(args, requests)
+    results, dropped = [], 0
+    in_flight = threading.Semaphore(args.max_in_flight)
+    lock = threading.Lock()
+
+    def task(request, due):
+        try:
+            result = client.send(request, due)
+            with lock:
+                results.append(result)
+        finally:
+            in_flight.release()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        for offset, request in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not in_flight.acquire(blocking=False):
+                # the client is saturated, the request would not be sent on time
+                dropped += 1
+                continue
+            pool.submit(task, request, start + offset)
+    return results, time.perf_counter() - start, dropped
+
+
+def run_closed_loop(client, args, requests) -> tuple:
+    results = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else None
+    remaining = itertools.islice(itertools.cycle(requests), args.num_requests or (None if deadline else len(requests)))
+
+    def worker():
+        while deadline is None or time.perf_counter() < deadline:
+            with lock:
+                request = next(remaining, None)
+            if request is None:
+                return
+            result = client.send(request, time.perf_counter())
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start, 0
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['mode']}: {report['seconds']:.1f}s, {report['dropped']} dropped by the client")
+    print(f"{'endpoint':<16}{'reqs':>7}{'ok':>7}{'err %':>8}{'req/s':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    rows = list(report['endpoints'].items()) + [('total', report['total'])]
+    for endpoint, s in rows:
+        latency = s['latency']
+        print(f"{endpoint:<16}{s['requests']:>7}{s['ok']:>7}{s['error_rate'] * 100:>8.1f}{s['throughput']:>8.2f}"
+              f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}")
+    for endpoint, s in rows:
+        if s['errors']:
+            print(f"errors {endpoint}: {', '.join(f'{k} x{v}' for k, v in sorted(s['errors'].items()))}")
+        if 'job_queue_wait' in s:
+            wait = s['job_queue_wait']
+            print(f"job queue wait {endpoint}: p50 {wait['p50']:.2f}s, p95 {wait['p95']:.2f}s, p99 {wait['p99']:.2f}s")
+    server = report['server']
+    for labels, depth in sorted(server['queue_depth'].items()):
+        print(f"queue depth {{{labels}}}: mean {depth['mean']:.1f}, max {depth['max']:.0f}")
+    for labels, batch in sorted(server['batch_size'].items()):
+        print(f"batch size {{{labels}}}: {batch['batches']} batches, mean {batch['mean_size']:.1f}")
+    if server['scrape_errors']:
+        print(f"/metrics could not be read {server['scrape_errors']} time(s)")
+
+
+def main():
+    parser = ArgumentParser(description='Replay API requests at a target rate or concurrency')
+    parser.add_argument('--url', default='http://127.0.0.1:7861', help='API base url (default: http://127.0.0.1:7861)')
+    parser.add_argument('--requests', required=True, help='JSONL file of requests, see the module docstring')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--rate', type=float, help='open loop, requests per second')
+    mode.add_argument('--concurrency', type=int, help='closed loop, clients sending back to back')
+    mode.add_argument('--replay-timing', action='store_true', help='open loop at the "at" times of the requests file')
+    parser.add_argument('--arrival', default='poisson', choices=['poisson', 'uniform'],
+                        help='arrivals of --rate (default: poisson)')
+    parser.add_argument('--speed', type=float, default=1.0, help='time compression of --replay-timing (default: 1)')
+    parser.add_argument('--duration', type=float, help='seconds of load, the requests file is cycled')
+    parser.add_argument('-n', '--num-requests', type=int, help='requests to send, the requests file is cycled '
+                        '(default: every line once, unless --duration)')
+    parser.add_argument('--max-in-flight', type=int, default=256,
+                        help='open loop only, requests beyond this are dropped and counted (default: 256)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per request, jobs included (default: 600)')
+    parser.add_argument('--job-poll-interval', type=float, default=0.5)
+    parser.add_argument('--fetch-job-results', action='store_true', help='download the result of finished jobs')
+    parser.add_argument('--metrics-interval', type=float, default=1.0, help='seconds between /metrics samples (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the poisson arrivals')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    requests = load_requests(args.requests)
+    client = LoadClient(args.url, args.timeout, args.job_poll_interval, args.fetch_job_results)
+    sampler = MetricsSampler(args.url, args.metrics_interval)
+    sampler.start()
+    try:
+        if args.concurrency:
+            mode = f'closed loop, concurrency {args.concurrency}'
+            results, seconds, dropped = run_closed_loop(client, args, requests)
+        else:
+            mode = 'replayed timing' if args.replay_timing else f'open loop, {args.rate} req/s {args.arrival}'
+            results, seconds, dropped = run_open_loop(client, args, requests)
+    finally:
+        sampler.stop()
+
+    report = {'mode': mode, 'url': args.url, 'seconds': seconds, 'dropped': dropped, **summarize(results, seconds),
+              'server': sampler.report()}
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if not results:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
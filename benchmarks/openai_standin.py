@@ -0,0 +1,137 @@
+"""Local OpenAI-compatible chat server answering like FakeChatModel.
+
+Serves GET /v1/models and POST /v1/chat/completions, enough for the `api`
+chat backend (MonkeyChat_OpenAIAPI). Every answer is sized after the image
+of the request and comes with token usage. The simulated decode time is
+`--latency` plus the completion tokens at `--tokens-per-second`, and at
+most `--slots` requests are decoded at once, the others wait like on a busy
+GPU:
+
+    python -m benchmarks.openai_standin --port 8011
+    # api_config: {url: http://127.0.0.1:8011/v1, model_name: standin, api_key: none}
+"""
+import base64
+import io
+import json
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from benchmarks.fake_models import FakeChatModel
+
+
+def _request_parts(messages: list) -> tuple:
+    """The image and the text of the last user message, in either of the
+    chat completions (image_url/text) and responses (input_image/input_text) forms."""
+    image, question = None, ''
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            question = content
+            continue
+        for part in content or []:
+            if part.get('type') in ('image_url', 'input_image'):
+                url = part.get('image_url')
+                url = url.get('url') if isinstance(url, dict) else url
+                image = Image.open(io.BytesIO(base64.b64decode(url.split(',', 1)[-1])))
+            elif part.get('type') in ('text', 'input_text'):
+                question = part.get('text', '')
+    return image, question
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = 'MonkeyOCRStandin/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': self.server.model_name, 'object': 'model', 'created': 0, 'owned_by': 'standin'},
+            ]})
+        else:
+            self._send_json(404, {'error': {'message': f'no route {self.path}'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'no route {self.path}'}})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            image, question = _request_parts(request.get('messages', []))
+        except (ValueError, OSError) as e:
+            self._send_json(400, {'error': {'message': f'bad request: {e}'}})
+            return
+
+        answer = FakeChatModel.answer(image, question) if image is not None else question
+        # about 4 characters per token, like english text
+        completion_tokens = max(1, len(answer) // 4)
+        with self.server.slots:
+            time.sleep(self.server.latency + completion_tokens / self.server.tokens_per_second)
+        self._send_json(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', self.server.model_name),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': len(question) // 4,
+                'completion_tokens': completion_tokens,
+                'total_tokens': len(question) // 4 + completion_tokens,
+            },
+        })
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8011, model_name: str = 'standin', latency: float = 0.02,
+                tokens_per_second: float = 2000.0, slots: int = 8) -> ThreadingHTTPServer:
+    """The stand-in server, not started yet: serve_forever() it, in a thread if needed."""
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.model_name = model_name
+    server.latency = latency
+    server.tokens_per_second = tokens_per_second
+    server.slots = threading.BoundedSemaphore(slots)
+    return server
+
+
+def start_in_thread(**kwargs) -> ThreadingHTTPServer:
+    """Start the stand-in server in a daemon thread, stop it with shutdown()."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = ArgumentParser(description='Local OpenAI-compatible stand-in for the api chat backend')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8011)
+    parser.add_argument('--model-name', default='standin')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per request (default: 0.02)')
+    parser.add_argument('--tokens-per-second', type=float, default=2000.0,
+                        help='simulated decode speed per request (default: 2000)')
+    parser.add_argument('--slots', type=int, default=8, help='requests decoded at once (default: 8)')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.model_name, args.latency, args.tokens_per_second, args.slots)
+    print(f'OpenAI-compatible stand-in on http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
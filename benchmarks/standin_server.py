@@ -0,0 +1,59 @@
+"""The API app served with the fake models, no GPU or weights needed.
+
+The real api.main app, routes, jobs and batching included, is started with
+FakeMonkeyOCR in place of MonkeyOCR. Queue backends (`*_queue` in
+chat_config.backend) get FakeQueueChatModel with the queue_config of the
+config file, so the queue settings can be tuned against it:
+
+    python -m benchmarks.standin_server -c model_configs.yaml --port 7861 --chat-latency-per-item 0.02
+    python -m benchmarks.load_test --url http://127.0.0.1:7861 --requests benchmarks/load_requests.jsonl --rate 2
+"""
+import os
+from argparse import ArgumentParser
+
+import uvicorn
+
+from magic_pdf.model.model_manager import model_manager
+
+from benchmarks.fake_models import FakeMonkeyOCR
+
+
+def install_fake_model(args) -> FakeMonkeyOCR:
+    """Make model_manager hand out a FakeMonkeyOCR, the app's lifespan keeps it."""
+    model = FakeMonkeyOCR(
+        args.config,
+        layout_latency=args.layout_latency,
+        reader_latency=args.reader_latency,
+        chat_latency_per_call=args.chat_latency_per_call,
+        chat_latency_per_item=args.chat_latency_per_item,
+    )
+    model_manager.monkey_ocr_model = model
+    model_manager.supports_async = hasattr(model.chat_model, 'async_batch_inference')
+    return model
+
+
+def main():
+    parser = ArgumentParser(description='Serve the MonkeyOCR API with GPU-free fake models')
+    parser.add_argument('--app', default='main', choices=['main', 'main_aio'], help='API app to serve (default: main)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7861)
+    parser.add_argument('-c', '--config', default='model_configs.yaml',
+                        help='model config for batching, queues, caches and post-processing (default: model_configs.yaml)')
+    parser.add_argument('--layout-latency', type=float, default=0.05, help='simulated seconds per page of layout')
+    parser.add_argument('--reader-latency', type=float, default=0.005, help='simulated seconds per reading order call')
+    parser.add_argument('--chat-latency-per-call', type=float, default=0.05, help='simulated seconds per recognition call')
+    parser.add_argument('--chat-latency-per-item', type=float, default=0.01, help='simulated seconds per recognized crop')
+    args = parser.parse_args()
+
+    os.environ['MONKEYOCR_CONFIG'] = args.config
+    install_fake_model(args)
+    # imported after the fake model is installed, initialize_model() returns it
+    if args.app == 'main_aio':
+        from api.main_aio import app
+    else:
+        from api.main import app
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Deterministic synthetic model output, as doc_analyze_llm returns it.
+
+Every page gets `blocks_per_page` layout boxes (titles, text, images and
+tables with captions, formulas and discarded headers) and the recognition
+results that come with them, at 200 dpi like the rasterized pages. The
+share of the page the boxes cover and how far they reach into each other
+are controllable, so the post-processing can be measured on sparse, dense
+and overlapping layouts without running any model.
+"""
+import random
+
+import fitz
+
+from benchmarks.synthetic_pdf import MARGIN, PAGE_HEIGHT, PAGE_WIDTH, WORDS
+
+DPI = 200
+
+# category_id, weight
+BLOCK_CATEGORIES = (
+    (1, 8),   # text
+    (0, 1),   # title
+    (3, 1),   # image, with an image caption below it
+    (5, 1),   # table, with a table caption above it
+    (8, 1),   # interline formula
+    (2, 1),   # discarded header or footer
+)
+
+TEXT_CATEGORIES = (0, 1, 4, 6)
+
+
+def _poly(x0, y0, x1, y1):
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+def _text(rng: random.Random, width: float, height: float) -> str:
+    # roughly one word per 60x40 pixels of the box, like a 10pt font at 200 dpi
+    num_words = max(1, int(width * height) // 2400)
+    return ' '.join(rng.choice(WORDS) for _ in range(num_words)).capitalize() + '.'
+
+
+def _recognized(rng, category_id, bbox):
+    """Layout entries of one box once it went through recognition."""
+    x0, y0, x1, y1 = bbox
+    det = {'category_id': category_id, 'poly': _poly(x0, y0, x1, y1), 'score': round(rng.uniform(0.5, 1.0), 3)}
+    if category_id in TEXT_CATEGORIES:
+        return [det, {'category_id': 15, 'poly': det['poly'], 'score': 1.0, 'text': _text(rng, x1 - x0, y1 - y0)}]
+    if category_id == 5:
+        rows = max(1, int(y1 - y0) // 45)
+        cells = ''.join('<tr>' + ''.join(f'<td>{rng.choice(WORDS)}</td>' for _ in range(4)) + '</tr>' for _ in range(rows))
+        det.update(score=1.0, html=f'<table>{cells}</table>')
+        return [det]
+    if category_id == 8:
+        return [det, {'category_id': 14, 'poly': det['poly'], 'score': 1.0, 'latex': f'x_{{{int(x0)}}} = y^{{{int(y0)}}}'}]
+    return [det]
+
+
+def make_page(rng: random.Random, page_no: int, num_blocks: int, density: float = 0.6, overlap: float = 0.0,
+              columns: int = 1) -> dict:
+    """Model output of one page.
+
+    Args:
+        rng (random.Random): source of the layout and the text
+        page_no (int): index of the page
+        num_blocks (int): layout boxes on the page, captions included
+        density (float, optional): share of the usable height of every column covered by boxes. Defaults to 0.6.
+        overlap (float, optional): share of the next box of the column every box reaches into. Defaults to 0.
+        columns (int, optional): number of columns. Defaults to 1.
+
+    Returns:
+        dict: {'layout_dets': [...], 'page_info': {...}} like doc_analyze_llm
+    """
+    scale = DPI / 72
+    width, height = int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)
+    margin = MARGIN * scale
+    column_width = (width - 2 * margin) / columns
+    usable_height = height - 2 * margin
+
+    # captions are boxes of their own
+    categories = []
+    while len(categories) < num_blocks:
+        category_id = rng.choices(BLOCK_CATEGORIES, weights=[c[1] for c in BLOCK_CATEGORIES])[0][0]
+        if category_id == 3:
+            categories.extend([3, 4])
+        elif category_id == 5:
+            categories.extend([6, 5])
+        else:
+            categories.append(category_id)
+    categories = categories[:num_blocks]
+
+    layout_dets = []
+    per_column = [categories[i::columns] for i in range(columns)]
+    for column, column_categories in enumerate(per_column):
+        if not column_categories:
+            continue
+        slot = usable_height / len(column_categories)
+        box_height = max(2.0, slot * density)
+        left = margin + column * column_width
+        for i, category_id in enumerate(column_categories):
+            top = margin + i * slot
+            bottom = top + box_height
+            if overlap > 0 and i + 1 < len(column_categories):
+                # down to the top of the next box, then `overlap` of its height into it
+                bottom = top + slot + box_height * overlap
+            indent = rng.uniform(0, column_width * 0.1)
+            right = left + column_width * rng.uniform(0.7, 0.98)
+            bbox = [round(left + indent, 1), round(top, 1), round(right, 1), round(bottom, 1)]
+            layout_dets.extend(_recognized(rng, category_id, bbox))
+
+    return {'layout_dets': layout_dets, 'page_info': {'page_no': page_no, 'height': height, 'width': width}}
+
+
+def make_model_json(num_pages: int, blocks_per_page: int, density: float = 0.6, overlap: float = 0.0,
+                    columns: int = 1, seed: int = 0) -> list:
+    """Model output of `num_pages` pages, see make_page for the arguments."""
+    rng = random.Random(seed)
+    return [make_page(rng, page_no, blocks_per_page, density, overlap, columns) for page_no in range(num_pages)]
+
+
+def make_blank_pdf(num_pages: int) -> bytes:
+    """Empty pages of the size make_model_json assumes, the dataset of the model output."""
+    doc = fitz.open()
+    for _ in range(num_pages):
+        doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
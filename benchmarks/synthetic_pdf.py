@@ -0,0 +1,133 @@
+"""Deterministic synthetic PDFs: a title, then paragraphs, ruled tables and
+filled figures in a single column. The same seed always gives the same
+bytes, so benchmark outputs can be compared across runs. The text drawn on
+the pages is available as ground truth for accuracy measurements."""
+import os
+import random
+
+import fitz
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 60
+BLOCK_GAP = 18
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et '
+    'dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea '
+    'commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur'
+).split()
+
+
+def _sentence(rng: random.Random, num_words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(num_words)).capitalize() + '.'
+
+
+def _paragraph(page, rng, top, texts):
+    height = rng.randint(40, 130)
+    rect = fitz.Rect(MARGIN, top, PAGE_WIDTH - MARGIN, top + height)
+    # about 11 words per 13pt line, insert_textbox draws nothing when the text overflows
+    words_left = (height // 13) * 11
+    sentences = []
+    while words_left > 0:
+        num_words = min(words_left, rng.randint(6, 16))
+        sentences.append(_sentence(rng, num_words))
+        words_left -= num_words
+    text = ' '.join(sentences)
+    page.insert_textbox(rect, text, fontsize=10, fontname='helv')
+    texts.append(text)
+    return height
+
+
+def _table(page, rng, top, texts):
+    rows, cols = rng.randint(3, 8), rng.randint(3, 6)
+    row_height = 16
+    width = PAGE_WIDTH - 2 * MARGIN
+    col_width = width / cols
+    for r in range(rows + 1):
+        y = top + r * row_height
+        page.draw_line((MARGIN, y), (PAGE_WIDTH - MARGIN, y), width=0.8)
+    for c in range(cols + 1):
+        x = MARGIN + c * col_width
+        page.draw_line((x, top), (x, top + rows * row_height), width=0.8)
+    cells = []
+    for r in range(rows):
+        for c in range(cols):
+            cell = fitz.Rect(MARGIN + c * col_width + 3, top + r * row_height + 3,
+                             MARGIN + (c + 1) * col_width - 3, top + (r + 1) * row_height)
+            cells.append(f'{rng.choice(WORDS)} {rng.randint(0, 999)}')
+            page.insert_textbox(cell, cells[-1], fontsize=8, fontname='helv')
+    texts.append(' '.join(cells))
+    return rows * row_height
+
+
+def _figure(page, rng, top, texts):
+    height = rng.randint(80, 200)
+    left = MARGIN + rng.randint(0, 120)
+    rect = fitz.Rect(left, top, left + rng.randint(200, PAGE_WIDTH - 2 * MARGIN - 120), top + height)
+    shade = rng.uniform(0.2, 0.6)
+    page.draw_rect(rect, color=(shade, shade, shade), fill=(shade, shade, shade))
+    return height
+
+
+BLOCK_KINDS = (('text', 6, _paragraph), ('table', 1, _table), ('figure', 1, _figure))
+
+
+def make_pdf_with_text(num_pages: int, seed: int = 0) -> tuple:
+    """Generate a PDF of `num_pages` pages and the text drawn on it.
+
+    Args:
+        num_pages (int): number of pages
+        seed (int, optional): seed of the layout and the text. Defaults to 0.
+
+    Returns:
+        tuple: (the PDF bytes, the title, paragraphs and table cells in reading order)
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    texts = []
+    for page_index in range(num_pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        title = f'{page_index + 1}. {_sentence(rng, 4)}'
+        page.insert_text((MARGIN, MARGIN + 20), title, fontsize=18, fontname='hebo')
+        texts.append(title)
+        top = MARGIN + 20 + 2 * BLOCK_GAP
+        while True:
+            _, _, draw = rng.choices(BLOCK_KINDS, weights=[kind[1] for kind in BLOCK_KINDS])[0]
+            # stop once the tallest block (a 200pt figure) might not fit
+            if top + 210 > PAGE_HEIGHT - MARGIN:
+                break
+            top += draw(page, rng, top, texts) + BLOCK_GAP
+    doc.set_metadata({})
+    pdf_bytes = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return pdf_bytes, '\n\n'.join(texts)
+
+
+def make_pdf(num_pages: int, seed: int = 0) -> bytes:
+    """Generate a PDF of `num_pages` pages, see make_pdf_with_text."""
+    return make_pdf_with_text(num_pages, seed)[0]
+
+
+def make_corpus(out_dir: str, num_docs: int, pages_per_doc: int, seed: int = 0, ground_truth: bool = False) -> list:
+    """Write `num_docs` PDFs of `pages_per_doc` pages into out_dir.
+
+    With `ground_truth`, the text of every PDF is written next to it, as
+    <name>.md.
+
+    Returns:
+        list: paths of the PDFs
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(num_docs):
+        path = os.path.join(out_dir, f'synthetic_{seed}_{i:03d}_{pages_per_doc}p.pdf')
+        text_path = os.path.splitext(path)[0] + '.md'
+        if not os.path.exists(path) or (ground_truth and not os.path.exists(text_path)):
+            pdf_bytes, text = make_pdf_with_text(pages_per_doc, seed=seed * 100003 + i)
+            with open(path, 'wb') as f:
+                f.write(pdf_bytes)
+            if ground_truth:
+                with open(text_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+        paths.append(path)
+    return paths
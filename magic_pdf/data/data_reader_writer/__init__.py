@@ -9,4 +9,10 @@ from magic_pdf.data.data_reader_writer.multi_bucket_s3 import \
 from magic_pdf.data.data_reader_writer.s3 import S3DataReader  # noqa: F401
 from magic_pdf.data.data_reader_writer.s3 import S3DataWriter  # noqa: F401
 from magic_pdf.data.data_reader_writer.base import DataReader  # noqa: F401
-from magic_pdf.data.data_reader_writer.base import DataWriter  # noqa: F401
\ No newline at end of file
+from magic_pdf.data.data_reader_writer.base import DataWriter  # noqa: F401
+from magic_pdf.data.data_reader_writer.buffered import \
+    BufferedDataWriter  # noqa: F401
+from magic_pdf.data.data_reader_writer.memory import \
+    MemoryDataWriter  # noqa: F401
+from magic_pdf.data.data_reader_writer.prefetch import \
+    PrefetchDataReader  # noqa: F401
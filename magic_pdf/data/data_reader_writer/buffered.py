@@ -0,0 +1,158 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from magic_pdf.data.data_reader_writer.base import DataWriter
+
+_write_pool = None
+_write_pool_lock = threading.Lock()
+
+
+def get_write_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by all buffered writers of the process."""
+    global _write_pool
+    with _write_pool_lock:
+        if _write_pool is None:
+            _write_pool = ThreadPoolExecutor(thread_name_prefix='buffered-writer')
+        return _write_pool
+
+
+@atexit.register
+def _shutdown_write_pool():
+    global _write_pool
+    with _write_pool_lock:
+        if _write_pool is not None:
+            _write_pool.shutdown(wait=True)
+            _write_pool = None
+
+
+class BufferedDataWriter(DataWriter):
+    """Buffer writes in memory and hand them to a thread pool in batches.
+
+    Small writes (image crops, json files) are collected until the buffer
+    holds `max_buffer_items` files or `max_buffer_bytes` bytes, then every
+    buffered file is written concurrently through the wrapped writer, on a
+    thread pool shared by all buffered writers.
+    flush() writes the rest and waits, it is called by the pipeline at the
+    end of every document and by the context manager on exit.
+    """
+
+    def __init__(self, writer: DataWriter, max_workers: int = 8, max_buffer_items: int = 64,
+                 max_buffer_bytes: int = 16 * 1024 * 1024, max_pending_batches: int = 4):
+        """Initialized method.
+
+        Args:
+            writer (DataWriter): the writer doing the actual writes
+            max_workers (int, optional): concurrent writes of this writer. Defaults to 8.
+            max_buffer_items (int, optional): buffered files before a batch is written. Defaults to 64.
+            max_buffer_bytes (int, optional): buffered bytes before a batch is written. Defaults to 16MB.
+            max_pending_batches (int, optional): batches in flight before write() blocks. Defaults to 4.
+        """
+        self.writer = writer
+        self.max_workers = max_workers
+        self.max_buffer_items = max_buffer_items
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_pending_batches = max_pending_batches
+        self._buffer = {}
+        self._buffer_bytes = 0
+        self._pending = set()
+        self._errors = []
+        self._batches = threading.BoundedSemaphore(max_pending_batches)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # buffered data and threads stay in this process, a pickled copy starts empty
+        return {
+            'writer': self.writer,
+            'max_workers': self.max_workers,
+            'max_buffer_items': self.max_buffer_items,
+            'max_buffer_bytes': self.max_buffer_bytes,
+            'max_pending_batches': self.max_pending_batches,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, path: str, data: bytes) -> None:
+        """Buffer the data, it reaches the wrapped writer at the latest on
+        flush(). A later write to the same path replaces the buffered data.
+
+        Args:
+            path (str): the target file where to write
+            data (bytes): the data want to write
+        """
+        with self._lock:
+            previous = self._buffer.pop(path, None)
+            if previous is not None:
+                self._buffer_bytes -= len(previous)
+            self._buffer[path] = data
+            self._buffer_bytes += len(data)
+            full = (len(self._buffer) >= self.max_buffer_items
+                    or self._buffer_bytes >= self.max_buffer_bytes)
+        if full:
+            self._write_batch()
+
+    def _take_buffer(self):
+        with self._lock:
+            batch = list(self._buffer.items())
+            self._buffer = {}
+            self._buffer_bytes = 0
+        return batch
+
+    def _write_batch(self) -> None:
+        self._batches.acquire()
+        batch = self._take_buffer()
+        if not batch:
+            self._batches.release()
+            return
+        # the batch is cut into max_workers slices, each written in order by one pool thread
+        slice_count = min(max(self.max_workers, 1), len(batch))
+        pool = get_write_pool()
+        with self._lock:
+            futures = [pool.submit(self._write_slice, batch[i::slice_count]) for i in range(slice_count)]
+            self._pending.update(futures)
+        remaining = [len(futures)]
+
+        def done(future):
+            with self._lock:
+                self._pending.discard(future)
+                if future.exception() is not None:
+                    self._errors.append(future.exception())
+                remaining[0] -= 1
+                batch_done = remaining[0] == 0
+            if batch_done:
+                self._batches.release()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _write_slice(self, items) -> None:
+        errors = []
+        for path, data in items:
+            try:
+                self.writer.write(path, data)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def flush(self) -> None:
+        """Write everything buffered and wait for all writes, the first
+        failed write is raised."""
+        self._write_batch()
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        self.flush()
@@ -43,6 +43,13 @@ class FileBasedDataWriter(DataWriter):
             parent_dir (str, optional): the parent directory that may be used within methods. Defaults to ''.
         """
         self._parent_dir = parent_dir
+        self._created_dirs = set()
+
+    def __getstate__(self):
+        return {'_parent_dir': self._parent_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['_parent_dir'])
 
     def write(self, path: str, data: bytes) -> None:
         """Write file with data.
@@ -55,8 +62,10 @@ class FileBasedDataWriter(DataWriter):
         if not os.path.isabs(fn_path) and len(self._parent_dir) > 0:
             fn_path = os.path.join(self._parent_dir, path)
 
-        if not os.path.exists(os.path.dirname(fn_path)) and os.path.dirname(fn_path) != "":
-            os.makedirs(os.path.dirname(fn_path), exist_ok=True)
+        dir_name = os.path.dirname(fn_path)
+        if dir_name != "" and dir_name not in self._created_dirs:
+            os.makedirs(dir_name, exist_ok=True)
+            self._created_dirs.add(dir_name)
 
         with open(fn_path, 'wb') as f:
             f.write(data)
@@ -0,0 +1,60 @@
+import threading
+
+from magic_pdf.data.data_reader_writer.base import DataWriter
+
+
+class MemoryDataWriter(DataWriter):
+    """Keep the written files in memory.
+
+    Used to assemble results (markdown, json, crops, debug pdfs) that are
+    packaged and sent elsewhere, without a round trip through a temp dir.
+    Writers returned by sub_writer() share the same files below a prefix.
+    """
+
+    def __init__(self, prefix: str = ''):
+        """Initialized method.
+
+        Args:
+            prefix (str, optional): prefix of every path written by this writer. Defaults to ''.
+        """
+        self._prefix = prefix.strip('/')
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _full_path(self, path: str) -> str:
+        path = path.lstrip('/')
+        return f'{self._prefix}/{path}' if self._prefix else path
+
+    def write(self, path: str, data: bytes) -> None:
+        """Write file with data.
+
+        Args:
+            path (str): the path of file, joined with the prefix of the writer
+            data (bytes): the data want to write
+        """
+        with self._lock:
+            self._files[self._full_path(path)] = bytes(data)
+
+    def exists(self, path: str) -> bool:
+        with self._lock:
+            return self._full_path(path) in self._files
+
+    def sub_writer(self, prefix: str) -> 'MemoryDataWriter':
+        """Writer sharing the files of this writer, below `prefix`."""
+        writer = MemoryDataWriter(self._full_path(prefix))
+        writer._files = self._files
+        writer._lock = self._lock
+        return writer
+
+    def files(self) -> dict:
+        """Get the written files.
+
+        Returns:
+            dict: path -> bytes of every file written through this writer or its sub writers
+        """
+        with self._lock:
+            return dict(self._files)
+
+    def total_size(self) -> int:
+        with self._lock:
+            return sum(len(data) for data in self._files.values())
@@ -0,0 +1,64 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from magic_pdf.data.data_reader_writer.base import DataReader
+from magic_pdf.data.io.s3 import MAX_POOL_CONNECTIONS
+
+
+class PrefetchDataReader(DataReader):
+    """Read a batch of files while the caller works on the previous ones.
+
+    read_iter() keeps the next `prefetch` files of the batch downloading in
+    a thread pool, so the time spent processing one document hides the
+    latency of fetching the next ones. S3 readers share the pooled client of
+    get_s3_client, the pool is kept below its connection limit.
+    """
+
+    def __init__(self, reader: DataReader, prefetch: int = 4):
+        """Initialized method.
+
+        Args:
+            reader (DataReader): the reader doing the actual reads
+            prefetch (int, optional): files downloaded ahead of the consumer. Defaults to 4.
+        """
+        self.reader = reader
+        self.prefetch = min(max(prefetch, 1), MAX_POOL_CONNECTIONS)
+
+    def read_at(self, path: str, offset: int = 0, limit: int = -1) -> bytes:
+        return self.reader.read_at(path, offset, limit)
+
+    def read(self, path: str) -> bytes:
+        return self.reader.read(path)
+
+    def read_iter(self, paths: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+        """Read the files in order.
+
+        Args:
+            paths (Iterable[str]): the files to read
+
+        Yields:
+            tuple[str, bytes]: the path and the content of every file
+        """
+        paths = iter(paths)
+        executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix='prefetch-reader')
+        in_flight = deque()
+
+        def fill():
+            while len(in_flight) < self.prefetch:
+                path = next(paths, None)
+                if path is None:
+                    return
+                in_flight.append((path, executor.submit(self.reader.read, path)))
+
+        try:
+            fill()
+            while in_flight:
+                path, future = in_flight.popleft()
+                data = future.result()
+                fill()
+                yield path, data
+        finally:
+            # the consumer stopped early: drop the queued reads and do not
+            # wait for the running ones, nobody reads them
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -7,7 +7,7 @@ from loguru import logger
 
 from magic_pdf.config.enums import SupportedPdfParseMethod
 from magic_pdf.data.schemas import PageInfo
-from magic_pdf.data.utils import fitz_doc_to_image
+from magic_pdf.data.utils import fitz_doc_to_image, fitz_lock
 from magic_pdf.filter import classify
 
 
@@ -104,6 +104,14 @@ class Dataset(ABC):
         """
         pass
 
+    def dump_to_bytes(self) -> bytes:
+        """Dump the file to bytes, including the drawings made on its pages.
+
+        Returns:
+            bytes: the pdf bytes
+        """
+        return self._raw_fitz.tobytes()
+
     @abstractmethod
     def apply(self, proc: Callable, *args, **kwargs):
         """Apply callable method which.
@@ -132,6 +140,15 @@ class Dataset(ABC):
         """
         pass
 
+    @abstractmethod
+    def init_args(self) -> tuple:
+        """The arguments this dataset was created with."""
+        pass
+
+    def __reduce__(self):
+        # fitz documents can not be pickled, a copy sent to another process is rebuilt like clone()
+        return type(self), self.init_args()
+
 
 class PymuDocDataset(Dataset):
     def __init__(self, bits: bytes, lang=None):
@@ -220,6 +237,9 @@ class PymuDocDataset(Dataset):
         """
         return PymuDocDataset(self._raw_data)
 
+    def init_args(self) -> tuple:
+        return self._raw_data, self._lang
+
 
 class ImageDataset(Dataset):
     def __init__(self, bits: bytes):
@@ -301,6 +321,9 @@ class ImageDataset(Dataset):
         """
         return ImageDataset(self._raw_data)
 
+    def init_args(self) -> tuple:
+        return (self._raw_data,)
+
 
 class MultiFileDataset(Dataset):
     def __init__(self, file_bytes_list: list[bytes], file_extensions: list[str] = None):
@@ -456,6 +479,9 @@ class MultiFileDataset(Dataset):
         """
         return MultiFileDataset(self._raw_data, file_extensions=self._file_extensions)
 
+    def init_args(self) -> tuple:
+        return self._raw_data, self._file_extensions
+
     @property
     def file_info(self) -> list[dict]:
         """Get information about each file in the dataset.
@@ -509,6 +535,13 @@ class Doc(PageableData):
 
     def __init__(self, doc: fitz.Page):
         self._doc = doc
+        self._image = None
+
+    def prerender(self):
+        """Render the page ahead of time, e.g. while the model is busy with
+        another document. The next get_image() call hands the image over."""
+        with fitz_lock:
+            self._image = fitz_doc_to_image(self._doc)
 
     def get_image(self):
         """Return the image info.
@@ -520,7 +553,11 @@ class Doc(PageableData):
                 height: int
             }
         """
-        return fitz_doc_to_image(self._doc)
+        if self._image is not None:
+            image, self._image = self._image, None
+            return image
+        with fitz_lock:
+            return fitz_doc_to_image(self._doc)
 
     def get_doc(self) -> fitz.Page:
         """Get the pymudoc object.
@@ -536,8 +573,9 @@ class Doc(PageableData):
         Returns:
             PageInfo: the page info of this page
         """
-        page_w = self._doc.rect.width
-        page_h = self._doc.rect.height
+        with fitz_lock:
+            page_w = self._doc.rect.width
+            page_h = self._doc.rect.height
         return PageInfo(w=page_w, h=page_h)
 
     def __getattr__(self, name):
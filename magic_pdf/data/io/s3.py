@@ -1,8 +1,47 @@
+import threading
+from io import BytesIO
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
 from magic_pdf.data.io.base import IOReader, IOWriter
 
+# objects larger than this are uploaded as concurrent multipart uploads
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+MULTIPART_CONCURRENCY = 8
+MAX_POOL_CONNECTIONS = 32
+
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_client(ak: str, sk: str, endpoint_url: str, addressing_style: str = 'auto'):
+    """Shared boto3 client per credential and endpoint.
+
+    boto3 clients are thread safe, sharing them lets all readers and writers
+    of the process reuse one connection pool instead of building a client
+    (and its connections) per bucket configuration.
+    """
+    key = (ak, sk, endpoint_url, addressing_style)
+    with _s3_clients_lock:
+        client = _s3_clients.get(key)
+        if client is None:
+            client = boto3.client(
+                service_name='s3',
+                aws_access_key_id=ak,
+                aws_secret_access_key=sk,
+                endpoint_url=endpoint_url,
+                config=Config(
+                    s3={'addressing_style': addressing_style},
+                    retries={'max_attempts': 5, 'mode': 'standard'},
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                ),
+            )
+            _s3_clients[key] = client
+    return client
+
 
 class S3Reader(IOReader):
     def __init__(
@@ -26,16 +65,17 @@ class S3Reader(IOReader):
         self._bucket = bucket
         self._ak = ak
         self._sk = sk
-        self._s3_client = boto3.client(
-            service_name='s3',
-            aws_access_key_id=ak,
-            aws_secret_access_key=sk,
-            endpoint_url=endpoint_url,
-            config=Config(
-                s3={'addressing_style': addressing_style},
-                retries={'max_attempts': 5, 'mode': 'standard'},
-            ),
-        )
+        self._endpoint_url = endpoint_url
+        self._addressing_style = addressing_style
+        self._s3_client = get_s3_client(ak, sk, endpoint_url, addressing_style)
+
+    def __getstate__(self):
+        # the client is not picklable, the copy takes one from the pool of its process
+        return {k: v for k, v in self.__dict__.items() if k != '_s3_client'}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._s3_client = get_s3_client(self._ak, self._sk, self._endpoint_url, self._addressing_style)
 
     def read(self, key: str) -> bytes:
         """Read the file.
@@ -93,16 +133,17 @@ class S3Writer(IOWriter):
         self._bucket = bucket
         self._ak = ak
         self._sk = sk
-        self._s3_client = boto3.client(
-            service_name='s3',
-            aws_access_key_id=ak,
-            aws_secret_access_key=sk,
-            endpoint_url=endpoint_url,
-            config=Config(
-                s3={'addressing_style': addressing_style},
-                retries={'max_attempts': 5, 'mode': 'standard'},
-            ),
-        )
+        self._endpoint_url = endpoint_url
+        self._addressing_style = addressing_style
+        self._s3_client = get_s3_client(ak, sk, endpoint_url, addressing_style)
+
+    def __getstate__(self):
+        # the client is not picklable, the copy takes one from the pool of its process
+        return {k: v for k, v in self.__dict__.items() if k != '_s3_client'}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._s3_client = get_s3_client(self._ak, self._sk, self._endpoint_url, self._addressing_style)
 
     def write(self, key: str, data: bytes):
         """Write file with data.
@@ -111,4 +152,17 @@ class S3Writer(IOWriter):
             path (str): the path of file, if the path is relative path, it will be joined with parent_dir.
             data (bytes): the data want to write
         """
-        self._s3_client.put_object(Bucket=self._bucket, Key=key, Body=data)
+        if len(data) < MULTIPART_THRESHOLD:
+            self._s3_client.put_object(Bucket=self._bucket, Key=key, Body=data)
+            return
+        # zipped results, debug pdfs: parts are uploaded concurrently
+        self._s3_client.upload_fileobj(
+            BytesIO(data),
+            self._bucket,
+            key,
+            Config=TransferConfig(
+                multipart_threshold=MULTIPART_THRESHOLD,
+                multipart_chunksize=MULTIPART_CHUNKSIZE,
+                max_concurrency=MULTIPART_CONCURRENCY,
+            ),
+        )
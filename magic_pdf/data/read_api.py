@@ -3,31 +3,48 @@ import os
 import tempfile
 import shutil
 from pathlib import Path
+from typing import Iterator
 
 from magic_pdf.config.exceptions import EmptyData, InvalidParams
-from magic_pdf.data.data_reader_writer import (FileBasedDataReader,
-                                               MultiBucketS3DataReader)
+from magic_pdf.data.data_reader_writer import (DataReader,
+                                               FileBasedDataReader,
+                                               MultiBucketS3DataReader,
+                                               PrefetchDataReader)
 from magic_pdf.data.dataset import ImageDataset, PymuDocDataset
 from magic_pdf.utils.office_to_pdf import convert_file_to_pdf, ConvertToPdfError
 
-def read_jsonl(
-    s3_path_or_local: str, s3_client: MultiBucketS3DataReader | None = None
-) -> list[PymuDocDataset]:
-    """Read the jsonl file and return the list of PymuDocDataset.
+class _LocationReader(DataReader):
+    """Reads the s3 locations of a jsonl with the s3 client, the others from disk."""
+
+    def __init__(self, s3_client: MultiBucketS3DataReader | None):
+        self.s3_client = s3_client
+        self.local_reader = FileBasedDataReader('')
+
+    def read_at(self, path: str, offset: int = 0, limit: int = -1) -> bytes:
+        if path.startswith('s3://'):
+            return self.s3_client.read_at(path, offset, limit)
+        return self.local_reader.read_at(path, offset, limit)
+
+
+def iter_jsonl(
+    s3_path_or_local: str, s3_client: MultiBucketS3DataReader | None = None, prefetch: int = 4
+) -> Iterator[PymuDocDataset]:
+    """Read the jsonl file and yield a PymuDocDataset per line, the next
+    `prefetch` files download while the caller processes the current one.
 
     Args:
         s3_path_or_local (str): local file or s3 path
         s3_client (MultiBucketS3DataReader | None, optional): s3 client that support multiple bucket. Defaults to None.
+        prefetch (int, optional): files downloaded ahead. Defaults to 4.
 
     Raises:
         InvalidParams: if s3_path_or_local is s3 path but s3_client is not provided.
         EmptyData: if no pdf file location is provided in some line of jsonl file.
         InvalidParams: if the file location is s3 path but s3_client is not provided
 
-    Returns:
-        list[PymuDocDataset]: each line in the jsonl file will be converted to a PymuDocDataset
+    Yields:
+        PymuDocDataset: each line in the jsonl file converted to a PymuDocDataset
     """
-    bits_arr = []
     if s3_path_or_local.startswith('s3://'):
         if s3_client is None:
             raise InvalidParams('s3_client is required when s3_path is provided')
@@ -37,17 +54,37 @@ def read_jsonl(
     jsonl_d = [
         json.loads(line) for line in jsonl_bits.decode().split('\n') if line.strip()
     ]
+    pdf_paths = []
     for d in jsonl_d:
         pdf_path = d.get('file_location', '') or d.get('path', '')
         if len(pdf_path) == 0:
             raise EmptyData('pdf file location is empty')
-        if pdf_path.startswith('s3://'):
-            if s3_client is None:
-                raise InvalidParams('s3_client is required when s3_path is provided')
-            bits_arr.append(s3_client.read(pdf_path))
-        else:
-            bits_arr.append(FileBasedDataReader('').read(pdf_path))
-    return [PymuDocDataset(bits) for bits in bits_arr]
+        if pdf_path.startswith('s3://') and s3_client is None:
+            raise InvalidParams('s3_client is required when s3_path is provided')
+        pdf_paths.append(pdf_path)
+    reader = PrefetchDataReader(_LocationReader(s3_client), prefetch)
+    for _, bits in reader.read_iter(pdf_paths):
+        yield PymuDocDataset(bits)
+
+
+def read_jsonl(
+    s3_path_or_local: str, s3_client: MultiBucketS3DataReader | None = None
+) -> list[PymuDocDataset]:
+    """Read the jsonl file and return the list of PymuDocDataset.
+
+    Args:
+        s3_path_or_local (str): local file or s3 path
+        s3_client (MultiBucketS3DataReader | None, optional): s3 client that support multiple bucket. Defaults to None.
+
+    Raises:
+        InvalidParams: if s3_path_or_local is s3 path but s3_client is not provided.
+        EmptyData: if no pdf file location is provided in some line of jsonl file.
+        InvalidParams: if the file location is s3 path but s3_client is not provided
+
+    Returns:
+        list[PymuDocDataset]: each line in the jsonl file will be converted to a PymuDocDataset
+    """
+    return list(iter_jsonl(s3_path_or_local, s3_client))
 
 
 def read_local_pdfs(path: str) -> list[PymuDocDataset]:
@@ -1,9 +1,16 @@
+import threading
+
 import fitz
 import numpy as np
 from loguru import logger
 
 from magic_pdf.utils.annotations import ImportPIL
 
+# PyMuPDF is not thread-safe, threads working on fitz objects at the same
+# time (e.g. parse.py rendering ahead while earlier documents are
+# post-processed) hold this lock around their fitz calls
+fitz_lock = threading.RLock()
+
 
 @ImportPIL
 def fitz_doc_to_image(doc, dpi=200) -> dict:
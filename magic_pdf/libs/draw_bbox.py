@@ -2,10 +2,21 @@ import fitz
 from magic_pdf.config.constants import CROSS_PAGE
 from magic_pdf.config.ocr_content_type import (BlockType, CategoryId,
                                                ContentType)
+from magic_pdf.data.data_reader_writer import DataWriter
 from magic_pdf.data.dataset import Dataset
+from magic_pdf.data.utils import fitz_lock
 from magic_pdf.model.magic_model import MagicModel
 
 
+def save_pdf(pdf_docs, out_path, filename):
+    """Save the drawn pdf to out_path/filename, out_path may also be a
+    DataWriter, filename is then the path given to the writer."""
+    if isinstance(out_path, DataWriter):
+        out_path.write(filename, pdf_docs.tobytes())
+    else:
+        pdf_docs.save(f'{out_path}/{filename}')
+
+
 def draw_bbox_without_number(i, bbox_list, page, rgb_config, fill_config):
     new_rgb = []
     for item in rgb_config:
@@ -171,31 +182,32 @@ def draw_layout_bbox(pdf_info, pdf_bytes, out_path, filename):
 
         layout_bbox_list.append(page_block_list)
 
-    pdf_docs = fitz.open('pdf', pdf_bytes)
+    with fitz_lock:
+        pdf_docs = fitz.open('pdf', pdf_bytes)
 
-    for i, page in enumerate(pdf_docs):
+        for i, page in enumerate(pdf_docs):
 
-        draw_bbox_without_number(i, dropped_bbox_list, page, [158, 158, 158], True)
-        # draw_bbox_without_number(i, tables_list, page, [153, 153, 0], True)  # color !
-        draw_bbox_without_number(i, tables_body_list, page, [204, 204, 0], True)
-        draw_bbox_without_number(i, tables_caption_list, page, [255, 255, 102], True)
-        draw_bbox_without_number(i, tables_footnote_list, page, [229, 255, 204], True)
-        # draw_bbox_without_number(i, imgs_list, page, [51, 102, 0], True)
-        draw_bbox_without_number(i, imgs_body_list, page, [153, 255, 51], True)
-        draw_bbox_without_number(i, imgs_caption_list, page, [102, 178, 255], True)
-        draw_bbox_without_number(i, imgs_footnote_list, page, [255, 178, 102], True),
-        draw_bbox_without_number(i, titles_list, page, [102, 102, 255], True)
-        draw_bbox_without_number(i, texts_list, page, [153, 0, 76], True)
-        draw_bbox_without_number(i, interequations_list, page, [0, 255, 0], True)
-        draw_bbox_without_number(i, lists_list, page, [40, 169, 92], True)
-        draw_bbox_without_number(i, indexs_list, page, [40, 169, 92], True)
+            draw_bbox_without_number(i, dropped_bbox_list, page, [158, 158, 158], True)
+            # draw_bbox_without_number(i, tables_list, page, [153, 153, 0], True)  # color !
+            draw_bbox_without_number(i, tables_body_list, page, [204, 204, 0], True)
+            draw_bbox_without_number(i, tables_caption_list, page, [255, 255, 102], True)
+            draw_bbox_without_number(i, tables_footnote_list, page, [229, 255, 204], True)
+            # draw_bbox_without_number(i, imgs_list, page, [51, 102, 0], True)
+            draw_bbox_without_number(i, imgs_body_list, page, [153, 255, 51], True)
+            draw_bbox_without_number(i, imgs_caption_list, page, [102, 178, 255], True)
+            draw_bbox_without_number(i, imgs_footnote_list, page, [255, 178, 102], True),
+            draw_bbox_without_number(i, titles_list, page, [102, 102, 255], True)
+            draw_bbox_without_number(i, texts_list, page, [153, 0, 76], True)
+            draw_bbox_without_number(i, interequations_list, page, [0, 255, 0], True)
+            draw_bbox_without_number(i, lists_list, page, [40, 169, 92], True)
+            draw_bbox_without_number(i, indexs_list, page, [40, 169, 92], True)
 
-        draw_bbox_with_number(
-            i, layout_bbox_list, page, [255, 0, 0], False, draw_bbox=False
-        )
+            draw_bbox_with_number(
+                i, layout_bbox_list, page, [255, 0, 0], False, draw_bbox=False
+            )
 
-    # Save the PDF
-    pdf_docs.save(f'{out_path}/{filename}')
+        # Save the PDF
+        save_pdf(pdf_docs, out_path, filename)
 
 
 def draw_span_bbox(pdf_info, pdf_bytes, out_path, filename):
@@ -272,18 +284,19 @@ def draw_span_bbox(pdf_info, pdf_bytes, out_path, filename):
         interline_equation_list.append(page_interline_equation_list)
         image_list.append(page_image_list)
         table_list.append(page_table_list)
-    pdf_docs = fitz.open('pdf', pdf_bytes)
-    for i, page in enumerate(pdf_docs):
+    with fitz_lock:
+        pdf_docs = fitz.open('pdf', pdf_bytes)
+        for i, page in enumerate(pdf_docs):
 
-        draw_bbox_without_number(i, text_list, page, [255, 0, 0], False)
-        draw_bbox_without_number(i, inline_equation_list, page, [0, 255, 0], False)
-        draw_bbox_without_number(i, interline_equation_list, page, [0, 0, 255], False)
-        draw_bbox_without_number(i, image_list, page, [255, 204, 0], False)
-        draw_bbox_without_number(i, table_list, page, [204, 0, 255], False)
-        draw_bbox_without_number(i, dropped_list, page, [158, 158, 158], False)
+            draw_bbox_without_number(i, text_list, page, [255, 0, 0], False)
+            draw_bbox_without_number(i, inline_equation_list, page, [0, 255, 0], False)
+            draw_bbox_without_number(i, interline_equation_list, page, [0, 0, 255], False)
+            draw_bbox_without_number(i, image_list, page, [255, 204, 0], False)
+            draw_bbox_without_number(i, table_list, page, [204, 0, 255], False)
+            draw_bbox_without_number(i, dropped_list, page, [158, 158, 158], False)
 
-    # Save the PDF
-    pdf_docs.save(f'{out_path}/{filename}')
+        # Save the PDF
+        save_pdf(pdf_docs, out_path, filename)
 
 
 def draw_model_bbox(model_list, dataset: Dataset, out_path, filename):
@@ -337,23 +350,27 @@ def draw_model_bbox(model_list, dataset: Dataset, out_path, filename):
         dropped_bbox_list.append(page_dropped_list)
         imgs_footnote_list.append(imgs_footnote)
 
-    for i in range(len(dataset)):
-        page = dataset.get_page(i)
-        draw_bbox_with_number(
-            i, dropped_bbox_list, page, [158, 158, 158], True
-        )  # color !
-        draw_bbox_with_number(i, tables_body_list, page, [204, 204, 0], True)
-        draw_bbox_with_number(i, tables_caption_list, page, [255, 255, 102], True)
-        draw_bbox_with_number(i, tables_footnote_list, page, [229, 255, 204], True)
-        draw_bbox_with_number(i, imgs_body_list, page, [153, 255, 51], True)
-        draw_bbox_with_number(i, imgs_caption_list, page, [102, 178, 255], True)
-        draw_bbox_with_number(i, imgs_footnote_list, page, [255, 178, 102], True)
-        draw_bbox_with_number(i, titles_list, page, [102, 102, 255], True)
-        draw_bbox_with_number(i, texts_list, page, [153, 0, 76], True)
-        draw_bbox_with_number(i, interequations_list, page, [0, 255, 0], True)
-
-    # Save the PDF
-    dataset.dump_to_file(f'{out_path}/{filename}')
+    with fitz_lock:
+        for i in range(len(dataset)):
+            page = dataset.get_page(i)
+            draw_bbox_with_number(
+                i, dropped_bbox_list, page, [158, 158, 158], True
+            )  # color !
+            draw_bbox_with_number(i, tables_body_list, page, [204, 204, 0], True)
+            draw_bbox_with_number(i, tables_caption_list, page, [255, 255, 102], True)
+            draw_bbox_with_number(i, tables_footnote_list, page, [229, 255, 204], True)
+            draw_bbox_with_number(i, imgs_body_list, page, [153, 255, 51], True)
+            draw_bbox_with_number(i, imgs_caption_list, page, [102, 178, 255], True)
+            draw_bbox_with_number(i, imgs_footnote_list, page, [255, 178, 102], True)
+            draw_bbox_with_number(i, titles_list, page, [102, 102, 255], True)
+            draw_bbox_with_number(i, texts_list, page, [153, 0, 76], True)
+            draw_bbox_with_number(i, interequations_list, page, [0, 255, 0], True)
+
+        # Save the PDF
+        if isinstance(out_path, DataWriter):
+            out_path.write(filename, dataset.dump_to_bytes())
+        else:
+            dataset.dump_to_file(f'{out_path}/{filename}')
 
 
 def draw_line_sort_bbox(pdf_info, pdf_bytes, out_path, filename):
@@ -399,20 +416,22 @@ def draw_line_sort_bbox(pdf_info, pdf_bytes, out_path, filename):
                             page_line_list.append({'index': index, 'bbox': bbox})
         sorted_bboxes = sorted(page_line_list, key=lambda x: x['index'])
         layout_bbox_list.append(sorted_bbox['bbox'] for sorted_bbox in sorted_bboxes)
-    pdf_docs = fitz.open('pdf', pdf_bytes)
-    for i, page in enumerate(pdf_docs):
-        draw_bbox_with_number(i, layout_bbox_list, page, [255, 0, 0], False)
+    with fitz_lock:
+        pdf_docs = fitz.open('pdf', pdf_bytes)
+        for i, page in enumerate(pdf_docs):
+            draw_bbox_with_number(i, layout_bbox_list, page, [255, 0, 0], False)
 
-    pdf_docs.save(f'{out_path}/{filename}')
+        save_pdf(pdf_docs, out_path, filename)
 
 
 def draw_char_bbox(pdf_bytes, out_path, filename):
-    pdf_docs = fitz.open('pdf', pdf_bytes)
-    for i, page in enumerate(pdf_docs):
-        for block in page.get_text('rawdict', flags=fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP)['blocks']:
-            for line in block['lines']:
-                for span in line['spans']:
-                    for char in span['chars']:
-                        char_bbox = char['bbox']
-                        page.draw_rect(char_bbox, color=[1, 0, 0], fill=None, fill_opacity=1, width=0.3, overlay=True,)
-    pdf_docs.save(f'{out_path}/{filename}')
+    with fitz_lock:
+        pdf_docs = fitz.open('pdf', pdf_bytes)
+        for i, page in enumerate(pdf_docs):
+            for block in page.get_text('rawdict', flags=fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP)['blocks']:
+                for line in block['lines']:
+                    for span in line['spans']:
+                        for char in span['chars']:
+                            char_bbox = char['bbox']
+                            page.draw_rect(char_bbox, color=[1, 0, 0], fill=None, fill_opacity=1, width=0.3, overlay=True,)
+        save_pdf(pdf_docs, out_path, filename)
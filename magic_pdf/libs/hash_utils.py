@@ -13,3 +13,9 @@ def compute_sha256(input_string):
     input_bytes = input_string.encode('utf-8')
     hasher.update(input_bytes)
     return hasher.hexdigest()
+
+
+def compute_bytes_sha256(data: bytes):
+    hasher = hashlib.sha256()
+    hasher.update(data)
+    return hasher.hexdigest()
@@ -0,0 +1,242 @@
+"""Process-wide performance metrics in the Prometheus text format.
+
+The pipeline records stage latencies, batch sizes and throughput counters
+here whether or not a server exposes them, the API apps render them on
+/metrics. Metrics recorded in post-processing worker processes stay in
+those processes.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from magic_pdf.libs.profiling import profile_stage
+from magic_pdf.libs.tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Mirror a total maintained elsewhere (e.g. cache hit counters)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def totals(self) -> dict:
+        """Value by label values, e.g. {('lmdeploy',): 1234}."""
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def totals(self) -> dict:
+        """Observation count and sum by label values, e.g. {('layout',): (12, 3.4)}."""
+        with self._lock:
+            return {key: (state['count'], state['sum']) for key, state in self._values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, labelvalues, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            le = ('le', _format_value(bound) if bound == float('inf') else repr(float(bound)))
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}')
+        label_str = _format_labels(self.labelnames, labelvalues)
+        lines.append(f'{self.name}_sum{label_str} {_format_value(state["sum"])}')
+        lines.append(f'{self.name}_count{label_str} {state["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, collector) -> None:
+        """Call `collector()` before every render, to refresh values read from
+        other components (queue depths, cache counters)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for collector in collectors:
+            collector()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    'monkeyocr_stage_seconds', 'Latency of the pipeline stages',
+    ['stage'],
+)
+RECOGNITION_SECONDS = Histogram(
+    'monkeyocr_recognition_seconds',
+    'Recognition latency of a crop by category, whole batches as "mixed" when the backend does not time its items',
+    ['category'],
+)
+BATCH_SIZE = Histogram(
+    'monkeyocr_batch_size', 'Items per batched model call',
+    ['stage'], buckets=BATCH_SIZE_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    'monkeyocr_queue_depth', 'Requests waiting in the batching queues',
+    ['queue'],
+)
+PAGES = Counter('monkeyocr_pages_total', 'Pages analyzed')
+CROPS = Counter('monkeyocr_crops_total', 'Image and table crops written')
+RECOGNIZED_ITEMS = Counter(
+    'monkeyocr_recognized_items_total', 'Crops sent to the recognition model',
+    ['category'],
+)
+GENERATED_TOKENS = Counter(
+    'monkeyocr_generated_tokens_total', 'Tokens generated by the recognition model',
+    ['backend'],
+)
+CACHE_HITS = Counter('monkeyocr_cache_hits_total', 'Cache hits', ['cache'])
+CACHE_MISSES = Counter('monkeyocr_cache_misses_total', 'Cache misses', ['cache'])
+CACHE_HIT_RATE = Gauge('monkeyocr_cache_hit_rate', 'Cache hit rate since start', ['cache'])
+
+
+@contextmanager
+def stage_timer(stage: str, **attributes):
+    """Context manager observing the duration of a pipeline stage, also
+    recorded as a span of the active trace and profiled by the active profile."""
+    with span(stage, **attributes) as stage_span, STAGE_SECONDS.time(stage=stage), profile_stage(stage):
+        yield stage_span
+
+
+def register_model_collector(model) -> None:
+    """Refresh the queue and cache metrics of `model` (MonkeyOCR) on every render."""
+
+    def collect():
+        chat_model = model.chat_model
+        if hasattr(chat_model, 'get_queue_status'):
+            QUEUE_DEPTH.set(chat_model.get_queue_status()['queue_size'], queue='recognition')
+        elif hasattr(chat_model, 'stats'):
+            QUEUE_DEPTH.set(chat_model.stats()['queued'], queue='recognition')
+        if hasattr(model.layout_model, 'stats'):
+            QUEUE_DEPTH.set(model.layout_model.stats()['queued'], queue='layout')
+
+        caches = {
+            'layoutreader': getattr(model, 'layoutreader_cache', None),
+            'result': getattr(model, 'result_cache', None),
+        }
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            stats = cache.stats()
+            CACHE_HITS.set(stats['hits'], cache=name)
+            CACHE_MISSES.set(stats['misses'], cache=name)
+            CACHE_HIT_RATE.set(stats['hit_rate'], cache=name)
+
+        # crop dedup counts into the counters directly
+        hits, misses = CACHE_HITS.get(cache='image_dedup'), CACHE_MISSES.get(cache='image_dedup')
+        if hits + misses:
+            CACHE_HIT_RATE.set(hits / (hits + misses), cache='image_dedup')
+
+    REGISTRY.add_collector(collect)
@@ -1,17 +1,337 @@
+import math
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from io import BytesIO
 import cv2
 import fitz
 import numpy as np
 from PIL import Image
-from magic_pdf.data.data_reader_writer import DataWriter
+from magic_pdf.data.data_reader_writer import BufferedDataWriter, DataWriter, FileBasedDataWriter, \
+    MemoryDataWriter, MultiBucketS3DataWriter
+from magic_pdf.data.utils import fitz_lock
 from magic_pdf.libs.commons import join_path
-from magic_pdf.libs.hash_utils import compute_sha256
+from magic_pdf.libs.hash_utils import compute_bytes_sha256, compute_sha256
+from magic_pdf.libs.metrics import CACHE_HITS, CACHE_MISSES, CROPS
 
+# zoom of the image and table crops written by cut_image
+CUT_IMAGE_SCALE = 3
+CUT_IMAGE_JPEG_QUALITY = 95
+# a page raster may cover at most this many times the area of the crops cut from it
+PAGE_RASTER_MAX_OVERDRAW = 2
 
-def cut_image(bbox: tuple, page_num: int, page: fitz.Page, return_path, imageWriter: DataWriter):
+
+class PageRaster:
+    """The part of a page holding its crops rendered once at `scale`, image
+    and table crops are cut from it instead of rendering every clip from the
+    pdf again."""
+
+    def __init__(self, page: fitz.Page, scale=CUT_IMAGE_SCALE, clip: fitz.Rect = None):
+        self.page = page
+        self.scale = scale
+        self.clip = clip
+        self._image = None
+        self._origin = (0, 0)
+        self._page_rect = None
+
+    @classmethod
+    def for_crops(cls, page: fitz.Page, bboxes, scale=CUT_IMAGE_SCALE):
+        """A raster of the union of `bboxes`, None if cutting the crops one by
+        one renders less: a single crop, or crops far apart whose union is
+        more than PAGE_RASTER_MAX_OVERDRAW times their own area."""
+        with fitz_lock:
+            page_rect = page.rect
+        rects = [fitz.Rect(*bbox[:4]) & page_rect for bbox in bboxes]
+        rects = [rect for rect in rects if not rect.is_empty]
+        if len(rects) < 2:
+            return None
+        clip = fitz.Rect(rects[0])
+        for rect in rects[1:]:
+            clip |= rect
+        if clip.get_area() > PAGE_RASTER_MAX_OVERDRAW * sum(rect.get_area() for rect in rects):
+            return None
+        return cls(page, scale, clip)
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            with fitz_lock:
+                pix = self.page.get_pixmap(matrix=fitz.Matrix(self.scale, self.scale), clip=self.clip, alpha=False)
+                self._page_rect = self.page.rect
+                samples = pix.samples
+            self._origin = (pix.x, pix.y)
+            self._image = Image.frombytes('RGB', (pix.width, pix.height), samples)
+        return self._image
+
+    def crop(self, bbox) -> Image.Image:
+        image = self.image
+        page_rect = self._page_rect
+        x0 = max(0, math.floor((bbox[0] - page_rect.x0) * self.scale) - self._origin[0])
+        y0 = max(0, math.floor((bbox[1] - page_rect.y0) * self.scale) - self._origin[1])
+        x1 = min(image.width, math.ceil((bbox[2] - page_rect.x0) * self.scale) - self._origin[0])
+        y1 = min(image.height, math.ceil((bbox[3] - page_rect.y0) * self.scale) - self._origin[1])
+        return image.crop((x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)))
+
+
+def encode_jpeg(image: Image.Image, quality=CUT_IMAGE_JPEG_QUALITY) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class ImageStoreIndex:
+    """Content-addressed images already written to a store, shared by all
+    documents of the process so identical crops (logos, stamps, letterheads)
+    are written once per store."""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # unknown stores are only deduplicated within the writer instance, their entries go with it
+        self._writer_entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def store_key(writer: DataWriter):
+        """Key of the store `writer` writes to, None if the store is unknown."""
+        if isinstance(writer, BufferedDataWriter):
+            return ImageStoreIndex.store_key(writer.writer)
+        if isinstance(writer, FileBasedDataWriter):
+            return 'file', os.path.abspath(writer._parent_dir)
+        if isinstance(writer, MultiBucketS3DataWriter):
+            return 's3', writer.default_bucket, writer.default_prefix
+        return None
+
+    def _store_entries(self, writer: DataWriter):
+        store_key = self.store_key(writer)
+        if store_key is not None:
+            return self._entries, (store_key,)
+        entries = self._writer_entries.get(writer)
+        if entries is None:
+            entries = self._writer_entries[writer] = OrderedDict()
+        return entries, ()
+
+    def claim(self, writer: DataWriter, path: str) -> bool:
+        """Reserve `path` in the store of `writer`, release() it if the write fails.
+
+        Returns:
+            bool: True if the caller has to write the content, False if it is in the store already
+        """
+        if isinstance(writer, BufferedDataWriter):
+            return self.claim(writer.writer, path)
+        if isinstance(writer, FileBasedDataWriter):
+            # the local file system is the index, directories may be cleaned between documents
+            fn_path = path
+            if not os.path.isabs(fn_path) and len(writer._parent_dir) > 0:
+                fn_path = os.path.join(writer._parent_dir, path)
+            return not os.path.exists(fn_path)
+        if isinstance(writer, MemoryDataWriter):
+            # results assembled in memory are indexed by the writer itself
+            return not writer.exists(path)
+
+        with self._lock:
+            entries, prefix = self._store_entries(writer)
+            key = prefix + (path,)
+            if key in entries:
+                entries.move_to_end(key)
+                return False
+            entries[key] = True
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+        return True
+
+    def release(self, writer: DataWriter, path: str) -> None:
+        """Drop a claim whose write failed, the next claim writes the content again."""
+        if isinstance(writer, BufferedDataWriter):
+            return self.release(writer.writer, path)
+        if isinstance(writer, (FileBasedDataWriter, MemoryDataWriter)):
+            return
+        with self._lock:
+            entries, prefix = self._store_entries(writer)
+            entries.pop(prefix + (path,), None)
+
+
+image_store_index = ImageStoreIndex()
+
+
+def compute_image_sha256(image: Image.Image) -> str:
+    return compute_bytes_sha256(f'{image.mode}:{image.width}x{image.height}:'.encode('utf-8') + image.tobytes())
+
+
+def build_image_refs(pdf_info_dict) -> dict:
+    """Reference index of the written images.
+
+    Returns:
+        dict: image_path -> [{'page_idx', 'bbox', 'type'}] of every span using the file
+    """
+    refs = {}
+
+    def visit(node, page_idx):
+        if isinstance(node, dict):
+            if node.get('image_path') and 'bbox' in node:
+                refs.setdefault(node['image_path'], []).append(
+                    {'page_idx': page_idx, 'bbox': node['bbox'], 'type': node.get('type')}
+                )
+            for value in node.values():
+                visit(value, page_idx)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value, page_idx)
+
+    for page_info in pdf_info_dict.values():
+        visit(page_info.get('preproc_blocks', []), page_info.get('page_idx'))
+        visit(page_info.get('discarded_blocks', []), page_info.get('page_idx'))
+    return refs
+
+
+class AsyncImageWriter(DataWriter):
+    """Encode and write image crops in background threads.
+
+    write() and write_image() return as soon as the job is queued, at most
+    `max_pending` jobs are in flight (callers block beyond that), flush()
+    waits for all of them and raises the first error.
+    """
+
+    def __init__(self, writer: DataWriter, max_workers=4, max_pending=32, dedup=False):
+        """Initialized method.
+
+        Args:
+            writer (DataWriter): the writer doing the actual writes
+            max_workers (int, optional): encode / write threads, 0 writes synchronously. Defaults to 4.
+            max_pending (int, optional): queued jobs before write() blocks. Defaults to 32.
+            dedup (bool, optional): name crops by their pixels and write identical crops once. Defaults to False.
+        """
+        self.writer = writer
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.dedup = dedup
+        self._claimed = set()
+        self._owned = set()
+        self._executor = None
+        self._pending = set()
+        self._errors = []
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # threads can not be pickled, a copy sent to another process starts its own pool
+        return {
+            'writer': self.writer,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'dedup': self.dedup,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _submit(self, fn, *args):
+        if self.max_workers <= 0:
+            fn(*args)
+            return
+        self._slots.acquire()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            future = self._executor.submit(fn, *args)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            if future.exception() is not None:
+                self._errors.append(future.exception())
+        self._slots.release()
+
+    def _write(self, path, data):
+        try:
+            self.writer.write(path, data)
+        except Exception:
+            self._release(path)
+            raise
+
+    def _encode_and_write(self, path, image, quality):
+        self._write(path, encode_jpeg(image, quality))
+
+    def write(self, path: str, data: bytes) -> None:
+        self._submit(self._write, path, data)
+
+    def write_image(self, path: str, image: Image.Image, quality=CUT_IMAGE_JPEG_QUALITY) -> None:
+        """Queue a pil image, it is jpeg encoded and written in the background.
+
+        Args:
+            path (str): the target file where to write
+            image (Image.Image): the image to encode
+            quality (int, optional): jpeg quality. Defaults to CUT_IMAGE_JPEG_QUALITY.
+        """
+        self._submit(self._encode_and_write, path, image, quality)
+
+    def claim(self, path: str) -> bool:
+        """Reserve a content-addressed path.
+
+        Returns:
+            bool: True if the content still has to be written, False if it is in the store already
+        """
+        with self._lock:
+            if path in self._claimed:
+                return False
+            self._claimed.add(path)
+        owned = image_store_index.claim(self.writer, path)
+        if owned:
+            with self._lock:
+                self._owned.add(path)
+        return owned
+
+    def _release(self, path):
+        with self._lock:
+            if path not in self._owned:
+                return
+            self._owned.discard(path)
+            self._claimed.discard(path)
+        image_store_index.release(self.writer, path)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            errors, self._errors = self._errors, []
+        try:
+            if errors:
+                raise errors[0]
+            if isinstance(self.writer, BufferedDataWriter):
+                self.writer.flush()
+        except Exception:
+            # a buffered writer does not tell which of its writes failed, no claim is kept
+            with self._lock:
+                owned = list(self._owned)
+            for path in owned:
+                self._release(path)
+            raise
+        with self._lock:
+            # everything claimed so far is in the store now
+            self._owned.clear()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+
+
+def cut_image(bbox: tuple, page_num: int, page: fitz.Page, return_path, imageWriter: DataWriter,
+              scale=CUT_IMAGE_SCALE, page_raster: PageRaster = None):
 
     filename = f'{page_num}_{int(bbox[0])}_{int(bbox[1])}_{int(bbox[2])}_{int(bbox[3])}'
 
+    CROPS.inc()
+
 
     img_path = join_path(return_path, filename) if return_path is not None else None
 
@@ -19,15 +339,41 @@ def cut_image(bbox: tuple, page_num: int, page: fitz.Page, return_path, imageWri
     img_hash256_path = f'{compute_sha256(img_path)}.jpg'
 
 
-    rect = fitz.Rect(*bbox)
+    if page_raster is not None:
+        image = page_raster.crop(bbox)
+    else:
+        rect = fitz.Rect(*bbox)
 
-    zoom = fitz.Matrix(3, 3)
+        zoom = fitz.Matrix(scale, scale)
 
-    pix = page.get_pixmap(clip=rect, matrix=zoom)
+        with fitz_lock:
+            pix = page.get_pixmap(clip=rect, matrix=zoom)
 
-    byte_data = pix.tobytes(output='jpeg', jpg_quality=95)
+            if not isinstance(imageWriter, AsyncImageWriter):
+                byte_data = pix.tobytes(output='jpeg', jpg_quality=CUT_IMAGE_JPEG_QUALITY)
+            else:
+                samples = pix.samples
 
-    imageWriter.write(img_hash256_path, byte_data)
+        if not isinstance(imageWriter, AsyncImageWriter):
+            imageWriter.write(img_hash256_path, byte_data)
+
+            return img_hash256_path
+
+        image = Image.frombytes('RGB', (pix.width, pix.height), samples)
+
+    if not isinstance(imageWriter, AsyncImageWriter):
+        imageWriter.write(img_hash256_path, encode_jpeg(image))
+        return img_hash256_path
+
+    if imageWriter.dedup:
+        # identical pixels share one file, the encode and the write are skipped
+        img_hash256_path = f'{compute_image_sha256(image)}.jpg'
+        if not imageWriter.claim(img_hash256_path):
+            CACHE_HITS.inc(cache='image_dedup')
+            return img_hash256_path
+        CACHE_MISSES.inc(cache='image_dedup')
+
+    imageWriter.write_image(img_hash256_path, image)
 
     return img_hash256_path
 
@@ -39,10 +385,9 @@ def cut_image_to_pil_image(bbox: tuple, page: fitz.Page, mode="pillow"):
 
     zoom = fitz.Matrix(3, 3)
 
-    pix = page.get_pixmap(clip=rect, matrix=zoom)
-
-
-    image_file = BytesIO(pix.tobytes(output='png'))
+    with fitz_lock:
+        pix = page.get_pixmap(clip=rect, matrix=zoom)
+        image_file = BytesIO(pix.tobytes(output='png'))
 
     pil_image = Image.open(image_file)
     if mode == "cv2":
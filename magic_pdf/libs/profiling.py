@@ -0,0 +1,235 @@
+"""CPU and memory profiling of the pipeline.
+
+profile() collects, for one document, an exclusive cProfile of every
+pipeline stage (the stages timed with stage_timer(), time outside them is
+booked under `other`) along with the peak traced memory of each stage and
+a tracemalloc snapshot taken at the end of its heaviest run. Only the
+thread that started the profile is profiled.
+
+sample_process() samples the stacks of every thread of the running process
+for a while (wall clock, waiting threads included) and traces the memory
+allocated meanwhile, for profiling a live server.
+"""
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+TRACEMALLOC_FRAMES = 25
+
+_current_session = contextvars.ContextVar('monkeyocr_profile', default=None)
+
+
+class StageProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.snapshot = None
+
+
+class ProfileSession:
+    """Per-stage profiles of one document, see profile()."""
+
+    def __init__(self, name: str, memory: bool = True):
+        self.name = name
+        self.memory = memory
+        self.thread_id = threading.get_ident()
+        self.stages = {}
+        # [stage, start time, peak bytes of the run so far]
+        self._stack = []
+
+    def _stage(self, name: str) -> StageProfile:
+        if name not in self.stages:
+            self.stages[name] = StageProfile(name)
+        return self.stages[name]
+
+    def enter(self, name: str) -> None:
+        if self._stack:
+            parent = self._stack[-1]
+            parent[0].profiler.disable()
+            if self.memory:
+                parent[2] = max(parent[2], tracemalloc.get_traced_memory()[1])
+        if self.memory:
+            tracemalloc.reset_peak()
+        stage = self._stage(name)
+        stage.calls += 1
+        self._stack.append([stage, time.perf_counter(), 0])
+        stage.profiler.enable()
+
+    def exit(self) -> None:
+        stage, start, peak = self._stack.pop()
+        stage.profiler.disable()
+        stage.seconds += time.perf_counter() - start
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if peak > stage.peak_bytes:
+                stage.peak_bytes = peak
+                stage.snapshot = tracemalloc.take_snapshot()
+            if self._stack:
+                # the peak of a nested stage is also one of its parent
+                self._stack[-1][2] = max(self._stack[-1][2], peak)
+        if self._stack:
+            self._stack[-1][0].profiler.enable()
+
+    def write(self, out_dir: str, top: int = 40) -> str:
+        """Write <stage>.pstats, <stage>.txt (top functions and allocations),
+        <stage>.tracemalloc (snapshot, tracemalloc.Snapshot.load()) and
+        summary.txt into out_dir.
+
+        Returns:
+            str: path of summary.txt
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        summary = [f'Profile of {self.name}', '',
+                   f'{"stage":<16}{"runs":>8}{"seconds":>12}{"peak MB":>12}  (seconds include nested stages, cProfile stats do not)']
+        for stage in sorted(self.stages.values(), key=lambda s: -s.seconds):
+            summary.append(f'{stage.name:<16}{stage.calls:>8}{stage.seconds:>12.3f}{stage.peak_bytes / 2 ** 20:>12.1f}')
+            pstats.Stats(stage.profiler).dump_stats(os.path.join(out_dir, f'{stage.name}.pstats'))
+
+            report = io.StringIO()
+            report.write(f'{stage.name}: {stage.calls} runs, {stage.seconds:.3f}s, peak {stage.peak_bytes / 2 ** 20:.1f} MB\n\n')
+            pstats.Stats(stage.profiler, stream=report).sort_stats('cumulative').print_stats(top)
+            if stage.snapshot is not None:
+                stage.snapshot.dump(os.path.join(out_dir, f'{stage.name}.tracemalloc'))
+                report.write('\nLargest live allocations at the end of the heaviest run:\n')
+                for stat in stage.snapshot.statistics('lineno')[:top]:
+                    report.write(f'{stat}\n')
+            with open(os.path.join(out_dir, f'{stage.name}.txt'), 'w', encoding='utf-8') as f:
+                f.write(report.getvalue())
+
+        summary_path = os.path.join(out_dir, 'summary.txt')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(summary) + '\n')
+        return summary_path
+
+
+@contextmanager
+def profile(name: str, memory: bool = True):
+    """Profile the stages run in the current thread and context.
+
+    Args:
+        name (str): name of the document
+        memory (bool, optional): trace allocations with tracemalloc. Defaults to True.
+    """
+    session = ProfileSession(name, memory)
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    session_token = _current_session.set(session)
+    session.enter('other')
+    try:
+        yield session
+    finally:
+        while session._stack:
+            session.exit()
+        _current_session.reset(session_token)
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Book the time spent in the block under the stage `name`, if a profile is active."""
+    session = _current_session.get()
+    if session is None or session.thread_id != threading.get_ident():
+        yield
+        return
+    session.enter(name)
+    try:
+        yield
+    finally:
+        session.exit()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SampleReport:
+    def __init__(self, seconds: float, interval: float):
+        self.seconds = seconds
+        self.interval = interval
+        self.samples = 0
+        # (thread name, outermost ... innermost frame) -> samples
+        self.stacks = Counter()
+        self.peak_bytes = None
+        self.allocations = []
+
+    def to_collapsed(self) -> str:
+        """Collapsed stacks, for flamegraph.pl or speedscope."""
+        return ''.join(f'{";".join((thread,) + stack)} {count}\n' for (thread, stack), count in self.stacks.most_common())
+
+    def to_text(self, top: int = 30) -> str:
+        inclusive = Counter()
+        exclusive = Counter()
+        for (thread, stack), count in self.stacks.items():
+            for label in set(stack):
+                inclusive[label] += count
+            if stack:
+                exclusive[stack[-1]] += count
+        lines = [f'{self.samples} samples of all threads every {self.interval * 1000:.0f}ms for {self.seconds}s '
+                 f'(wall clock, waiting threads included)', '']
+        for title, counter in (('Inclusive', inclusive), ('Self', exclusive)):
+            lines.append(f'{title} samples:')
+            for label, count in counter.most_common(top):
+                lines.append(f'{count:>8} {100 * count / max(self.samples, 1):6.1f}%  {label}')
+            lines.append('')
+        if self.peak_bytes is not None:
+            lines.append(f'Peak traced memory: {self.peak_bytes / 2 ** 20:.1f} MB')
+            lines.append('Allocations made while sampling, still alive at the end:')
+            lines.extend(str(stat) for stat in self.allocations[:top])
+        return '\n'.join(lines) + '\n'
+
+
+def sample_process(seconds: float, interval: float = 0.01, memory: bool = True, top: int = 30) -> SampleReport:
+    """Sample the stacks of all the other threads of the process.
+
+    Args:
+        seconds (float): sampling duration
+        interval (float, optional): seconds between samples. Defaults to 0.01.
+        memory (bool, optional): trace the allocations made meanwhile. Defaults to True.
+        top (int, optional): allocation sites kept. Defaults to 30.
+
+    Returns:
+        SampleReport: the samples
+    """
+    report = SampleReport(seconds, interval)
+    own_thread = threading.get_ident()
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.take_snapshot()
+    try:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                report.stacks[(thread_names.get(thread_id, str(thread_id)), tuple(reversed(stack)))] += 1
+            report.samples += 1
+            time.sleep(interval)
+        if memory:
+            report.peak_bytes = tracemalloc.get_traced_memory()[1]
+            report.allocations = tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:top]
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+    return report
@@ -0,0 +1,203 @@
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+
+from loguru import logger
+
+from magic_pdf.libs.hash_utils import compute_md5, compute_sha256
+from magic_pdf.libs.version import __version__
+
+# bump when a code change alters the result files, stored results of older code are not served then
+RESULT_FORMAT_VERSION = 1
+
+# config entries that change how fast a document is parsed, not its results
+RUNTIME_ONLY_CONFIG_KEYS = [
+    ('result_cache',),
+    ('postprocess_config',),
+    ('image_config', 'write_workers'),
+    ('image_config', 'max_pending'),
+    ('layout_config', 'batching'),
+    ('layout_config', 'reader', 'cache_size'),
+    ('layout_config', 'reader', 'cache_path'),
+    ('chat_config', 'batching'),
+    ('chat_config', 'queue_config'),
+    ('chat_config', 'data_parallelism'),
+    ('chat_config', 'model_parallelism'),
+    ('api_config', 'api_key'),
+]
+
+
+def result_options(**options) -> dict:
+    """The parse options plus the process-wide settings from the environment
+    that change the results, MERGE_BLOCKS (see para_split_v3)."""
+    options['merge_blocks'] = os.getenv('MERGE_BLOCKS', '0') == '1'
+    return options
+
+
+def config_fingerprint(configs: dict, **options) -> str:
+    """Fingerprint of the code version, model config and parse options a result depends on."""
+    configs = copy.deepcopy(configs or {})
+    for path in RUNTIME_ONLY_CONFIG_KEYS:
+        node = configs
+        for key in path[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+        if isinstance(node, dict):
+            node.pop(path[-1], None)
+    payload = json.dumps(
+        {'version': [__version__, RESULT_FORMAT_VERSION], 'configs': configs, 'options': options},
+        sort_keys=True, default=str,
+    )
+    return compute_sha256(payload)[:16]
+
+
+class DocumentResultCache:
+    """Parse results of whole documents, keyed by the md5 of the file bytes
+    and the fingerprint of the config and parse options.
+
+    Every entry is a directory holding the result files and a meta.json,
+    entries are dropped after `ttl_seconds` and, least recently used first,
+    while the cache is larger than `max_bytes`. File names starting with the
+    document name are renamed for the document asking, so the same bytes
+    uploaded under another name hit too.
+    """
+
+    def __init__(self, root: str, configs: dict, max_bytes: int = 2 * 1024 ** 3, ttl_seconds: int = 7 * 24 * 3600):
+        """Initialized method.
+
+        Args:
+            root (str): directory of the cache entries
+            configs (dict): the model config, part of every key
+            max_bytes (int, optional): size cap of the cache. Defaults to 2GB.
+            ttl_seconds (int, optional): lifetime of an entry. Defaults to 7 days.
+        """
+        self.root = root
+        self.configs = configs
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        logger.info(f'document result cache: {root}')
+
+    def make_key(self, file_bytes: bytes, **options) -> str:
+        return f'{compute_md5(file_bytes)}_{config_fingerprint(self.configs, **result_options(**options))}'
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str, name: str) -> Optional[dict]:
+        """Get the result files of an entry.
+
+        Args:
+            key (str): key made by make_key()
+            name (str): name of the document asking, replaces the stored document name
+
+        Returns:
+            dict | None: relative path -> bytes, None on a miss
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if time.time() - meta['created_at'] > self.ttl_seconds:
+                raise FileNotFoundError(meta_path)
+            files = {}
+            for path in meta['files']:
+                with open(os.path.join(entry_dir, 'files', path), 'rb') as f:
+                    files[self._rename(path, meta['name'], name)] = f.read()
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return files
+
+    @staticmethod
+    def _rename(path: str, stored_name: str, name: str) -> str:
+        dir_name, base_name = os.path.split(path)
+        if stored_name and base_name.startswith(stored_name):
+            base_name = name + base_name[len(stored_name):]
+        return f'{dir_name}/{base_name}' if dir_name else base_name
+
+    def put(self, key: str, name: str, files: dict) -> None:
+        """Store the result files of a document.
+
+        Args:
+            key (str): key made by make_key()
+            name (str): name of the document, file names starting with it are renamed on get()
+            files (dict): relative path -> bytes
+        """
+        tmp_dir = os.path.join(self.root, f'.{key}.{uuid.uuid4().hex[:8]}.tmp')
+        for path, data in files.items():
+            file_path = os.path.join(tmp_dir, 'files', path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(data)
+        meta = {
+            'name': name,
+            'created_at': time.time(),
+            'size': sum(len(data) for data in files.values()),
+            'files': sorted(files),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        entry_dir = self._entry_dir(key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # another process stored the same entry meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.sweep()
+
+    def sweep(self) -> None:
+        """Drop expired entries, then the least recently used ones until the
+        cache is under its size cap."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.root):
+                meta_path = os.path.join(entry.path, 'meta.json')
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    with open(meta_path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    last_used = os.path.getmtime(meta_path)
+                except (OSError, ValueError):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                if now - meta.get('created_at', 0) > self.ttl_seconds:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    entries.append((last_used, meta.get('size', 0), entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def stats(self) -> dict:
+        """Get the cache counters.
+
+        Returns:
+            dict: hits, misses and hit_rate
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
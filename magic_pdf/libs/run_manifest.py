@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+from magic_pdf.libs.hash_utils import compute_md5
+from magic_pdf.libs.result_cache import config_fingerprint, result_options
+
+
+def file_md5(file_path: str) -> str:
+    with open(file_path, 'rb') as f:
+        return compute_md5(f.read())
+
+
+def commit_result_dir(staged_dir: str, result_dir: str) -> None:
+    """Move a fully written result directory to its place, replacing the
+    results of an earlier run. The old directory is renamed aside first, so
+    between the two renames result_dir does not exist; a reader finds the old
+    results, the new ones or none, and a run stopped in between leaves the
+    old results in the .old directory next to it."""
+    os.makedirs(os.path.dirname(os.path.abspath(result_dir)), exist_ok=True)
+    old_dir = None
+    if os.path.exists(result_dir):
+        old_dir = f'{result_dir}.{uuid.uuid4().hex[:8]}.old'
+        os.replace(result_dir, old_dir)
+    os.replace(staged_dir, result_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class RunManifest:
+    """Documents completed by a folder run, appended to a JSONL file.
+
+    Every line records an input file, the md5 of its content, the
+    fingerprint of the config and parse options and the result directory.
+    A document is complete when its line exists with the same content,
+    fingerprint and result directory, so reruns skip it while changed files,
+    options or configs are parsed again. Lines are only appended once the
+    results are in place, a run stopped at any point loses at most the
+    documents in flight; a torn last line is ignored.
+    """
+
+    def __init__(self, path: str, configs: dict, **options):
+        """Initialized method.
+
+        Args:
+            path (str): the JSONL file, created on the first record
+            configs (dict): the model config, part of the fingerprint
+            **options: parse options the results depend on, part of the fingerprint
+                with the settings of result_options()
+        """
+        options = result_options(**options)
+        self.path = path
+        self.fingerprint = config_fingerprint(configs, **options)
+        self.options = options
+        self._entries = {}
+        self._torn_line = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                self._torn_line = not line.endswith('\n')
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry['input']] = entry
+                except (ValueError, KeyError):
+                    logger.warning(f'skipping unreadable line {line_no} of the run manifest {self.path}')
+        logger.info(f'run manifest {self.path}: {len(self._entries)} documents recorded')
+
+    def is_complete(self, file_path: str, result_dir: str) -> bool:
+        """Whether the file was parsed into result_dir with the current content,
+        config and options. The content is only hashed again when the size or
+        modification time of the file changed since it was recorded."""
+        entry = self._entries.get(os.path.abspath(file_path))
+        if entry is None or entry['fingerprint'] != self.fingerprint:
+            return False
+        if entry['output'] != os.path.abspath(result_dir) or not os.path.isdir(result_dir):
+            return False
+        stat = os.stat(file_path)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        return entry['md5'] == file_md5(file_path)
+
+    def record(self, file_path: str, result_dir: str) -> None:
+        """Append the file as complete, once its results are in result_dir."""
+        stat = os.stat(file_path)
+        entry = {
+            'input': os.path.abspath(file_path),
+            'md5': file_md5(file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'fingerprint': self.fingerprint,
+            'options': self.options,
+            'output': os.path.abspath(result_dir),
+            'completed_at': time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if self._torn_line:
+                    f.write('\n')
+                    self._torn_line = False
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries[entry['input']] = entry
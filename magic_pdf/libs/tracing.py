@@ -0,0 +1,208 @@
+"""Lightweight per-document tracing.
+
+Spans are only recorded while a trace is active in the current context
+(see trace()), otherwise span() costs a context variable lookup. Spans
+opened in threads or processes that did not inherit the context (the
+batcher dispatch threads, the post-processing workers, the *_queue
+backends) are not recorded; the span around the call waiting for them
+is. A finished trace is written as Chrome trace JSON, readable by
+chrome://tracing and Perfetto, or sent to an OTLP/HTTP collector.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar('monkeyocr_trace', default=None)
+_current_span = contextvars.ContextVar('monkeyocr_span', default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent_id=None, start_ns: int = None, track: str = None, attributes=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.thread_id = threading.get_ident()
+        self.track = track
+        self.attributes = dict(attributes or {})
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds, 0 while the span is open."""
+        return (self.end_ns - self.start_ns) / 1e9 if self.end_ns else 0.0
+
+
+class _NoopSpan:
+    """Returned by span() when no trace is active."""
+    span_id = None
+    start_ns = end_ns = 0
+    duration = 0.0
+
+    @property
+    def attributes(self):
+        return {}
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> dict:
+        """Chrome trace event format, timestamps in microseconds."""
+        pid = os.getpid()
+        events = []
+        tids = {}
+        for span in self.spans:
+            if span.track is None:
+                tid = span.thread_id
+            elif span.track in tids:
+                tid = tids[span.track]
+            else:
+                tid = tids[span.track] = len(tids) + 1
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                               'args': {'name': span.track}})
+            events.append({
+                'name': span.name,
+                'cat': 'monkeyocr',
+                'ph': 'X',
+                'ts': span.start_ns / 1000,
+                'dur': ((span.end_ns or span.start_ns) - span.start_ns) / 1000,
+                'pid': pid,
+                'tid': tid,
+                'args': span.attributes,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'document': self.name}}
+
+    def write_chrome(self, path: str) -> str:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False, default=str)
+        return path
+
+    def to_otlp(self, service_name: str = 'monkeyocr') -> dict:
+        """OTLP/JSON ExportTraceServiceRequest."""
+        spans = []
+        for span in self.spans:
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()
+                               if value is not None],
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            spans.append(otlp_span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': service_name}},
+                {'key': 'document', 'value': {'stringValue': self.name}},
+            ]},
+            'scopeSpans': [{'scope': {'name': 'magic_pdf'}, 'spans': spans}],
+        }]}
+
+    def export_otlp(self, endpoint: str, timeout: float = 10) -> None:
+        """Send the trace to an OTLP/HTTP collector, e.g. http://localhost:4318"""
+        url = endpoint.rstrip('/')
+        if not url.endswith('/v1/traces'):
+            url += '/v1/traces'
+        request = urllib.request.Request(
+            url, data=json.dumps(self.to_otlp(), default=str).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(v) for v in value]}}
+    return {'stringValue': str(value)}
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """Record the spans of the current context into a new Trace, under a root
+    span named `document`."""
+    doc_trace = Trace(name)
+    trace_token = _current_trace.set(doc_trace)
+    try:
+        with span('document', document=name, **attributes):
+            yield doc_trace
+    finally:
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current span, if a trace is active."""
+    doc_trace = _current_trace.get()
+    if doc_trace is None:
+        yield NOOP_SPAN
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes=attributes)
+    span_token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(span_token)
+        current.end_ns = time.time_ns()
+        doc_trace.add(current)
+
+
+def current_span():
+    """The innermost open span, NOOP_SPAN when no trace is active."""
+    if _current_trace.get() is None:
+        return NOOP_SPAN
+    return _current_span.get() or NOOP_SPAN
+
+
+def record_span(name: str, start_ns: int, end_ns: int, parent=None, track: str = None, **attributes) -> None:
+    """Record an already finished span, e.g. one item of a batched call.
+
+    Args:
+        name (str): span name
+        start_ns (int): start, unix time in nanoseconds
+        end_ns (int): end, unix time in nanoseconds
+        parent (Span, optional): parent span. Defaults to the current span.
+        track (str, optional): timeline row of the span in the Chrome trace,
+            for spans overlapping their siblings. Defaults to the thread.
+    """
+    doc_trace = _current_trace.get()
+    if doc_trace is None:
+        return
+    parent = parent or _current_span.get()
+    recorded = Span(name, parent.span_id if parent else None, start_ns=start_ns, track=track, attributes=attributes)
+    recorded.end_ns = end_ns
+    doc_trace.add(recorded)
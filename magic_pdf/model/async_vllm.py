@@ -5,6 +5,8 @@ from typing import List
 import torch
 from loguru import logger
 from magic_pdf.utils.load_image import load_image
+from magic_pdf.libs.metrics import GENERATED_TOKENS
+from magic_pdf.libs.tracing import current_span
 
 
 class MonkeyChat_vLLM_async:
@@ -50,8 +52,10 @@ class MonkeyChat_vLLM_async:
 
         semaphore = asyncio.Semaphore(min(64, max(1, len(images))))
         timeout_s = 300
+        item_tokens = [None] * len(images)
+        item_times = [None] * len(images)
 
-        async def infer_one(img_path: str, q: str, req_id: str) -> str:
+        async def infer_one(img_path: str, q: str, req_id: str, idx: int) -> str:
             placeholder = "<|image_pad|>"
             prompt = (
                 "<|im_start|>system\nYou are a helpful assistant.<|im_end|>\n"
@@ -68,6 +72,7 @@ class MonkeyChat_vLLM_async:
             }
 
             start = time.time()
+            start_ns = time.time_ns()
             final_output = None
             async for out in self.engine.generate(inputs, self.gen_config, req_id):
                 if time.time() - start > timeout_s:
@@ -84,6 +89,9 @@ class MonkeyChat_vLLM_async:
                     break
 
             if final_output and getattr(final_output, "outputs", None):
+                GENERATED_TOKENS.inc(len(final_output.outputs[0].token_ids), backend='vllm_async')
+                item_tokens[idx] = len(final_output.outputs[0].token_ids)
+                item_times[idx] = (start_ns, time.time_ns())
                 return final_output.outputs[0].text
             return "Error: No output generated"
 
@@ -91,7 +99,7 @@ class MonkeyChat_vLLM_async:
             async with semaphore:
                 req_id = f"batch_req_{idx}_{int(time.time()*1000)}"
                 try:
-                    return await infer_one(img, q, req_id)
+                    return await infer_one(img, q, req_id, idx)
                 except Exception as e:
                     logger.error(f"Task {idx} failed: {e}")
                     return f"Error: {str(e)}"
@@ -106,6 +114,7 @@ class MonkeyChat_vLLM_async:
                 out.append(f"Error: {str(r)}")
             else:
                 out.append(r)
+        current_span().set(item_tokens=item_tokens, item_times=item_times)
         return out
 
     def batch_inference(self, images: List[str], questions: List[str]) -> List[str]:
@@ -5,6 +5,8 @@ import time
 from loguru import logger
 
 from magic_pdf.config.constants import MODEL_NAME
+from magic_pdf.libs.metrics import RECOGNITION_SECONDS, RECOGNIZED_ITEMS, BATCH_SIZE, stage_timer
+from magic_pdf.libs.tracing import record_span
 from io import BytesIO
 from PIL import Image
 from magic_pdf.model.sub_modules.model_utils import (
@@ -12,6 +14,12 @@ from magic_pdf.model.sub_modules.model_utils import (
 
 YOLO_LAYOUT_BASE_BATCH_SIZE = 8
 
+# metric label of the crops sent to recognition, by layout category id
+CATEGORY_METRIC_NAMES = {
+    0: 'title', 1: 'text', 3: 'image', 4: 'image_caption', 5: 'table',
+    6: 'table_caption', 7: 'table_footnote', 8: 'formula', 14: 'formula', 101: 'text',
+}
+
 class BatchAnalyzeLLM:
     def __init__(self, model):
         self.model = model
@@ -20,36 +28,39 @@ class BatchAnalyzeLLM:
         images_layout_res = []
 
         layout_start_time = time.time()
-        if self.model.layout_model_name == MODEL_NAME.DocLayout_YOLO:
-            # doclayout_yolo
-            layout_images = []
-            for image_index, image in enumerate(images):
-                pil_img = Image.fromarray(image)
-                layout_images.append(pil_img)
+        with stage_timer('layout', pages=len(images)):
+            if self.model.layout_model_name == MODEL_NAME.DocLayout_YOLO:
+                # doclayout_yolo
+                layout_images = []
+                for image_index, image in enumerate(images):
+                    pil_img = Image.fromarray(image)
+                    layout_images.append(pil_img)
 
-            images_layout_res += self.model.layout_model.batch_predict(
-                # layout_images, self.batch_ratio * YOLO_LAYOUT_BASE_BATCH_SIZE
-                layout_images, YOLO_LAYOUT_BASE_BATCH_SIZE
-            )
+                with self.model.layout_lock:
+                    images_layout_res += self.model.layout_model.batch_predict(
+                        # layout_images, self.batch_ratio * YOLO_LAYOUT_BASE_BATCH_SIZE
+                        layout_images, YOLO_LAYOUT_BASE_BATCH_SIZE
+                    )
                             
-        elif self.model.layout_model_name == MODEL_NAME.PaddleXLayoutModel:
-            # PP-DocLayout_plus-L
-            paddlex_layout_images = []
-            for image_index, image in enumerate(images):
-                pil_img = Image.fromarray(image)
-                paddlex_layout_images.append(pil_img)
-            layout_results = self.model.layout_model.batch_predict(
-                paddlex_layout_images, YOLO_LAYOUT_BASE_BATCH_SIZE 
-            )
+            elif self.model.layout_model_name == MODEL_NAME.PaddleXLayoutModel:
+                # PP-DocLayout_plus-L
+                paddlex_layout_images = []
+                for image_index, image in enumerate(images):
+                    pil_img = Image.fromarray(image)
+                    paddlex_layout_images.append(pil_img)
+                with self.model.layout_lock:
+                    layout_results = self.model.layout_model.batch_predict(
+                        paddlex_layout_images, YOLO_LAYOUT_BASE_BATCH_SIZE 
+                    )
             
-            images_layout_res += layout_results
-        else: 
-            logger.error(f"Unsupported layout model name: {self.model.layout_model_name}")
-            raise ValueError(f"Unsupported layout model name: {self.model.layout_model_name}")
+                images_layout_res += layout_results
+            else: 
+                logger.error(f"Unsupported layout model name: {self.model.layout_model_name}")
+                raise ValueError(f"Unsupported layout model name: {self.model.layout_model_name}")
 
-        logger.info(
-            f'layout time: {round(time.time() - layout_start_time, 2)}, image num: {len(images)}'
-        )
+            logger.info(
+                f'layout time: {round(time.time() - layout_start_time, 2)}, image num: {len(images)}'
+            )
 
         if pred_abandon:
             for index in range(len(images)):
@@ -87,7 +98,10 @@ class BatchAnalyzeLLM:
                     direct_messages.append(f'''Please output the text content from the image. If the image contains handwritten text, ancient Chinese characters, calligraphy, or any readable text, please try your best to recognize and transcribe all visible text content.''')
                 
                 # Get direct recognition results
+                direct_start = time.time()
                 direct_results = self.model.chat_model.batch_inference(direct_images, direct_messages)
+                RECOGNITION_SECONDS.observe(time.time() - direct_start, category='page')
+                RECOGNIZED_ITEMS.inc(len(direct_images), category='page')
                 
                 # Replace layout results for these pages
                 for i, page_idx in enumerate(pages_to_process_directly):
@@ -109,21 +123,22 @@ class BatchAnalyzeLLM:
         new_images_all = []
         cids_all = []
         page_idxs = []
-        for index in range(len(images)):
-            layout_res = images_layout_res[index]
-            pil_img = Image.fromarray(images[index])
-            new_images = []
-            cids = []
-            for res in layout_res:
-                pad_size = 0 if res['category_id'] == 5 else 50
-                new_image, useful_list = crop_img(
-                    res, pil_img, crop_paste_x=pad_size, crop_paste_y=pad_size
-                )
-                new_images.append(new_image)
-                cids.append(res['category_id'])
-            new_images_all.extend(new_images)
-            cids_all.extend(cids)
-            page_idxs.append(len(new_images_all) - len(new_images))
+        with stage_timer('crop'):
+            for index in range(len(images)):
+                layout_res = images_layout_res[index]
+                pil_img = Image.fromarray(images[index])
+                new_images = []
+                cids = []
+                for res in layout_res:
+                    pad_size = 0 if res['category_id'] == 5 else 50
+                    new_image, useful_list = crop_img(
+                        res, pil_img, crop_paste_x=pad_size, crop_paste_y=pad_size
+                    )
+                    new_images.append(new_image)
+                    cids.append(res['category_id'])
+                new_images_all.extend(new_images)
+                cids_all.extend(cids)
+                page_idxs.append(len(new_images_all) - len(new_images))
         ocr_result = self.batch_lmm_ocr(new_images_all, cids_all)
         for index in range(len(images)):
             ocr_results = []
@@ -200,6 +215,7 @@ class BatchAnalyzeLLM:
             101: instruction,
         }
         new_images = []
+        new_categories = []
         messages = []
         ignore_idx = []
         outs = []
@@ -208,10 +224,40 @@ class BatchAnalyzeLLM:
                 ignore_idx.append(i)
                 continue
             new_images.append(images[i])
+            new_categories.append(CATEGORY_METRIC_NAMES.get(cat_ids[i], 'other'))
             messages.append(cid2instruction[cat_ids[i]])
         if len(new_images) == 0:
             return [''] * len(images)
-        out = self.model.chat_model.batch_inference(new_images, messages)
+        recognition_start = time.time()
+        with stage_timer('recognition', crops=len(new_images)) as recognition_span:
+            out = self.model.chat_model.batch_inference(new_images, messages)
+        recognition_time = time.time() - recognition_start
+        BATCH_SIZE.observe(len(new_images), stage='recognition_request')
+        categories = {}
+        for category in new_categories:
+            categories[category] = categories.get(category, 0) + 1
+        for category, count in categories.items():
+            RECOGNIZED_ITEMS.inc(count, category=category)
+        # one span per crop, with the tokens and the (start_ns, end_ns) the backend annotated, if any
+        item_tokens = recognition_span.attributes.pop('item_tokens', None)
+        item_times = recognition_span.attributes.pop('item_times', None)
+        untimed_items = False
+        for k, (image, category, text) in enumerate(zip(new_images, new_categories, out)):
+            start_ns, end_ns = recognition_span.start_ns, recognition_span.end_ns
+            if item_times and item_times[k] is not None:
+                start_ns, end_ns = item_times[k]
+                RECOGNITION_SECONDS.observe((end_ns - start_ns) / 1e9, category=category)
+            else:
+                untimed_items = True
+            record_span(
+                'recognize_crop', start_ns, end_ns, parent=recognition_span, track=f'crop {k}',
+                category=category, pixels=image.width * image.height, output_chars=len(text),
+                tokens=item_tokens[k] if item_tokens else None,
+                latency=(end_ns - start_ns) / 1e9,
+            )
+        if untimed_items:
+            # the batch time says nothing about a single category
+            RECOGNITION_SECONDS.observe(recognition_time, category='mixed')
         outs.extend(out)
         for j in ignore_idx:
             outs.insert(j, '')
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+from typing import List
+
+from loguru import logger
+
+from magic_pdf.libs.metrics import BATCH_SIZE
+
+
+class _BatchRequest:
+    def __init__(self, items):
+        self.items = items
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Merge the calls of concurrent documents to a shared model into batches.
+
+    Each caller blocks until its results are back. A dispatcher thread, the
+    only one calling the model, takes every request queued while the
+    previous batch was running (waiting up to `max_wait` seconds for more
+    once the first one arrives) and runs them as one batch of at most
+    `max_batch_size` items, unless a single request is larger. Requests are
+    never split, so the results of a call keep their order. Subclasses
+    implement run_batch().
+    """
+
+    name = 'batch'
+
+    def __init__(self, max_batch_size: int, max_wait: float):
+        """Initialized method.
+
+        Args:
+            max_batch_size (int): items merged into one batch
+            max_wait (float): seconds to wait for other requests
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = []
+        self._cond = threading.Condition()
+        self._batches = 0
+        self._requests = 0
+        self._items = 0
+        self._thread = threading.Thread(target=self._dispatch_loop, name=f'{self.name}-batcher', daemon=True)
+        self._thread.start()
+
+    def run_batch(self, items: List) -> List:
+        raise NotImplementedError
+
+    def submit(self, items: List) -> List:
+        """Queue `items` with the requests of other callers and wait for their results."""
+        if not items:
+            return []
+        request = _BatchRequest(items)
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.time() + self.max_wait
+            while sum(len(r.items) for r in self._queue) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.pop(0)]
+            size = len(batch[0].items)
+            while self._queue and size + len(self._queue[0].items) <= self.max_batch_size:
+                request = self._queue.pop(0)
+                batch.append(request)
+                size += len(request.items)
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._take_batch()
+            items = [item for request in batch for item in request.items]
+            try:
+                start = time.time()
+                results = self.run_batch(items)
+                logger.info(
+                    f'{self.name} batch: {len(items)} items from {len(batch)} requests '
+                    f'in {round(time.time() - start, 2)}s'
+                )
+                offset = 0
+                for request in batch:
+                    request.results = results[offset:offset + len(request.items)]
+                    offset += len(request.items)
+            except Exception as e:
+                logger.error(f'{self.name} batch failed: {e}')
+                for request in batch:
+                    request.error = e
+            with self._cond:
+                self._batches += 1
+                self._requests += len(batch)
+                self._items += len(items)
+            BATCH_SIZE.observe(len(items), stage=f'{self.name}_batch')
+            for request in batch:
+                request.done.set()
+
+    def stats(self) -> dict:
+        """Get the batching counters.
+
+        Returns:
+            dict: batches run, requests and items merged into them, mean items per batch and queued requests
+        """
+        with self._cond:
+            return {
+                'batches': self._batches,
+                'requests': self._requests,
+                'items': self._items,
+                'mean_batch_size': self._items / self._batches if self._batches else 0.0,
+                'queued': len(self._queue),
+            }
+
+
+class RecognitionBatcher(MicroBatcher):
+    """Merge the batch_inference calls of concurrent documents into shared
+    batches of a sync-only chat model."""
+
+    name = 'recognition'
+
+    def __init__(self, chat_model, max_batch_size: int = 256, max_wait: float = 0.05):
+        """Initialized method.
+
+        Args:
+            chat_model: the sync chat model doing the recognition
+            max_batch_size (int, optional): images merged into one call. Defaults to 256.
+            max_wait (float, optional): seconds to wait for other requests. Defaults to 0.05.
+        """
+        self.chat_model = chat_model
+        self.model_name = chat_model.model_name
+        super().__init__(max_batch_size, max_wait)
+        logger.info(f'recognition batching enabled, max batch size: {max_batch_size}, max wait: {max_wait}s')
+
+    def __getattr__(self, name):
+        # everything but batch_inference goes straight to the chat model
+        if name == 'chat_model':
+            raise AttributeError(name)
+        return getattr(self.chat_model, name)
+
+    def run_batch(self, items: List) -> List[str]:
+        images = [image for image, _ in items]
+        questions = [question for _, question in items]
+        return self.chat_model.batch_inference(images, questions)
+
+    def batch_inference(self, images: List, questions: List[str]) -> List[str]:
+        if len(images) != len(questions):
+            raise ValueError('Images and questions must have the same length')
+        return self.submit(list(zip(images, questions)))
+
+    async def async_batch_inference(self, images: List, questions: List[str]) -> List[str]:
+        return await asyncio.get_event_loop().run_in_executor(None, self.batch_inference, images, questions)
+
+
+class LayoutBatcher(MicroBatcher):
+    """Layout service shared by the documents of the process.
+
+    Pages of concurrent documents are detected in shared batch_predict calls
+    made from a single thread, so the layout model singleton is never used
+    by two threads at once.
+    """
+
+    name = 'layout'
+
+    def __init__(self, layout_model, batch_size: int = 8, max_batch_size: int = 64, max_wait: float = 0.01):
+        """Initialized method.
+
+        Args:
+            layout_model: DocLayoutYOLOModel or PaddleXLayoutModelWrapper
+            batch_size (int, optional): batch size of the model forward passes. Defaults to 8.
+            max_batch_size (int, optional): pages merged into one batch_predict call. Defaults to 64.
+            max_wait (float, optional): seconds to wait for other requests. Defaults to 0.01.
+        """
+        self.layout_model = layout_model
+        self.batch_size = batch_size
+        super().__init__(max_batch_size, max_wait)
+
+    def __getattr__(self, name):
+        if name == 'layout_model':
+            raise AttributeError(name)
+        return getattr(self.layout_model, name)
+
+    def run_batch(self, items: List) -> List:
+        return self.layout_model.batch_predict(items, self.batch_size)
+
+    def batch_predict(self, images: List, batch_size: int = None) -> List:
+        """Same as the wrapped batch_predict, the forward passes use the
+        batch size of the batcher."""
+        return self.submit(list(images))
@@ -5,6 +5,13 @@ from magic_pdf.config.constants import *
 from magic_pdf.model.sub_modules.model_init import AtomModelSingleton
 from magic_pdf.model.model_list import AtomicModel
 from magic_pdf.model.async_vllm import MonkeyChat_vLLM_async
+from magic_pdf.model.batch_scheduler import LayoutBatcher, RecognitionBatcher
+from magic_pdf.model.sub_modules.reading_oreder.layoutreader.cache import ReadingOrderCache, model_identity
+from magic_pdf.libs.result_cache import DocumentResultCache
+from magic_pdf.libs.metrics import BATCH_SIZE, GENERATED_TOKENS
+from magic_pdf.libs.tracing import current_span, span
+from magic_pdf.model.sub_modules.reading_oreder.layoutreader.helpers import (INT8_MIN_PARITY, order_parity,
+                                                                           parity_pages, quantize_for_cpu)
 from magic_pdf.utils.load_image import load_image, encode_image_base64
 from transformers import LayoutLMv3ForTokenClassification
 from loguru import logger
@@ -14,7 +21,9 @@ from PIL import Image
 from typing import List, Union
 from openai import OpenAI
 import asyncio
+import threading
 import uuid
+from contextlib import nullcontext
 
 
 class MonkeyOCR:
@@ -85,6 +94,16 @@ class MonkeyOCR:
             )
         logger.info(f'layout model loaded: {self.layout_model_name}')
 
+        layout_batching_config = self.layout_config.get('batching', {}) or {}
+        if layout_batching_config.get('enabled', False):
+            # pages of concurrent documents share batched calls from a single thread
+            self.layout_model = LayoutBatcher(
+                self.layout_model,
+                batch_size=layout_batching_config.get('batch_size', 8),
+                max_batch_size=layout_batching_config.get('max_batch_size', 64),
+                max_wait=layout_batching_config.get('max_wait', 0.01),
+            )
+
 
         layout_reader_config = self.layout_config.get('reader')
         self.layout_reader_name = layout_reader_config.get('name')
@@ -104,11 +123,54 @@ class MonkeyOCR:
                 model.to(self.device).eval().bfloat16()
             else:
                 model.to(self.device).eval()
+
+            reader_quantization = 'none'
+            cpu_optimize = layout_reader_config.get('cpu_optimize', 'auto')
+            if self.device.startswith('cpu') and cpu_optimize in ('auto', 'int8'):
+                try:
+                    quantized = quantize_for_cpu(model)
+                    # auto keeps the eager model unless the int8 one orders the fixed parity pages alike
+                    parity = order_parity(model, quantized, parity_pages()) if cpu_optimize == 'auto' else 1.0
+                    if parity >= INT8_MIN_PARITY:
+                        model = quantized
+                        reader_quantization = 'int8'
+                        logger.info(f'layoutreader model quantized to int8 for cpu inference (parity {parity:.2%})')
+                    else:
+                        logger.warning(f'layoutreader int8 parity {parity:.2%} below {INT8_MIN_PARITY:.0%}, using eager model')
+                except Exception as e:
+                    logger.warning(f'layoutreader int8 quantization failed, using eager model: {e}')
+            # cached orders are only served to the same weights, settings and code
+            reader_id = model_identity(layoutreader_model_dir, quantization=reader_quantization, bf16=bf16_supported)
         else:
             logger.error('model name not allow')
+            model = None
+            reader_id = ''
         self.layoutreader_model = model
         logger.info(f'layoutreader model loaded: {self.layout_reader_name}')
 
+        cache_size = layout_reader_config.get('cache_size', 4096)
+        if cache_size and cache_size > 0:
+            self.layoutreader_cache = ReadingOrderCache(
+                max_size=cache_size, path=layout_reader_config.get('cache_path'),
+                model_id=reader_id,
+            )
+        else:
+            self.layoutreader_cache = None
+
+        self.postprocess_config = self.configs.get('postprocess_config', {}) or {}
+        self.image_config = self.configs.get('image_config', {}) or {}
+
+        result_cache_config = self.configs.get('result_cache', {}) or {}
+        if result_cache_config.get('enabled', False):
+            self.result_cache = DocumentResultCache(
+                result_cache_config.get('path', 'cache/results'),
+                self.configs,
+                max_bytes=int(result_cache_config.get('max_size_mb', 2048)) * 1024 * 1024,
+                ttl_seconds=int(result_cache_config.get('ttl_hours', 168)) * 3600,
+            )
+        else:
+            self.result_cache = None
+
         self.chat_config = self.configs.get('chat_config', {})
         chat_backend = self.chat_config.get('backend', 'lmdeploy')
         chat_path = self.chat_config.get('weight_path', 'model_weight/Recognition')
@@ -166,6 +228,19 @@ class MonkeyOCR:
             self.chat_model = MonkeyChat_LMDeploy(chat_path)
         logger.info(f'LMM loaded: {self.chat_model.model_name}')
 
+        batching_config = self.chat_config.get('batching', {}) or {}
+        if batching_config.get('enabled', False):
+            if hasattr(self.chat_model, 'async_batch_inference'):
+                logger.info('recognition batching skipped, the backend already batches concurrent requests')
+            else:
+                self.chat_model = RecognitionBatcher(
+                    self.chat_model,
+                    max_batch_size=batching_config.get('max_batch_size', 256),
+                    max_wait=batching_config.get('max_wait', 0.05),
+                )
+        # documents running concurrently share the layout model, the layout batcher already calls it from one thread
+        self.layout_lock = nullcontext() if isinstance(self.layout_model, LayoutBatcher) else threading.Lock()
+
 class MonkeyChat_LMDeploy:
     def __init__(self, model_path, dp=1, tp=1): 
         try:
@@ -200,6 +275,8 @@ class MonkeyChat_LMDeploy:
     def batch_inference(self, images, questions):
         inputs = [(question, load_image(image, max_size=1600)) for image, question in zip(images, questions)]
         outputs = self.pipe(inputs, gen_config=self.gen_config, use_tqdm=True)
+        GENERATED_TOKENS.inc(sum(output.generate_token_len for output in outputs), backend='lmdeploy')
+        current_span().set(item_tokens=[output.generate_token_len for output in outputs])
         return [output.text for output in outputs]
     
 class MonkeyChat_vLLM:
@@ -238,6 +315,8 @@ class MonkeyChat_vLLM:
             }
         } for i in range(len(prompts))]
         outputs = self.pipe.generate(inputs, sampling_params=self.gen_config)
+        GENERATED_TOKENS.inc(sum(len(o.outputs[0].token_ids) for o in outputs), backend='vllm')
+        current_span().set(item_tokens=[len(o.outputs[0].token_ids) for o in outputs])
         return [o.outputs[0].text for o in outputs]
 
 class MonkeyChat_transformers:
@@ -323,19 +402,24 @@ class MonkeyChat_transformers:
             raise ValueError("Images and questions must have the same length")
         
         results = []
+        item_tokens = []
+        item_times = []
         total_items = len(images)
         
         for i in range(0, total_items, self.max_batch_size):
             batch_end = min(i + self.max_batch_size, total_items)
             batch_images = images[i:batch_end]
             batch_questions = questions[i:batch_end]
+            batch_start_ns = time.time_ns()
             
             logger.info(f"Processing batch {i//self.max_batch_size + 1}/{(total_items-1)//self.max_batch_size + 1} "
                        f"(items {i+1}-{batch_end})")
             
             try:
-                batch_results = self._process_batch(batch_images, batch_questions)
+                with span('generate_batch', items=len(batch_images)) as batch_span:
+                    batch_results = self._process_batch(batch_images, batch_questions)
                 results.extend(batch_results)
+                item_tokens.extend(batch_span.attributes.pop('item_tokens', []))
             except Exception as e:
                 logger.error(f"Batch processing failed for items {i+1}-{batch_end}: {e}")
                 logger.info("Falling back to single processing...")
@@ -347,9 +431,14 @@ class MonkeyChat_transformers:
                         logger.error(f"Single processing also failed: {single_e}")
                         results.append(f"Error: {str(single_e)}")
             
+            item_tokens.extend([None] * (len(results) - len(item_tokens)))
+            # the items of a batch are generated together, each takes the whole batch
+            item_times.extend([(batch_start_ns, time.time_ns())] * (len(results) - len(item_times)))
+            
             if self.device == 'cuda':
                 torch.cuda.empty_cache()
         
+        current_span().set(item_tokens=item_tokens, item_times=item_times)
         return results
     
     def _process_batch(self, batch_images: List[Union[str, Image.Image]], batch_questions: List[str]) -> List[str]:
@@ -386,6 +475,8 @@ class MonkeyChat_transformers:
         generated_ids_trimmed = [
             out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
         ]
+        GENERATED_TOKENS.inc(sum(len(ids) for ids in generated_ids_trimmed), backend='transformers')
+        current_span().set(item_tokens=[len(ids) for ids in generated_ids_trimmed])
         
         output_texts = self.processor.batch_decode(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
@@ -433,6 +524,7 @@ class MonkeyChat_transformers:
         generated_ids_trimmed = [
             out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
         ]
+        GENERATED_TOKENS.inc(sum(len(ids) for ids in generated_ids_trimmed), backend='transformers')
         
         output_text = self.processor.batch_decode(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
@@ -477,7 +569,11 @@ class MonkeyChat_OpenAIAPI:
 
     def batch_inference(self, images: List[Union[str, Image.Image]], questions: List[str]) -> List[str]:
         results = []
+        item_tokens = []
+        item_times = []
         for image, question in zip(images, questions):
+            tokens = None
+            item_start_ns = time.time_ns()
             try:
                 # Load and resize image
                 image = load_image(image, max_size=1600)
@@ -501,8 +597,14 @@ class MonkeyChat_OpenAIAPI:
                     messages=messages
                 )
                 results.append(response.choices[0].message.content)
+                if response.usage is not None:
+                    tokens = response.usage.completion_tokens
+                    GENERATED_TOKENS.inc(tokens, backend='api')
             except Exception as e:
                 results.append(f"Error: {e}")
+            item_tokens.append(tokens)
+            item_times.append((item_start_ns, time.time_ns()))
+        current_span().set(item_tokens=item_tokens, item_times=item_times)
         return results
 
 class MonkeyChat_LMDeploy_queue:
@@ -638,6 +740,8 @@ class MonkeyChat_LMDeploy_queue:
             start_time = time.time()
             outputs = self.pipe(inputs, gen_config=self.gen_config)
             processing_time = time.time() - start_time
+            BATCH_SIZE.observe(len(batch_requests), stage='recognition_batch')
+            GENERATED_TOKENS.inc(sum(output.generate_token_len for output in outputs), backend='lmdeploy_queue')
             
             logger.info(f"Processed batch of {len(batch_requests)} requests in {processing_time:.2f}s "
                        f"({len(batch_requests)/processing_time:.1f} req/s)")
@@ -1000,6 +1104,8 @@ class MonkeyChat_vLLM_queue:
             start_time = time.time()
             outputs = self.engine.generate(inputs, sampling_params=self.gen_config)
             processing_time = time.time() - start_time
+            BATCH_SIZE.observe(len(batch_requests), stage='recognition_batch')
+            GENERATED_TOKENS.inc(sum(len(output.outputs[0].token_ids) for output in outputs), backend='vllm_queue')
             
             logger.info(f"Processed batch of {len(batch_requests)} requests in {processing_time:.2f}s "
                        f"({len(batch_requests)/processing_time:.1f} req/s)")
@@ -1322,19 +1428,24 @@ class MonkeyChat_Qwen3VL:
             raise ValueError("Images and questions must have the same length")
         
         results = []
+        item_tokens = []
+        item_times = []
         total_items = len(images)
         
         for i in range(0, total_items, self.max_batch_size):
             batch_end = min(i + self.max_batch_size, total_items)
             batch_images = images[i:batch_end]
             batch_questions = questions[i:batch_end]
+            batch_start_ns = time.time_ns()
             
             logger.info(f"Processing batch {i//self.max_batch_size + 1}/{(total_items-1)//self.max_batch_size + 1} "
                        f"(items {i+1}-{batch_end})")
             
             try:
-                batch_results = self._process_batch(batch_images, batch_questions)
+                with span('generate_batch', items=len(batch_images)) as batch_span:
+                    batch_results = self._process_batch(batch_images, batch_questions)
                 results.extend(batch_results)
+                item_tokens.extend(batch_span.attributes.pop('item_tokens', []))
             except Exception as e:
                 logger.error(f"Batch processing failed for items {i+1}-{batch_end}: {e}")
                 logger.info("Falling back to single processing...")
@@ -1346,9 +1457,14 @@ class MonkeyChat_Qwen3VL:
                         logger.error(f"Single processing also failed: {single_e}")
                         results.append(f"Error: {str(single_e)}")
             
+            item_tokens.extend([None] * (len(results) - len(item_tokens)))
+            # the items of a batch are generated together, each takes the whole batch
+            item_times.extend([(batch_start_ns, time.time_ns())] * (len(results) - len(item_times)))
+            
             if self.device == 'cuda':
                 torch.cuda.empty_cache()
         
+        current_span().set(item_tokens=item_tokens, item_times=item_times)
         return results
     
     def _process_batch(self, batch_images: List[Union[str, Image.Image]], batch_questions: List[str]) -> List[str]:
@@ -1385,6 +1501,8 @@ class MonkeyChat_Qwen3VL:
         generated_ids_trimmed = [
             out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
         ]
+        GENERATED_TOKENS.inc(sum(len(ids) for ids in generated_ids_trimmed), backend='qwen3vl')
+        current_span().set(item_tokens=[len(ids) for ids in generated_ids_trimmed])
         
         output_texts = self.processor.batch_decode(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
@@ -1432,6 +1550,7 @@ class MonkeyChat_Qwen3VL:
         generated_ids_trimmed = [
             out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
         ]
+        GENERATED_TOKENS.inc(sum(len(ids) for ids in generated_ids_trimmed), backend='qwen3vl')
         
         output_text = self.processor.batch_decode(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
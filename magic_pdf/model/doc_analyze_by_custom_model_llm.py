@@ -3,6 +3,8 @@ from loguru import logger
 from magic_pdf.model.batch_analyze_llm import BatchAnalyzeLLM
 from magic_pdf.data.dataset import Dataset, MultiFileDataset
 from magic_pdf.libs.clean_memory import clean_memory
+from magic_pdf.libs.metrics import PAGES, stage_timer
+from magic_pdf.libs.tracing import span
 from magic_pdf.operators.models_llm import InferenceResultLLM
 from magic_pdf.data.dataset import ImageDataset
 from io import BytesIO
@@ -19,7 +21,7 @@ def doc_analyze_llm(
     pred_abandon=False,
 ) -> InferenceResultLLM:
 
-    end_page_id = end_page_id if end_page_id else len(dataset) - 1
+    end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else len(dataset) - 1
 
     device = MonkeyOCR_model.device
 
@@ -28,17 +30,30 @@ def doc_analyze_llm(
     model_json = []
     doc_analyze_start = time.time()
 
-    image_dicts = []
+    # rendered pages by page index, pages outside [start_page_id, end_page_id] are not rendered
+    image_dicts = {}
     images = []
-    for index in range(len(dataset)):
-        if start_page_id <= index <= end_page_id:
-            page_data = dataset.get_page(index)
-            img_dict = page_data.get_image()
-            image_dicts.append(img_dict)
-            images.append(img_dict['img'])
+    with stage_timer('rasterize'):
+        for index in range(len(dataset)):
+            if start_page_id <= index <= end_page_id:
+                page_data = dataset.get_page(index)
+                img_dict = page_data.get_image()
+                image_dicts[index] = img_dict
+                images.append(img_dict['img'])
+    PAGES.inc(len(images))
+
+    def get_img_dict(index, need_img=False):
+        if index in image_dicts:
+            return image_dicts[index]
+        if need_img:
+            return dataset.get_page(index).get_image()
+        # same size get_image() would render, without rendering the page
+        page_info = dataset.get_page(index).get_page_info()
+        return {'width': int(page_info.w * 200 / 72), 'height': int(page_info.h * 200 / 72)}
     
     logger.info(f'images load time: {round(time.time() - doc_analyze_start, 2)}')
-    analyze_result = batch_model(images, split_pages=split_pages or split_files, pred_abandon=pred_abandon)
+    with span('analyze', pages=len(images)):
+        analyze_result = batch_model(images, split_pages=split_pages or split_files, pred_abandon=pred_abandon)
 
     # Handle MultiFileDataset with split_files
     if split_files and isinstance(dataset, MultiFileDataset):
@@ -61,7 +76,7 @@ def doc_analyze_llm(
                 else:
                     result = []
                 
-                img_dict = image_dicts[global_page_idx]
+                img_dict = get_img_dict(global_page_idx, need_img=split_pages)
                 page_width = img_dict['width']
                 page_height = img_dict['height']
                 
@@ -103,7 +118,7 @@ def doc_analyze_llm(
         # Original logic for non-split_files cases
         inference_results = []
         for index in range(len(dataset)):
-            img_dict = image_dicts[index]
+            img_dict = get_img_dict(index, need_img=split_pages)
             page_width = img_dict['width']
             page_height = img_dict['height']
             if start_page_id <= index <= end_page_id:
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from loguru import logger
+
+from magic_pdf.libs.version import __version__
+
+
+def model_identity(model_dir: str, **settings) -> str:
+    """Identity of a reader model: its weight files (name, size, mtime), the
+    settings it runs with (e.g. quantization, dtype) and the code version."""
+    files = []
+    for root, _, names in os.walk(model_dir):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files.append([os.path.relpath(os.path.join(root, name), model_dir), stat.st_size, stat.st_mtime_ns])
+    payload = json.dumps(
+        {'files': sorted(files), 'settings': settings, 'version': __version__}, sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class ReadingOrderCache:
+    """LRU cache of layoutreader orders keyed by the quantized 0-1000 box list
+    and the identity of the model predicting them.
+
+    Templated documents (invoices, forms) produce the same box list over and
+    over, the cache lets them skip the LayoutLMv3 forward pass. An optional
+    sqlite file keeps the orders across runs; orders of other weights,
+    quantization or code versions stored there are not served.
+    """
+
+    def __init__(self, max_size: int = 4096, path: Optional[str] = None, model_id: str = ''):
+        """Initialized method.
+
+        Args:
+            max_size (int, optional): maximum entries kept in memory. Defaults to 4096.
+            path (str, optional): sqlite file used as persistent tier. Defaults to None.
+            model_id (str, optional): identity of the model, see model_identity(). Defaults to ''.
+        """
+        self.max_size = max_size
+        self.model_id = model_id
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if path:
+            dir_name = os.path.dirname(path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            # commits append to the write-ahead log without a sync, a crash
+            # loses at most the latest orders
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS reading_order (key TEXT PRIMARY KEY, orders TEXT)'
+            )
+            self._db.commit()
+            logger.info(f'layoutreader cache persisted to: {path}')
+
+    def make_key(self, boxes: List[List[int]]) -> str:
+        payload = f"{self.model_id}:{json.dumps(boxes, separators=(',', ':'))}"
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, boxes: List[List[int]]) -> Optional[List[int]]:
+        key = self.make_key(boxes)
+        with self._lock:
+            orders = self._entries.get(key)
+            if orders is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return orders
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT orders FROM reading_order WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    orders = json.loads(row[0])
+                    self._put_memory(key, orders)
+                    self.hits += 1
+                    return orders
+            self.misses += 1
+            return None
+
+    def put(self, boxes: List[List[int]], orders: List[int]) -> None:
+        key = self.make_key(boxes)
+        with self._lock:
+            self._put_memory(key, orders)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO reading_order (key, orders) VALUES (?, ?)',
+                    (key, json.dumps(orders)),
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, orders: List[int]) -> None:
+        self._entries[key] = orders
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Get the cache counters.
+
+        Returns:
+            dict: hits, misses, hit_rate and the number of entries in memory
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
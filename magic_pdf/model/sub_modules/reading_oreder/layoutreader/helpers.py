@@ -8,6 +8,9 @@ MAX_LEN = 510
 CLS_TOKEN_ID = 0
 UNK_TOKEN_ID = 3
 EOS_TOKEN_ID = 2
+# share of reading order positions the int8 model must predict like the
+# eager one before `cpu_optimize: auto` uses it
+INT8_MIN_PARITY = 0.99
 
 
 class DataCollator:
@@ -74,6 +77,31 @@ def boxes2inputs(boxes: List[List[int]]) -> Dict[str, torch.Tensor]:
     }
 
 
+def batch_boxes2inputs(boxes_list: List[List[List[int]]]) -> Dict[str, torch.Tensor]:
+    """
+    build padded model inputs for several box lists at once
+
+    :param boxes_list: one box list per sample
+    :return: inputs with batch dimension len(boxes_list)
+    """
+    max_len = max(len(boxes) for boxes in boxes_list) + 2
+    bbox = []
+    input_ids = []
+    attention_mask = []
+    for boxes in boxes_list:
+        pad_len = max_len - len(boxes) - 2
+        bbox.append([[0, 0, 0, 0]] + boxes + [[0, 0, 0, 0]] * (pad_len + 1))
+        input_ids.append(
+            [CLS_TOKEN_ID] + [UNK_TOKEN_ID] * len(boxes) + [EOS_TOKEN_ID] * (pad_len + 1)
+        )
+        attention_mask.append([1] + [1] * len(boxes) + [1] + [0] * pad_len)
+    return {
+        "bbox": torch.tensor(bbox),
+        "attention_mask": torch.tensor(attention_mask),
+        "input_ids": torch.tensor(input_ids),
+    }
+
+
 def prepare_inputs(
     inputs: Dict[str, torch.Tensor], model: LayoutLMv3ForTokenClassification
 ) -> Dict[str, torch.Tensor]:
@@ -86,6 +114,74 @@ def prepare_inputs(
     return ret
 
 
+def quantize_for_cpu(
+    model: LayoutLMv3ForTokenClassification,
+) -> LayoutLMv3ForTokenClassification:
+    """
+    dynamic int8 quantization of the linear layers, for cpu inference
+
+    :param model: eager float32 model on cpu
+    :return: quantized copy of the model
+    """
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    ).eval()
+
+
+def parity_pages(count: int = 8, num_boxes: int = 60, seed: int = 0) -> List[List[List[int]]]:
+    """
+    fixed column-ish layouts in the 0-1000 space, the box sets of the int8 parity check
+
+    :param count: pages
+    :param num_boxes: boxes per page
+    :param seed: seed of the layouts
+    :return: box lists
+    """
+    generator = torch.Generator().manual_seed(seed)
+    pages = []
+    for _ in range(count):
+        columns = int(torch.randint(1, 4, (1,), generator=generator))
+        col_w = 1000 // columns
+        boxes = []
+        for i in range(num_boxes):
+            col = i * columns // num_boxes
+            top = int(torch.randint(0, 960, (1,), generator=generator))
+            height = int(torch.randint(8, 40, (1,), generator=generator))
+            left = col * col_w + int(torch.randint(0, 20, (1,), generator=generator))
+            right = min(1000, (col + 1) * col_w - int(torch.randint(0, 20, (1,), generator=generator)))
+            boxes.append([left, top, right, min(1000, top + height)])
+        pages.append(boxes)
+    return pages
+
+
+def predict_order(model: LayoutLMv3ForTokenClassification, boxes: List[List[int]]) -> List[int]:
+    inputs = prepare_inputs(boxes2inputs(boxes), model)
+    with torch.no_grad():
+        logits = model(**inputs).logits.cpu().squeeze(0)
+    return parse_logits(logits, len(boxes))
+
+
+def order_parity(
+    eager: LayoutLMv3ForTokenClassification,
+    quantized: LayoutLMv3ForTokenClassification,
+    pages: List[List[List[int]]],
+) -> float:
+    """
+    share of reading order positions the quantized model predicts like the eager one
+
+    :param eager: reference model
+    :param quantized: model checked
+    :param pages: box lists, e.g. parity_pages()
+    :return: 0-1
+    """
+    same = total = 0
+    for boxes in pages:
+        expected = predict_order(eager, boxes)
+        same += sum(x == y for x, y in zip(expected, predict_order(quantized, boxes)))
+        total += len(expected)
+    return same / total if total else 1.0
+
+
 def parse_logits(logits: torch.Tensor, length: int) -> List[int]:
     """
     parse logits to orders
@@ -5,12 +5,16 @@ import numpy as np
 
 def projection_by_bboxes(boxes: np.array, axis: int) -> np.ndarray:
     assert axis in [0, 1]
-    length = np.max(boxes[:, axis::2])
-    res = np.zeros(length, dtype=int)
-    # TODO: how to remove for loop?
-    for start, end in boxes[:, axis::2]:
-        res[start:end] += 1
-    return res
+    length = max(int(np.max(boxes[:, axis::2])), 0)
+    # boxes may stick out of the page, only the part inside [0, length] is projected
+    starts = np.clip(boxes[:, axis], 0, length)
+    ends = np.clip(boxes[:, axis + 2], 0, length)
+    valid = ends > starts
+    # difference array: +1 where a box starts, -1 where it ends
+    diff = np.bincount(starts[valid], minlength=length + 1) - np.bincount(
+        ends[valid], minlength=length + 1
+    )
+    return np.cumsum(diff[:length])
 
 
 # from: https://dothinking.github.io/2021-06-19-%E9%80%92%E5%BD%92%E6%8A%95%E5%BD%B1%E5%88%86%E5%89%B2%E7%AE%97%E6%B3%95/#:~:text=%E9%80%92%E5%BD%92%E6%8A%95%E5%BD%B1%E5%88%86%E5%89%B2%EF%BC%88Recursive%20XY,%EF%BC%8C%E5%8F%AF%E4%BB%A5%E5%88%92%E5%88%86%E6%AE%B5%E8%90%BD%E3%80%81%E8%A1%8C%E3%80%82
@@ -58,52 +62,141 @@ def split_projection_profile(arr_values: np.array, min_value: float, min_gap: fl
 
 
 def recursive_xy_cut(boxes: np.ndarray, indices: List[int], res: List[int]):
+    """XY-cut the boxes and append their indices to `res` in reading order.
 
+    The cut is done depth-first with an explicit stack instead of Python
+    recursion, the output is the same as cutting recursively.
+    """
     assert len(boxes) == len(indices)
 
-    _indices = boxes[:, 1].argsort()
-    y_sorted_boxes = boxes[_indices]
-    y_sorted_indices = indices[_indices]
+    stack = [(boxes, indices)]
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, tuple):
+            res.extend(item)
+            continue
+        boxes, indices = item
 
-    # debug_vis(y_sorted_boxes, y_sorted_indices)
+        _indices = boxes[:, 1].argsort(kind='stable')
+        y_sorted_boxes = boxes[_indices]
+        y_sorted_indices = indices[_indices]
 
-    y_projection = projection_by_bboxes(boxes=y_sorted_boxes, axis=1)
-    pos_y = split_projection_profile(y_projection, 0, 1)
-    if not pos_y:
-        return
+        # debug_vis(y_sorted_boxes, y_sorted_indices)
 
-    arr_y0, arr_y1 = pos_y
-    for r0, r1 in zip(arr_y0, arr_y1):
+        y_projection = projection_by_bboxes(boxes=y_sorted_boxes, axis=1)
+        pos_y = split_projection_profile(y_projection, 0, 1)
+        if not pos_y:
+            continue
 
-        _indices = (r0 <= y_sorted_boxes[:, 1]) & (y_sorted_boxes[:, 1] < r1)
+        # work items of this node in reading order, pushed in reverse below
+        todo = []
+        arr_y0, arr_y1 = pos_y
+        for r0, r1 in zip(arr_y0, arr_y1):
 
-        y_sorted_boxes_chunk = y_sorted_boxes[_indices]
-        y_sorted_indices_chunk = y_sorted_indices[_indices]
+            _indices = (r0 <= y_sorted_boxes[:, 1]) & (y_sorted_boxes[:, 1] < r1)
 
-        _indices = y_sorted_boxes_chunk[:, 0].argsort()
-        x_sorted_boxes_chunk = y_sorted_boxes_chunk[_indices]
-        x_sorted_indices_chunk = y_sorted_indices_chunk[_indices]
+            y_sorted_boxes_chunk = y_sorted_boxes[_indices]
+            y_sorted_indices_chunk = y_sorted_indices[_indices]
 
+            _indices = y_sorted_boxes_chunk[:, 0].argsort(kind='stable')
+            x_sorted_boxes_chunk = y_sorted_boxes_chunk[_indices]
+            x_sorted_indices_chunk = y_sorted_indices_chunk[_indices]
 
-        x_projection = projection_by_bboxes(boxes=x_sorted_boxes_chunk, axis=0)
-        pos_x = split_projection_profile(x_projection, 0, 1)
-        if not pos_x:
-            continue
+            x_projection = projection_by_bboxes(boxes=x_sorted_boxes_chunk, axis=0)
+            pos_x = split_projection_profile(x_projection, 0, 1)
+            if not pos_x:
+                continue
 
-        arr_x0, arr_x1 = pos_x
-        if len(arr_x0) == 1:
+            arr_x0, arr_x1 = pos_x
+            if len(arr_x0) == 1:
 
-            res.extend(x_sorted_indices_chunk)
-            continue
+                todo.append(x_sorted_indices_chunk)
+                continue
 
+            for c0, c1 in zip(arr_x0, arr_x1):
+                _indices = (c0 <= x_sorted_boxes_chunk[:, 0]) & (
+                    x_sorted_boxes_chunk[:, 0] < c1
+                )
+                todo.append((x_sorted_boxes_chunk[_indices], x_sorted_indices_chunk[_indices]))
+
+        stack.extend(reversed(todo))
+
+
+def split_into_windows(boxes: np.ndarray, max_boxes: int) -> List[np.ndarray]:
+    """Group boxes into reading-order windows of at most `max_boxes` boxes.
+
+    The page is cut into regions with XY-cut until every region fits into a
+    window, then adjacent regions are packed together so that each window is
+    as large as possible while keeping the coarse top-to-bottom,
+    left-to-right region order.
+
+    Args:
+        boxes (np.ndarray): [N, 4] int boxes, x0, y0, x1, y1.
+        max_boxes (int): Maximum number of boxes in one window.
+
+    Returns:
+        List[np.ndarray]: Indexes into `boxes`, one array per window, in
+        reading order.
+    """
+    regions = []
+    _collect_regions(boxes, np.arange(len(boxes)), max_boxes, regions)
+
+    windows = []
+    current = []
+    for region in regions:
+        if current and len(current) + len(region) > max_boxes:
+            windows.append(np.asarray(current, dtype=int))
+            current = []
+        current.extend(region.tolist())
+    if current:
+        windows.append(np.asarray(current, dtype=int))
+    return windows
+
+
+def _split_by_axis(boxes: np.ndarray, axis: int):
+    """Split boxes along one axis.
+
+    Returns:
+        tuple: One index array per segment and the widest gap between two
+        segments, or None if the boxes can not be split along `axis`.
+    """
+    projection = projection_by_bboxes(boxes=boxes, axis=axis)
+    pos = split_projection_profile(projection, 0, 1)
+    if not pos or len(pos[0]) < 2:
+        return None
+    arr_start, arr_end = pos
+    # only cut at the widest gaps, narrower ones are left to the recursion
+    gaps = arr_start[1:] - arr_end[:-1]
+    max_gap = np.max(gaps)
+    arr_start = np.insert(arr_start[1:][gaps >= max_gap], 0, arr_start[0])
+    # every box belongs to the segment its start coordinate falls into, this
+    # also keeps degenerate boxes that do not contribute to the projection
+    segment_ids = np.searchsorted(arr_start, boxes[:, axis], side='right') - 1
+    segment_ids = np.clip(segment_ids, 0, len(arr_start) - 1)
+    return [np.where(segment_ids == i)[0] for i in range(len(arr_start))], max_gap
+
+
+def _collect_regions(boxes: np.ndarray, indices: np.ndarray, max_boxes: int, res: List[np.ndarray]):
+    if len(indices) <= max_boxes:
+        res.append(indices)
+        return
+
+    # cut along the widest gap first, so that columns win over the small
+    # gaps between lines that happen to be aligned across columns
+    best = None
+    for axis in [1, 0]:
+        split = _split_by_axis(boxes, axis)
+        if split is not None and (best is None or split[1] > best[1]):
+            best = split
+    if best is not None:
+        for segment in best[0]:
+            _collect_regions(boxes[segment], indices[segment], max_boxes, res)
+        return
 
-        for c0, c1 in zip(arr_x0, arr_x1):
-            _indices = (c0 <= x_sorted_boxes_chunk[:, 0]) & (
-                x_sorted_boxes_chunk[:, 0] < c1
-            )
-            recursive_xy_cut(
-                x_sorted_boxes_chunk[_indices], x_sorted_indices_chunk[_indices], res
-            )
+    # no cut found, fall back to plain top-to-bottom chunks
+    _indices = np.lexsort((boxes[:, 0], boxes[:, 1]))
+    for start in range(0, len(_indices), max_boxes):
+        res.append(indices[_indices[start:start + max_boxes]])
 
 
 def points_to_bbox(points):
@@ -24,12 +24,17 @@ class InferenceResultLLM(InferenceResultBase):
         self._infer_res = inference_results
         self._dataset = dataset
 
-    def draw_model(self, file_path: str) -> None:
+    def draw_model(self, file_path: str, writer: DataWriter = None) -> None:
         """Draw model inference result.
 
         Args:
-            file_path (str): the output file path
+            file_path (str): the output file path, relative to the writer when one is given
+            writer (DataWriter, optional): write the pdf through this writer
+                instead of saving it to the local file system. Defaults to None.
         """
+        if writer is not None:
+            draw_model_bbox(copy.deepcopy(self._infer_res), self._dataset, writer, file_path)
+            return
         dir_name = os.path.dirname(file_path)
         base_name = os.path.basename(file_path)
         if not os.path.exists(dir_name):
@@ -77,6 +82,7 @@ class InferenceResultLLM(InferenceResultBase):
         end_page_id=None,
         debug_mode=False,
         lang=None,
+        page_done=None,
     ) -> PipeResultLLM:
         """Post-proc the model inference result, Extract the text using `OCR`
         technical.
@@ -87,6 +93,7 @@ class InferenceResultLLM(InferenceResultBase):
             end_page_id (int, optional):  Defaults to the last page index of dataset. Let user select some pages He/She want to process
             debug_mode (bool, optional): Defaults to False. will dump more log if enabled
             lang (str, optional): Defaults to None.
+            page_done (Callable, optional): Defaults to None. Called once for every page post-processed
 
         Returns:
             PipeResultLLM: the result
@@ -109,6 +116,7 @@ class InferenceResultLLM(InferenceResultBase):
             end_page_id=end_page_id,
             debug_mode=debug_mode,
             lang=lang,
-            MonkeyOCR_model=MonkeyOCR_model
+            MonkeyOCR_model=MonkeyOCR_model,
+            page_done=page_done,
         )
         return res
\ No newline at end of file
@@ -10,6 +10,11 @@ from magic_pdf.dict2md.ocr_mkcontent import union_make
 from magic_pdf.libs.draw_bbox import (draw_layout_bbox, draw_line_sort_bbox,
                                       draw_span_bbox)
 from magic_pdf.libs.json_compressor import JsonCompressor
+from magic_pdf.libs.pdf_image_tools import build_image_refs
+
+
+def escape_markdown(md_content: str) -> str:
+    return md_content.replace('\\$', '$').replace('\\*', '*').replace('<seg>', r'\<seg\>').replace('<sos>', r'\<sos\>').replace('<eos>', r'\<eos\>').replace('<pad>', r'\<pad\>').replace('<unk>', r'\<unk\>').replace('<sep>', r'\<sep\>').replace('<cls>', r'\<cls\>')
 
 
 class PipeResultLLM:
@@ -43,7 +48,7 @@ class PipeResultLLM:
         md_content = union_make(
             pdf_info_list, md_make_mode, drop_mode, img_dir_or_bucket_prefix
         )
-        return md_content.replace('\\$', '$').replace('\\*', '*').replace('<seg>', r'\<seg\>').replace('<sos>', r'\<sos\>').replace('<eos>', r'\<eos\>').replace('<pad>', r'\<pad\>').replace('<unk>', r'\<unk\>').replace('<sep>', r'\<sep\>').replace('<cls>', r'\<cls\>')
+        return escape_markdown(md_content)
 
     def dump_md(
         self,
@@ -91,6 +96,54 @@ class PipeResultLLM:
         )
         return content_list
 
+    def get_page_markdown(
+        self,
+        page_idx: int,
+        img_dir_or_bucket_prefix: str,
+        drop_mode=DropMode.NONE,
+        md_make_mode=MakeMode.MM_MD,
+    ) -> str:
+        """Get the markdown content of one page.
+
+        Args:
+            page_idx (int): index of the page in the document
+            img_dir_or_bucket_prefix (str): The s3 bucket prefix or local file directory which used to store the figure
+            drop_mode (str, optional): Drop strategy when some page which is corrupted or inappropriate. Defaults to DropMode.NONE.
+            md_make_mode (str, optional): The content Type of Markdown be made. Defaults to MakeMode.MM_MD.
+
+        Returns:
+            str: return markdown content of the page
+        """
+        page_info = self._pipe_res['pdf_info'][page_idx]
+        md_content = union_make(
+            [page_info], md_make_mode, drop_mode, img_dir_or_bucket_prefix
+        )
+        return escape_markdown(md_content)
+
+    def get_page_content_list(
+        self,
+        page_idx: int,
+        image_dir_or_bucket_prefix: str,
+        drop_mode=DropMode.NONE,
+    ) -> list:
+        """Get the content list entries of one page.
+
+        Args:
+            page_idx (int): index of the page in the document
+            image_dir_or_bucket_prefix (str): The s3 bucket prefix or local file directory which used to store the figure
+            drop_mode (str, optional): Drop strategy when some page which is corrupted or inappropriate. Defaults to DropMode.NONE.
+
+        Returns:
+            list: content list entries of the page
+        """
+        page_info = self._pipe_res['pdf_info'][page_idx]
+        return union_make(
+            [page_info],
+            MakeMode.STANDARD_FORMAT,
+            drop_mode,
+            image_dir_or_bucket_prefix,
+        )
+
     def dump_content_list(
         self,
         writer: DataWriter,
@@ -121,6 +174,15 @@ class PipeResultLLM:
         """
         return json.dumps(self._pipe_res, ensure_ascii=False, indent=4)
 
+    def get_image_paths(self) -> list:
+        """Get the image files the results reference.
+
+        Returns:
+            list: paths of the images, relative to the image writer of the pipeline
+        """
+        pdf_info_list = self._pipe_res['pdf_info']
+        return sorted(build_image_refs({page_idx: page_info for page_idx, page_info in enumerate(pdf_info_list)}))
+
     def dump_middle_json(self, writer: DataWriter, file_path: str):
         """Dump the result of pipeline.
 
@@ -131,43 +193,61 @@ class PipeResultLLM:
         middle_json = self.get_middle_json()
         writer.write_string(file_path, middle_json)
 
-    def draw_layout(self, file_path: str) -> None:
+    def draw_layout(self, file_path: str, writer: DataWriter = None) -> None:
         """Draw the layout.
 
         Args:
-            file_path (str): The file location of layout result file
+            file_path (str): The file location of layout result file,
+                relative to the writer when one is given
+            writer (DataWriter, optional): write the pdf through this writer
+                instead of saving it to the local file system. Defaults to None.
         """
+        pdf_info = self._pipe_res['pdf_info']
+        if writer is not None:
+            draw_layout_bbox(pdf_info, self._dataset.data_bits(), writer, file_path)
+            return
         dir_name = os.path.dirname(file_path)
         base_name = os.path.basename(file_path)
         if not os.path.exists(dir_name):
             os.makedirs(dir_name, exist_ok=True)
-        pdf_info = self._pipe_res['pdf_info']
         draw_layout_bbox(pdf_info, self._dataset.data_bits(), dir_name, base_name)
 
-    def draw_span(self, file_path: str):
+    def draw_span(self, file_path: str, writer: DataWriter = None):
         """Draw the Span.
 
         Args:
-            file_path (str): The file location of span result file
+            file_path (str): The file location of span result file,
+                relative to the writer when one is given
+            writer (DataWriter, optional): write the pdf through this writer
+                instead of saving it to the local file system. Defaults to None.
         """
+        pdf_info = self._pipe_res['pdf_info']
+        if writer is not None:
+            draw_span_bbox(pdf_info, self._dataset.data_bits(), writer, file_path)
+            return
         dir_name = os.path.dirname(file_path)
         base_name = os.path.basename(file_path)
         if not os.path.exists(dir_name):
             os.makedirs(dir_name, exist_ok=True)
-        pdf_info = self._pipe_res['pdf_info']
         draw_span_bbox(pdf_info, self._dataset.data_bits(), dir_name, base_name)
 
-    def draw_line_sort(self, file_path: str):
+    def draw_line_sort(self, file_path: str, writer: DataWriter = None):
         """Draw line sort.
 
         Args:
-            file_path (str): The file location of line sort result file
+            file_path (str): The file location of line sort result file,
+                relative to the writer when one is given
+            writer (DataWriter, optional): write the pdf through this writer
+                instead of saving it to the local file system. Defaults to None.
         """
+        pdf_info = self._pipe_res['pdf_info']
+        if writer is not None:
+            draw_line_sort_bbox(pdf_info, self._dataset.data_bits(), writer, file_path)
+            return
         dir_name = os.path.dirname(file_path)
         base_name = os.path.basename(file_path)
         if not os.path.exists(dir_name):
             os.makedirs(dir_name, exist_ok=True)
-        pdf_info = self._pipe_res['pdf_info']
         draw_line_sort_bbox(pdf_info, self._dataset.data_bits(), dir_name, base_name)
 
     def get_compress_pdf_mid_data(self):
@@ -1,8 +1,14 @@
+import atexit
 import copy
 import math
+import multiprocessing
+import pickle
 import re
 import statistics
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from typing import List
 
 import fitz
@@ -11,12 +17,16 @@ from loguru import logger
 
 from magic_pdf.config.enums import SupportedPdfParseMethod
 from magic_pdf.config.ocr_content_type import BlockType, ContentType
+from magic_pdf.data.data_reader_writer import BufferedDataWriter
 from magic_pdf.data.dataset import Dataset, PageableData
+from magic_pdf.data.utils import fitz_lock
 from magic_pdf.libs.boxbase import calculate_overlap_area_in_bbox1_area_ratio, __is_overlaps_y_exceeds_threshold
 from magic_pdf.libs.clean_memory import clean_memory
 from magic_pdf.libs.convert_utils import dict_to_list
 from magic_pdf.libs.hash_utils import compute_md5
-from magic_pdf.libs.pdf_image_tools import cut_image_to_pil_image
+from magic_pdf.libs.metrics import stage_timer
+from magic_pdf.libs.pdf_image_tools import AsyncImageWriter, CUT_IMAGE_SCALE, build_image_refs, \
+    cut_image_to_pil_image
 from magic_pdf.model.magic_model import MagicModel
 
 
@@ -29,6 +39,10 @@ from magic_pdf.pre_proc.ocr_dict_merge import fill_spans_in_blocks, fix_block_sp
 from magic_pdf.pre_proc.ocr_span_list_modify import get_qa_need_list_v2, remove_overlaps_low_confidence_spans, \
     remove_overlaps_min_spans, check_chars_is_overlap_in_span
 
+# LayoutLMv3 reading order is run on at most this many boxes at once, denser pages are split into windows
+LAYOUTREADER_MAX_BOXES = 200
+LAYOUTREADER_WINDOW_BATCH_SIZE = 8
+
 
 def __replace_STX_ETX(text_str: str):
     """Replace \u0002 and \u0003, as these characters become garbled when extracted using pymupdf. In fact, they were originally quotation marks.
@@ -184,7 +198,8 @@ def txt_spans_extract_v2(pdf_page, spans, all_bboxes, all_discarded_blocks, lang
     #text_blocks_raw = pdf_page.get_text('rawdict', flags=fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP)['blocks']
 
 
-    text_blocks_raw = pdf_page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+    with fitz_lock:
+        text_blocks_raw = pdf_page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
     # text_blocks = pdf_page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
 
 
@@ -234,7 +249,8 @@ def txt_spans_extract_v2(pdf_page, spans, all_bboxes, all_discarded_blocks, lang
                 break
 
     if len(vertical_spans) > 0:
-        text_blocks = pdf_page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+        with fitz_lock:
+            text_blocks = pdf_page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
         all_pymu_lines = []
         for block in text_blocks:
             for line in block['lines']:
@@ -298,12 +314,54 @@ def do_predict(boxes: List[List[int]], model) -> List[int]:
     return parse_logits(logits, len(boxes))
 
 
+def do_predict_batch(boxes_list: List[List[List[int]]], model) -> List[List[int]]:
+    from magic_pdf.model.sub_modules.reading_oreder.layoutreader.helpers import (
+        batch_boxes2inputs, parse_logits, prepare_inputs)
+
+    inputs = batch_boxes2inputs(boxes_list)
+    inputs = prepare_inputs(inputs, model)
+    logits = model(**inputs).logits.cpu()
+    return [parse_logits(logits[i], len(boxes)) for i, boxes in enumerate(boxes_list)]
+
+
+def predict_orders(boxes_list: List[List[List[int]]], MonkeyOCR_model) -> List[List[int]]:
+    """Reading orders for several quantized box lists.
+
+    Orders found in the layoutreader cache are reused, the remaining box
+    lists are predicted in batches of LAYOUTREADER_WINDOW_BATCH_SIZE.
+    """
+    cache = getattr(MonkeyOCR_model, 'layoutreader_cache', None)
+    if cache is not None:
+        orders = [cache.get(boxes) for boxes in boxes_list]
+    else:
+        orders = [None] * len(boxes_list)
+
+    missing = [i for i, order in enumerate(orders) if order is None]
+    model = MonkeyOCR_model.layoutreader_model
+    with torch.no_grad():
+        for start in range(0, len(missing), LAYOUTREADER_WINDOW_BATCH_SIZE):
+            batch = missing[start:start + LAYOUTREADER_WINDOW_BATCH_SIZE]
+            if len(batch) == 1:
+                predictions = [do_predict(boxes_list[batch[0]], model)]
+            else:
+                predictions = do_predict_batch([boxes_list[i] for i in batch], model)
+            for i, prediction in zip(batch, predictions):
+                orders[i] = prediction
+                if cache is not None:
+                    cache.put(boxes_list[i], prediction)
+    return orders
+
+
 def cal_block_index(fix_blocks, sorted_bboxes):
 
     if sorted_bboxes is not None:
 
+        # first occurrence wins for duplicated bboxes, same as list.index
+        bbox_to_index = {}
+        for index, bbox in enumerate(sorted_bboxes):
+            bbox_to_index.setdefault(tuple(bbox), index)
         for block in fix_blocks:
-            block['index'] = sorted_bboxes.index(block['bbox'])
+            block['index'] = bbox_to_index[tuple(block['bbox'])]
     else:
 
         block_bboxes = []
@@ -313,7 +371,7 @@ def cal_block_index(fix_blocks, sorted_bboxes):
             block_bboxes.append(block['bbox'])
 
 
-            if block['type'] in [BlockType.ImageBody, BlockType.TableBody]:
+            if block['type'] in [BlockType.ImageBody, BlockType.TableBody] and 'real_lines' in block:
                 block['virtual_lines'] = copy.deepcopy(block['lines'])
                 block['lines'] = copy.deepcopy(block['real_lines'])
                 del block['real_lines']
@@ -323,15 +381,12 @@ def cal_block_index(fix_blocks, sorted_bboxes):
         from magic_pdf.model.sub_modules.reading_oreder.layoutreader.xycut import \
             recursive_xy_cut
 
-        random_boxes = np.array(block_bboxes)
-        np.random.shuffle(random_boxes)
         res = []
-        recursive_xy_cut(np.asarray(random_boxes).astype(int), np.arange(len(block_bboxes)), res)
+        recursive_xy_cut(np.asarray(block_bboxes).astype(int), np.arange(len(block_bboxes)), res)
         assert len(res) == len(block_bboxes)
-        sorted_boxes = random_boxes[np.array(res)].tolist()
 
-        for i, block in enumerate(fix_blocks):
-            block['index'] = sorted_boxes.index(block['bbox'])
+        for index, block_idx in enumerate(res):
+            fix_blocks[block_idx]['index'] = index
 
 
         sorted_blocks = sorted(fix_blocks, key=lambda b: b['index'])
@@ -399,10 +454,44 @@ def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, MonkeyOCR_model
     for block in fix_blocks:
         page_line_list.append(block['bbox'])
 
-    if len(page_line_list) > 200:
-        return None
+    return sort_pages_by_model([(page_line_list, page_w, page_h)], MonkeyOCR_model)[0]
 
 
+def sort_pages_by_model(pages, MonkeyOCR_model):
+    """Reading order of several pages with one batched layoutreader call.
+
+    Args:
+        pages (list): (page_line_list, page_w, page_h) for every page
+        MonkeyOCR_model: model holder with `layoutreader_model`
+
+    Returns:
+        list: the sorted bboxes of every page, None for all pages if there is
+        no reading order model (cal_block_index then falls back to XY-cut)
+    """
+    if getattr(MonkeyOCR_model, 'layoutreader_model', None) is None:
+        return [None] * len(pages)
+
+    page_windows = [
+        split_layoutreader_windows(page_line_list, page_w, page_h)
+        for page_line_list, page_w, page_h in pages
+    ]
+    with stage_timer('reading_order'):
+        orders = predict_orders(
+            [boxes for windows in page_windows for _, boxes in windows], MonkeyOCR_model
+        )
+
+    pages_sorted_bboxes = []
+    offset = 0
+    for (page_line_list, _, _), windows in zip(pages, page_windows):
+        sorted_bboxes = []
+        for window, window_orders in zip(windows, orders[offset:offset + len(windows)]):
+            sorted_bboxes.extend(page_line_list[window[i]] for i in window_orders)
+        offset += len(windows)
+        pages_sorted_bboxes.append(sorted_bboxes)
+    return pages_sorted_bboxes
+
+
+def boxes_to_layoutreader_space(page_line_list, page_w, page_h):
     x_scale = 1000.0 / page_w
     y_scale = 1000.0 / page_h
     boxes = []
@@ -437,12 +526,42 @@ def sort_lines_by_model(fix_blocks, page_w, page_h, line_height, MonkeyOCR_model
             1000 >= right >= left >= 0 and 1000 >= bottom >= top >= 0
         ), f'Invalid box. right: {right}, left: {left}, bottom: {bottom}, top: {top}'  # noqa: E126, E121
         boxes.append([left, top, right, bottom])
-    model = MonkeyOCR_model.layoutreader_model
-    with torch.no_grad():
-        orders = do_predict(boxes, model)
-    sorted_bboxes = [page_line_list[i] for i in orders]
+    return boxes
+
+
+def split_layoutreader_windows(page_line_list, page_w, page_h):
+    """Split the page boxes into layoutreader inputs.
+
+    Pages with more boxes than LayoutLMv3 accepts are split into XY-cut
+    windows of at most LAYOUTREADER_MAX_BOXES boxes, every window uses its
+    own extent as the 0-1000 coordinate space and the windows are kept in
+    XY-cut order.
+
+    Returns:
+        list: (indexes into page_line_list, quantized boxes) for every window
+    """
+    if len(page_line_list) <= LAYOUTREADER_MAX_BOXES:
+        return [(list(range(len(page_line_list))), boxes_to_layoutreader_space(page_line_list, page_w, page_h))]
 
-    return sorted_bboxes
+    import numpy as np
+
+    from magic_pdf.model.sub_modules.reading_oreder.layoutreader.xycut import \
+        split_into_windows
+
+    line_bboxes = np.array(page_line_list, dtype=float)
+    line_bboxes[:, 2] = np.maximum(line_bboxes[:, 0], line_bboxes[:, 2])
+    line_bboxes[:, 3] = np.maximum(line_bboxes[:, 1], line_bboxes[:, 3])
+    int_bboxes = np.clip(line_bboxes, 0, None).astype(int)
+
+    windows = []
+    for window in split_into_windows(int_bboxes, LAYOUTREADER_MAX_BOXES):
+        boxes = line_bboxes[window]
+        x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+        boxes = boxes - [x0, y0, x0, y0]
+        window_w = max(boxes[:, 2].max(), 1)
+        window_h = max(boxes[:, 3].max(), 1)
+        windows.append((window.tolist(), boxes_to_layoutreader_space(boxes.tolist(), window_w, window_h)))
+    return windows
 
 
 def get_line_height(blocks):
@@ -561,14 +680,60 @@ def remove_outside_spans(spans, all_bboxes, all_discarded_blocks):
     return new_spans
 
 
+def get_page_model_result(magic_model, page_id):
+    """Collect everything parse_page_core needs from MagicModel for one page.
+
+    The result only holds plain lists and dicts, so it can be handed to a
+    worker process.
+    """
+    inline_equations, interline_equations, interline_equation_blocks = magic_model.get_equations(page_id)
+    return {
+        'img_groups': magic_model.get_imgs_v2(page_id),
+        'table_groups': magic_model.get_tables_v2(page_id),
+        'discarded_blocks': magic_model.get_discarded(page_id),
+        'text_blocks': magic_model.get_text_blocks(page_id),
+        'title_blocks': magic_model.get_title_blocks(page_id),
+        'inline_equations': inline_equations,
+        'interline_equations': interline_equations,
+        'interline_equation_blocks': interline_equation_blocks,
+        'page_size': magic_model.get_page_size(page_id),
+        'spans': magic_model.get_all_spans(page_id),
+    }
+
+
 def parse_page_core(
-    page_doc: PageableData, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model
+    page_doc: PageableData, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model,
+    scale=CUT_IMAGE_SCALE,
 ):
+    page_info, page_state = prepare_page_core(
+        page_doc, get_page_model_result(magic_model, page_id), page_id, pdf_bytes_md5, imageWriter, parse_mode, lang,
+        scale,
+    )
+    if page_info is not None:
+        return page_info
+
+    sorted_bboxes = sort_lines_by_model(
+        page_state['fix_blocks'], page_state['page_w'], page_state['page_h'], page_state['line_height'],
+        MonkeyOCR_model
+    )
+    return finish_page_core(page_state, sorted_bboxes)
+
+
+def prepare_page_core(
+    page_doc: PageableData, page_model_result, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang,
+    scale=CUT_IMAGE_SCALE,
+):
+    """Everything of parse_page_core before the reading order model.
+
+    Returns:
+        tuple: (page_info, None) if the page is finished already, otherwise
+        (None, page_state) where page_state is the input of finish_page_core
+    """
     need_drop = False
     drop_reason = []
 
-    img_groups = magic_model.get_imgs_v2(page_id)
-    table_groups = magic_model.get_tables_v2(page_id)
+    img_groups = page_model_result['img_groups']
+    table_groups = page_model_result['table_groups']
 
     img_body_blocks, img_caption_blocks, img_footnote_blocks = process_groups(
         img_groups, 'image_body', 'image_caption_list', 'image_footnote_list'
@@ -578,11 +743,13 @@ def parse_page_core(
         table_groups, 'table_body', 'table_caption_list', 'table_footnote_list'
     )
 
-    discarded_blocks = magic_model.get_discarded(page_id)
-    text_blocks = magic_model.get_text_blocks(page_id)
-    title_blocks = magic_model.get_title_blocks(page_id)
-    inline_equations, interline_equations, interline_equation_blocks = magic_model.get_equations(page_id)
-    page_w, page_h = magic_model.get_page_size(page_id)
+    discarded_blocks = page_model_result['discarded_blocks']
+    text_blocks = page_model_result['text_blocks']
+    title_blocks = page_model_result['title_blocks']
+    inline_equations = page_model_result['inline_equations']
+    interline_equations = page_model_result['interline_equations']
+    interline_equation_blocks = page_model_result['interline_equation_blocks']
+    page_w, page_h = page_model_result['page_size']
 
     def merge_title_blocks(blocks, x_distance_threshold=0.1*page_w):
         def merge_two_bbox(b1, b2):
@@ -677,7 +844,7 @@ def parse_page_core(
             page_h,
         )
 
-    spans = magic_model.get_all_spans(page_id)
+    spans = page_model_result['spans']
 
     spans = remove_outside_spans(spans, all_bboxes, all_discarded_blocks)
 
@@ -700,7 +867,7 @@ def parse_page_core(
 
     if len(all_bboxes) == 0:
         logger.warning(f'skip this page, not found useful bbox, page_id: {page_id}')
-        return ocr_construct_page_component_v2(
+        page_info = ocr_construct_page_component_v2(
             [],
             [],
             page_id,
@@ -714,9 +881,10 @@ def parse_page_core(
             need_drop,
             drop_reason,
         )
+        return page_info, None
 
     spans = ocr_cut_image_and_table(
-        spans, page_doc, page_id, pdf_bytes_md5, imageWriter
+        spans, page_doc, page_id, pdf_bytes_md5, imageWriter, scale
     )
 
     block_with_spans, spans = fill_spans_in_blocks(all_bboxes, spans, 0.5)
@@ -727,9 +895,28 @@ def parse_page_core(
 
     line_height = get_line_height(fix_blocks)
 
-    sorted_bboxes = sort_lines_by_model(fix_blocks, page_w, page_h, line_height, MonkeyOCR_model)
+    return None, {
+        'page_id': page_id,
+        'page_w': page_w,
+        'page_h': page_h,
+        'line_height': line_height,
+        'fix_blocks': fix_blocks,
+        'fix_discarded_blocks': fix_discarded_blocks,
+        'need_drop': need_drop,
+        'drop_reason': drop_reason,
+    }
 
-    fix_blocks = cal_block_index(fix_blocks, sorted_bboxes)
+
+def finish_page_core(page_state, sorted_bboxes):
+    """Everything of parse_page_core after the reading order model."""
+    page_id = page_state['page_id']
+    page_w = page_state['page_w']
+    page_h = page_state['page_h']
+    fix_discarded_blocks = page_state['fix_discarded_blocks']
+    need_drop = page_state['need_drop']
+    drop_reason = page_state['drop_reason']
+
+    fix_blocks = cal_block_index(page_state['fix_blocks'], sorted_bboxes)
 
     fix_blocks = revert_group_blocks(fix_blocks)
 
@@ -758,6 +945,195 @@ def parse_page_core(
     return page_info
 
 
+def close_image_writer(imageWriter):
+    """Wait for the crops still being written, errors of the writes are raised."""
+    if isinstance(imageWriter, AsyncImageWriter):
+        imageWriter.close()
+    elif isinstance(imageWriter, BufferedDataWriter):
+        imageWriter.flush()
+
+
+@contextmanager
+def close_image_writer_on_error(imageWriter):
+    """Close the writer if the body fails, the error of the body is raised
+    and a failing close is only logged."""
+    try:
+        yield
+    except BaseException:
+        try:
+            close_image_writer(imageWriter)
+        except Exception as e:
+            logger.warning(f'closing the image writer after a failed parse also failed: {e}')
+        raise
+
+
+_postprocess_pool = None
+_postprocess_pool_workers = 0
+_postprocess_pool_lock = threading.Lock()
+
+
+def get_postprocess_pool(num_workers):
+    """Process pool for prepare_page_core, shared by all documents.
+
+    The pool uses the spawn start method so the workers never inherit the
+    torch / CUDA state of the main process.
+    """
+    global _postprocess_pool, _postprocess_pool_workers
+    with _postprocess_pool_lock:
+        if _postprocess_pool is None or _postprocess_pool_workers != num_workers:
+            if _postprocess_pool is not None:
+                _postprocess_pool.shutdown(wait=True)
+            _postprocess_pool = ProcessPoolExecutor(
+                max_workers=num_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+            _postprocess_pool_workers = num_workers
+            logger.info(f'post-processing pool started with {num_workers} workers')
+        return _postprocess_pool
+
+
+@atexit.register
+def _shutdown_postprocess_pool():
+    global _postprocess_pool
+    if _postprocess_pool is not None:
+        _postprocess_pool.shutdown(wait=False, cancel_futures=True)
+        _postprocess_pool = None
+
+
+def prepare_pages_worker(dataset, page_jobs, pdf_bytes_md5, imageWriter, parse_mode, lang, scale=CUT_IMAGE_SCALE):
+    """Run prepare_page_core for a chunk of pages inside a pool worker.
+
+    The dataset arrives rebuilt from its raw input with its own class, so
+    images and multi-file inputs get the same pages as in the caller.
+    """
+    results = []
+    with close_image_writer_on_error(imageWriter):
+        for page_id, page_model_result in page_jobs:
+            page_info, page_state = prepare_page_core(
+                dataset.get_page(page_id), page_model_result, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang,
+                scale,
+            )
+            results.append((page_id, page_info, page_state))
+    close_image_writer(imageWriter)
+    return results
+
+
+def parse_pages_parallel(
+    dataset: Dataset, magic_model, page_ids, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model,
+    num_workers, page_done=None, scale=CUT_IMAGE_SCALE,
+):
+    """parse_page_core for many pages, the geometry runs in a process pool.
+
+    prepare_page_core runs in the pool on contiguous chunks of pages, the
+    reading order of all pages is predicted with one batched layoutreader
+    call in this process, then finish_page_core builds the page infos.
+
+    Returns:
+        dict: page_id -> page_info
+    """
+    chunk_count = min(len(page_ids), num_workers * 2)
+    chunk_size = math.ceil(len(page_ids) / chunk_count)
+
+    pool = get_postprocess_pool(num_workers)
+    futures = []
+    for i in range(0, len(page_ids), chunk_size):
+        page_jobs = [
+            (page_id, get_page_model_result(magic_model, page_id))
+            for page_id in page_ids[i:i + chunk_size]
+        ]
+        futures.append(pool.submit(
+            prepare_pages_worker, dataset, page_jobs, pdf_bytes_md5, imageWriter, parse_mode, lang, scale
+        ))
+
+    page_infos = {}
+    page_states = []
+    for future in futures:
+        for page_id, page_info, page_state in future.result():
+            if page_info is not None:
+                page_infos[page_id] = page_info
+                if page_done is not None:
+                    page_done()
+            else:
+                page_states.append(page_state)
+
+    pages_sorted_bboxes = sort_pages_by_model(
+        [
+            ([block['bbox'] for block in page_state['fix_blocks']], page_state['page_w'], page_state['page_h'])
+            for page_state in page_states
+        ],
+        MonkeyOCR_model,
+    )
+    for page_state, sorted_bboxes in zip(page_states, pages_sorted_bboxes):
+        page_infos[page_state['page_id']] = finish_page_core(page_state, sorted_bboxes)
+        if page_done is not None:
+            page_done()
+
+    return page_infos
+
+
+def get_postprocess_workers(MonkeyOCR_model, imageWriter, page_count):
+    """Number of pool workers for this document, 0 means serial."""
+    postprocess_config = getattr(MonkeyOCR_model, 'postprocess_config', None) or {}
+    num_workers = postprocess_config.get('num_workers', 0) or 0
+    if num_workers <= 1 or page_count <= 1:
+        return 0
+    try:
+        pickle.dumps(imageWriter)
+    except Exception as e:
+        logger.warning(f'image writer can not be sent to the post-processing pool, run serially: {e}')
+        return 0
+    return min(num_workers, page_count)
+
+
+def parse_pages(
+    dataset: Dataset, magic_model, pdf_bytes_md5, imageWriter, parse_mode, MonkeyOCR_model,
+    start_page_id, end_page_id, debug_mode, lang, page_done=None, scale=CUT_IMAGE_SCALE,
+):
+    pdf_info_dict = {}
+
+    start_time = time.time()
+
+    parse_page_ids = list(range(max(start_page_id, 0), end_page_id + 1))
+    num_workers = get_postprocess_workers(MonkeyOCR_model, imageWriter, len(parse_page_ids))
+    if num_workers:
+        parallel_page_infos = parse_pages_parallel(
+            dataset, magic_model, parse_page_ids, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model,
+            num_workers, page_done, scale,
+        )
+        if debug_mode:
+            logger.info(
+                f'pages: {len(parse_page_ids)}, workers: {num_workers}, cost_time: {round(time.time() - start_time, 2)}'
+            )
+    else:
+        parallel_page_infos = {}
+
+    for page_id, page in enumerate(dataset):
+        if debug_mode and not num_workers:
+            time_now = time.time()
+            logger.info(
+                f'page_id: {page_id}, last_page_cost_time: {round(time.time() - start_time, 2)}'
+            )
+            start_time = time_now
+
+        if page_id in parallel_page_infos:
+            page_info = parallel_page_infos[page_id]
+        elif start_page_id <= page_id <= end_page_id:
+            page_info = parse_page_core(
+                page, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model, scale
+            )
+        else:
+            page_info = page.get_page_info()
+            page_w = page_info.w
+            page_h = page_info.h
+            page_info = ocr_construct_page_component_v2(
+                [], [], page_id, page_w, page_h, [], [], [], [], [], True, 'skip page'
+            )
+        pdf_info_dict[f'page_{page_id}'] = page_info
+        if page_done is not None and page_id not in parallel_page_infos:
+            page_done()
+
+    return pdf_info_dict
+
+
 def pdf_parse_union(
     model_list,
     dataset: Dataset,
@@ -768,12 +1144,11 @@ def pdf_parse_union(
     end_page_id=None,
     debug_mode=False,
     lang=None,
+    page_done=None,
 ):
 
     pdf_bytes_md5 = compute_md5(dataset.data_bits())
 
-    pdf_info_dict = {}
-
     magic_model = MagicModel(model_list, dataset)
 
     # end_page_id = end_page_id if end_page_id else len(pdf_docs) - 1
@@ -787,35 +1162,50 @@ def pdf_parse_union(
         logger.warning('end_page_id is out of range, use pdf_docs length')
         end_page_id = len(dataset) - 1
 
-    start_time = time.time()
+    image_config = getattr(MonkeyOCR_model, 'image_config', None) or {}
+    image_dedup = bool(image_config.get('dedup', False))
+    write_workers = image_config.get('write_workers', 0) or 0
+    if imageWriter and (write_workers > 0 or image_dedup):
+        if write_workers > 0 and isinstance(imageWriter, BufferedDataWriter):
+            # the background writers write concurrently already, a buffer below them only adds a copy
+            imageWriter.flush()
+            imageWriter = imageWriter.writer
+        # crops are encoded and written in the background, flushed before the layout is returned
+        imageWriter = AsyncImageWriter(
+            imageWriter,
+            max_workers=write_workers,
+            max_pending=image_config.get('max_pending', 32),
+            dedup=image_dedup,
+        )
 
-    for page_id, page in enumerate(dataset):
-        if debug_mode:
-            time_now = time.time()
-            logger.info(
-                f'page_id: {page_id}, last_page_cost_time: {round(time.time() - start_time, 2)}'
+    with close_image_writer_on_error(imageWriter):
+        with stage_timer('post_process'):
+            pdf_info_dict = parse_pages(
+                dataset, magic_model, pdf_bytes_md5, imageWriter, parse_mode, MonkeyOCR_model,
+                start_page_id, end_page_id, debug_mode, lang, page_done,
+                image_config.get('scale', CUT_IMAGE_SCALE),
             )
-            start_time = time_now
+    with stage_timer('write'):
+        close_image_writer(imageWriter)
 
-        if start_page_id <= page_id <= end_page_id:
-            page_info = parse_page_core(
-                page, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode, lang, MonkeyOCR_model
-            )
-        else:
-            page_info = page.get_page_info()
-            page_w = page_info.w
-            page_h = page_info.h
-            page_info = ocr_construct_page_component_v2(
-                [], [], page_id, page_w, page_h, [], [], [], [], [], True, 'skip page'
-            )
-        pdf_info_dict[f'page_{page_id}'] = page_info
+    if image_dedup and isinstance(imageWriter, AsyncImageWriter):
+        image_refs = build_image_refs(pdf_info_dict)
+        logger.info(
+            f'image dedup: {sum(len(refs) for refs in image_refs.values())} image spans, {len(image_refs)} unique images'
+        )
 
     para_split(pdf_info_dict)
 
+    layoutreader_cache = getattr(MonkeyOCR_model, 'layoutreader_cache', None)
+    if layoutreader_cache is not None:
+        logger.info(f'layoutreader cache: {layoutreader_cache.stats()}')
+
     pdf_info_list = dict_to_list(pdf_info_dict)
     new_pdf_info_dict = {
         'pdf_info': pdf_info_list,
     }
+    if image_dedup and isinstance(imageWriter, AsyncImageWriter):
+        new_pdf_info_dict['image_refs'] = image_refs
 
     clean_memory(MonkeyOCR_model.device)
 
@@ -2,28 +2,34 @@ from loguru import logger
 
 from magic_pdf.config.ocr_content_type import ContentType
 from magic_pdf.libs.commons import join_path
-from magic_pdf.libs.pdf_image_tools import cut_image
+from magic_pdf.libs.pdf_image_tools import CUT_IMAGE_SCALE, PageRaster, cut_image
 
 
-def ocr_cut_image_and_table(spans, page, page_id, pdf_bytes_md5, imageWriter):
+def ocr_cut_image_and_table(spans, page, page_id, pdf_bytes_md5, imageWriter, scale=CUT_IMAGE_SCALE):
     def return_path(type):
         return join_path(pdf_bytes_md5, type)
     
     if not imageWriter: 
         return spans
 
+    # the area holding the crops is rendered once and shared by them, when
+    # several crops lie close together on this page
+    page_raster = PageRaster.for_crops(
+        page, [span['bbox'] for span in spans if span['type'] in [ContentType.Image, ContentType.Table]], scale
+    )
+
     for span in spans:
         span_type = span['type']
         if span_type == ContentType.Image:
             if not check_img_bbox(span['bbox']):
                 continue
             span['image_path'] = cut_image(span['bbox'], page_id, page, return_path=return_path('images'),
-                                           imageWriter=imageWriter)
+                                           imageWriter=imageWriter, scale=scale, page_raster=page_raster)
         elif span_type == ContentType.Table:
             if not check_img_bbox(span['bbox']):
                 continue
             span['image_path'] = cut_image(span['bbox'], page_id, page, return_path=return_path('tables'),
-                                           imageWriter=imageWriter)
+                                           imageWriter=imageWriter, scale=scale, page_raster=page_raster)
 
     return spans
 
@@ -3,13 +3,24 @@ import time
 import argparse
 import sys
 import traceback
+import json
+import shutil
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 import torch.distributed as dist
+import yaml
 
 from magic_pdf.utils.load_image import pdf_to_images
-from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
+from magic_pdf.data.data_reader_writer import BufferedDataWriter, FileBasedDataWriter, FileBasedDataReader
 from magic_pdf.data.dataset import PymuDocDataset, ImageDataset, MultiFileDataset
+from magic_pdf.data.utils import fitz_lock
 from magic_pdf.model.doc_analyze_by_custom_model_llm import doc_analyze_llm
 from magic_pdf.model.custom_model import MonkeyOCR
+from magic_pdf.libs import profiling, tracing
+from magic_pdf.libs.run_manifest import RunManifest, commit_result_dir
 
 TASK_INSTRUCTIONS = {
     'text': 'Please output the text content from the image.',
@@ -17,7 +28,11 @@ TASK_INSTRUCTIONS = {
     'table': 'This is the image of a table. Please output the table in html format.'
 }
 
-def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=False, group_size=None, pred_abandon=False):
+# Pages parse_files_pipelined renders ahead at most, about 12 MB each at 200 dpi
+PREFETCH_PAGES = 64
+
+def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=False, group_size=None, pred_abandon=False, trace=False, otlp_endpoint=None,
+                 profile=False, workers=1, resume=False):
     """
     Parse all PDF and image files in a folder
     
@@ -26,7 +41,17 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
         output_dir: Output directory
         config_path: Configuration file path
         task: Optional task type for single task recognition
-        group_size: Number of files to group together by total page count (None means process individually)
+        group_size: Maximum total page count per group, files are packed by estimated cost (None means process individually)
+        trace: Write a trace of every file parsed individually next to its results
+        otlp_endpoint: Also send the traces to this OTLP/HTTP collector
+        profile: Write a profile of every file parsed individually next to its results
+        workers: Post-processing threads of the file pipeline, more than 1 reads and renders the next
+            files and saves the finished ones while the current file is analyzed (1 means one file at a time)
+        resume: Skip the files completed by earlier runs into the same output directory, see RunManifest
+    
+    Every file is recorded in <output_dir>/.manifest.jsonl once its results are
+    complete, results are written below <output_dir>/.partial and moved in place
+    when done, so a run stopped at any point leaves no partial results.
     """
     print(f"Starting to parse folder: {folder_path}")
     
@@ -53,6 +78,33 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
     
     all_files.sort()
     
+    # Results of stopped runs are incomplete, only the manifest tells what is done
+    shutil.rmtree(os.path.join(output_dir, ".partial"), ignore_errors=True)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        configs = yaml.load(f, Loader=yaml.FullLoader)
+    manifest = RunManifest(os.path.join(output_dir, ".manifest.jsonl"), configs, task=task, split_pages=split_pages,
+                           pred_abandon=pred_abandon)
+    base_folder_path = folder_path if group_size and group_size > 1 else None
+    
+    skipped_files = []
+    pending_files = all_files
+    if resume:
+        pending_files = []
+        for file_path in all_files:
+            if manifest.is_complete(file_path, _result_dir(file_path, output_dir, base_folder_path)):
+                skipped_files.append(file_path)
+            else:
+                pending_files.append(file_path)
+        print(f"Skipping {len(skipped_files)} files completed by an earlier run")
+    
+    if group_size and group_size > 1:
+        # Group files by total page count, scanned in worker processes before the model is loaded
+        print(f"Found {len(pending_files)} files to process in groups with max {group_size} total pages")
+        
+        file_groups = create_file_groups_by_page_count(pending_files, group_size,
+                                                       cache_path=os.path.join(output_dir, ".file_costs.json"))
+        print(f"Created {len(file_groups)} file groups")
+    
     # Initialize model once for all files
     print("Loading model...")
     MonkeyOCR_model = MonkeyOCR(config_path)
@@ -61,12 +113,6 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
     failed_files = []
     
     if group_size and group_size > 1:
-        # Group files by total page count
-        print(f"Found {len(all_files)} files to process in groups with max {group_size} total pages")
-        
-        file_groups = create_file_groups_by_page_count(all_files, group_size)
-        print(f"Created {len(file_groups)} file groups")
-        
         for i, file_group in enumerate(file_groups, 1):
             print(f"\n{'='*60}")
             print(f"Processing file group {i}/{len(file_groups)} (contains {len(file_group)} files)")
@@ -74,41 +120,58 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
                 print(f"  - {os.path.basename(file_path)}")
             print(f"{'='*60}")
             
+            staging_dir = _staging_dir(output_dir)
             try:
                 if task:
-                    result_dir = single_task_recognition_multi_file_group(file_group, output_dir, MonkeyOCR_model, task, folder_path)
+                    single_task_recognition_multi_file_group(file_group, staging_dir, MonkeyOCR_model, task, folder_path)
                 else:
-                    result_dir = parse_multi_file_group(file_group, output_dir, MonkeyOCR_model, folder_path, split_pages, pred_abandon)
+                    parse_multi_file_group(file_group, staging_dir, MonkeyOCR_model, folder_path, split_pages, pred_abandon)
+                _commit_results(file_group, staging_dir, output_dir, manifest, folder_path)
 
                 successful_files.extend(file_group)
                 print(f"✅ Successfully processed file group {i}")
                 
             except Exception as e:
+                shutil.rmtree(staging_dir, ignore_errors=True)
                 failed_files.extend([(path, str(e)) for path in file_group])
                 print(f"❌ Failed to process file group {i}: {str(e)}")
     else:
         # Process files individually
-        print(f"Found {len(all_files)} files to process individually:")
-        for file_path in all_files:
+        print(f"Found {len(pending_files)} files to process individually:")
+        for file_path in pending_files:
             print(f"  - {file_path}")
         
-        for i, file_path in enumerate(all_files, 1):
-            print(f"\n{'='*60}")
-            print(f"Processing file {i}/{len(all_files)}: {os.path.basename(file_path)}")
-            print(f"{'='*60}")
+        if workers > 1 and not task and (trace or otlp_endpoint or profile):
+            print("Tracing and profiling follow one file at a time, --workers is ignored")
+            workers = 1
+        
+        if workers > 1 and not task:
+            successful_files, failed_files = parse_files_pipelined(pending_files, output_dir, MonkeyOCR_model, workers,
+                                                                   split_pages, pred_abandon, manifest)
+        else:
+            for i, file_path in enumerate(pending_files, 1):
+                print(f"\n{'='*60}")
+                print(f"Processing file {i}/{len(pending_files)}: {os.path.basename(file_path)}")
+                print(f"{'='*60}")
             
-            try:
-                if task:
-                    result_dir = single_task_recognition(file_path, output_dir, MonkeyOCR_model, task)
-                else:
-                    result_dir = parse_file(file_path, output_dir, MonkeyOCR_model, pred_abandon=pred_abandon)
+                staging_dir = _staging_dir(output_dir)
+                try:
+                    if task:
+                        single_task_recognition(file_path, staging_dir, MonkeyOCR_model, task)
+                    else:
+                        parse_file(file_path, staging_dir, MonkeyOCR_model, split_pages=split_pages, pred_abandon=pred_abandon,
+                                   trace=trace, otlp_endpoint=otlp_endpoint, profile=profile)
+                    _commit_results([file_path], staging_dir, output_dir, manifest)
                 
-                successful_files.append(file_path)
-                print(f"✅ Successfully processed: {os.path.basename(file_path)}")
+                    successful_files.append(file_path)
+                    print(f"✅ Successfully processed: {os.path.basename(file_path)}")
                 
-            except Exception as e:
-                failed_files.append((file_path, str(e)))
-                print(f"❌ Failed to process {os.path.basename(file_path)}: {str(e)}")
+                except Exception as e:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    failed_files.append((file_path, str(e)))
+                    print(f"❌ Failed to process {os.path.basename(file_path)}: {str(e)}")
+    
+    shutil.rmtree(os.path.join(output_dir, ".partial"), ignore_errors=True)
     
     if not all_files:
         print("No supported files found in the folder.")
@@ -124,6 +187,8 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
     print(f"{'='*60}")
     print(f"Total files: {total_files}")
     print(f"Successful: {len(successful_files)}")
+    if resume:
+        print(f"Skipped (completed earlier): {len(skipped_files)}")
     print(f"Failed: {len(failed_files)}")
     print(f"Total processing time: {total_processing_time:.2f}s")
     
@@ -134,61 +199,287 @@ def parse_folder(folder_path, output_dir, config_path, task=None, split_pages=Fa
     
     return output_dir
 
-def create_file_groups_by_page_count(file_paths, max_pages_per_group):
+def parse_files_pipelined(file_paths, output_dir, MonkeyOCR_model, workers, split_pages=False, pred_abandon=False, manifest=None,
+                          prefetch_pages=PREFETCH_PAGES):
     """
-    Create file groups based on total page count limit
+    Parse files individually in a three-stage pipeline
+    
+    While a file is analyzed on the main thread, the next `workers` files are read
+    and rendered by a prefetch thread, and up to `workers` analyzed files are
+    post-processed and saved by a thread pool. The models stay busy instead of
+    waiting for reading, rendering, drawing and writing.
+    
+    At most `prefetch_pages` rendered pages wait for the models, pages beyond
+    that are rendered when their file is analyzed. PyMuPDF is not thread-safe,
+    the stages take turns on fitz_lock for the PyMuPDF calls themselves
+    (rendering, cutting crops, drawing), the rest runs concurrently.
     
     Args:
-        file_paths: List of file paths
-        max_pages_per_group: Maximum total pages per group
+        file_paths: List of file paths (PDF and images)
+        output_dir: Output directory
+        MonkeyOCR_model: Pre-initialized model instance
+        workers: Post-processing threads, also the number of files read ahead
+        manifest: RunManifest recording the completed files, see _commit_results
+        prefetch_pages: Pages rendered ahead at most
+    
+    Returns:
+        (successful_files, failed_files) like parse_folder
+    """
+    successful_files = []
+    failed_files = []
+    
+    def finish(file_path, job):
+        _finish_file(job, MonkeyOCR_model)
+        _commit_results([file_path], job['output_dir'], output_dir, manifest)
+    
+    def collect(file_path, staging_dir, future):
+        try:
+            future.result()
+            successful_files.append(file_path)
+            print(f"✅ Successfully processed: {os.path.basename(file_path)}")
+        except Exception as e:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            failed_files.append((file_path, str(e)))
+            print(f"❌ Failed to process {os.path.basename(file_path)}: {str(e)}")
+    
+    render_budget = threading.Semaphore(prefetch_pages)
+    
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='parse-prefetch') as prefetch_pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse-finish') as finish_pool:
+        prepared = deque()
+        finishing = deque()
+        next_file = 0
+        
+        for i, file_path in enumerate(file_paths, 1):
+            # Keep the next files reading and rendering while this one is analyzed
+            while next_file < len(file_paths) and len(prepared) <= workers:
+                staging_dir = _staging_dir(output_dir)
+                prepared.append((staging_dir, prefetch_pool.submit(_prepare_file, file_paths[next_file], staging_dir, MonkeyOCR_model,
+                                                                   split_pages, pred_abandon, prerender=render_budget)))
+                next_file += 1
+            
+            print(f"\n{'='*60}")
+            print(f"Processing file {i}/{len(file_paths)}: {os.path.basename(file_path)}")
+            print(f"{'='*60}")
+            
+            staging_dir, future = prepared.popleft()
+            try:
+                job = future.result()
+                try:
+                    if job['ds'] is None:
+                        _commit_results([file_path], staging_dir, output_dir, manifest)
+                    else:
+                        _analyze_file(job, MonkeyOCR_model)
+                finally:
+                    # The models took the rendered pages over, or they are dropped
+                    if job['prerendered']:
+                        render_budget.release(job['prerendered'])
+            except Exception as e:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                failed_files.append((file_path, str(e)))
+                print(f"❌ Failed to process {os.path.basename(file_path)}: {str(e)}")
+                continue
+            
+            if job['ds'] is None:
+                successful_files.append(file_path)
+                print(f"✅ Successfully processed: {os.path.basename(file_path)}")
+                continue
+            
+            finishing.append((file_path, staging_dir, finish_pool.submit(finish, file_path, job)))
+            del job
+            # Bound the analyzed results held in memory
+            while len(finishing) > workers:
+                collect(*finishing.popleft())
         
+        while finishing:
+            collect(*finishing.popleft())
+    
+    return successful_files, failed_files
+
+def _result_dir(file_path, output_dir, base_folder_path=None):
+    """Result directory of a file, below its folder relative to base_folder_path in group mode"""
+    file_name = '.'.join(os.path.basename(file_path).split(".")[:-1])
+    if base_folder_path is None:
+        return os.path.join(output_dir, file_name)
+    rel_path = os.path.relpath(os.path.dirname(file_path), base_folder_path)
+    if rel_path == '.':
+        return os.path.join(output_dir, file_name)
+    return os.path.join(output_dir, rel_path, file_name)
+
+def _staging_dir(output_dir):
+    """Private output directory of a file or group until _commit_results"""
+    return os.path.join(output_dir, ".partial", uuid.uuid4().hex)
+
+def _commit_results(file_paths, staging_dir, output_dir, manifest=None, base_folder_path=None):
+    """
+    Move the results of the files from staging_dir to output_dir, replacing
+    those of earlier runs, and record the files as complete in the manifest.
+    Files without staged results are not recorded.
+    """
+    committed = set()
+    for file_path in file_paths:
+        result_dir = _result_dir(file_path, output_dir, base_folder_path)
+        staged_dir = _result_dir(file_path, staging_dir, base_folder_path)
+        # files of the same name share a result directory, moved with the first of them
+        if os.path.exists(staged_dir):
+            commit_result_dir(staged_dir, result_dir)
+            committed.add(result_dir)
+        elif result_dir not in committed:
+            print(f"Warning: no results of {os.path.basename(file_path)} to commit")
+            continue
+        if manifest is not None:
+            manifest.record(file_path, result_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+# Recognition load of a page in units of a dense text page: layout and reading
+# order for every page, generated tokens after the text length, one crop per image.
+PAGE_BASE_COST = 0.5
+CHARS_PER_COST = 3000
+IMAGE_COST = 0.1
+# Pages without a text layer (scans, image files) are assumed as dense as an
+# A4 page of text per A4 page of area
+SCAN_MIN_CHARS = 50
+A4_AREA_PTS = 595 * 842
+A4_AREA_PX = 1654 * 2339
+
+def estimate_file_cost(file_path):
+    """
+    Page count and estimated recognition cost of a file, from cheap metadata
+    (text length, image count and page area) without rendering anything
+    
     Returns:
-        List of file groups
+        (page_count, cost)
     """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext != '.pdf':
+        from PIL import Image
+        with Image.open(file_path) as img:
+            width, height = img.size
+        return 1, PAGE_BASE_COST + min(width * height / A4_AREA_PX, 2.0)
+    
     import fitz
+    from magic_pdf.filter.pdf_meta_scan import get_imgs_per_page, get_pdf_textlen_per_page
+    
+    with fitz.open(file_path) as doc:
+        text_lens = get_pdf_textlen_per_page(doc)
+        img_counts = get_imgs_per_page(doc)
+        areas = [page.rect.width * page.rect.height for page in doc]
+    cost = 0.0
+    for text_len, img_count, area in zip(text_lens, img_counts, areas):
+        if text_len < SCAN_MIN_CHARS:
+            cost += PAGE_BASE_COST + min(area / A4_AREA_PTS, 2.0)
+        else:
+            cost += PAGE_BASE_COST + text_len / CHARS_PER_COST + IMAGE_COST * img_count
+    return len(areas), cost
+
+def _estimate_file_cost_or_default(file_path):
+    try:
+        return estimate_file_cost(file_path), None
+    except Exception as e:
+        # Treat as 1 page if we can't determine
+        return (1, PAGE_BASE_COST + 1.0), str(e)
+
+def scan_file_costs(file_paths, cache_path=None, workers=None):
+    """
+    Page count and cost of every file, see estimate_file_cost
     
-    groups = []
-    current_group = []
-    current_page_count = 0
+    Files are scanned in parallel processes, and the results are kept in
+    cache_path (JSON) by path, size and modification time so that reruns on the
+    same folder only scan new or changed files.
     
-    for file_path in file_paths:
+    Returns:
+        {file_path: (page_count, cost)}
+    """
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
         try:
-            # Get page count for this file
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if file_ext == '.pdf':
-                with fitz.open(file_path) as doc:
-                    file_page_count = len(doc)
-            else:
-                # Images have 1 page
-                file_page_count = 1
-            
-            # Check if adding this file would exceed the limit
-            if current_page_count + file_page_count > max_pages_per_group and current_group:
-                # Start a new group
-                groups.append(current_group)
-                current_group = [file_path]
-                current_page_count = file_page_count
-            else:
-                # Add to current group
-                current_group.append(file_path)
-                current_page_count += file_page_count
-                
-        except Exception as e:
-            print(f"Warning: Could not determine page count for {file_path}: {e}")
-            # Treat as 1 page if we can't determine
-            if current_page_count + 1 > max_pages_per_group and current_group:
-                groups.append(current_group)
-                current_group = [file_path]
-                current_page_count = 1
-            else:
-                current_group.append(file_path)
-                current_page_count += 1
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read the file scan cache {cache_path}: {e}")
     
-    # Add the last group if not empty
-    if current_group:
-        groups.append(current_group)
+    results = {}
+    to_scan = []
+    stamps = {}
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        stamps[file_path] = [stat.st_size, stat.st_mtime_ns]
+        entry = cache.get(os.path.abspath(file_path))
+        if entry is not None and entry['stamp'] == stamps[file_path]:
+            results[file_path] = (entry['pages'], entry['cost'])
+        else:
+            to_scan.append(file_path)
     
-    return groups
+    if to_scan:
+        start_time = time.time()
+        workers = workers or min(len(to_scan), os.cpu_count() or 1)
+        # fitz holds the GIL, so only processes scan in parallel
+        if workers > 1 and len(to_scan) > 4:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                scanned = list(pool.map(_estimate_file_cost_or_default, to_scan, chunksize=max(1, len(to_scan) // (workers * 4))))
+        else:
+            scanned = [_estimate_file_cost_or_default(file_path) for file_path in to_scan]
+        
+        for file_path, ((pages, cost), error) in zip(to_scan, scanned):
+            results[file_path] = (pages, cost)
+            if error is not None:
+                print(f"Warning: Could not determine page count for {file_path}: {error}")
+                continue
+            cache[os.path.abspath(file_path)] = {'stamp': stamps[file_path], 'pages': pages, 'cost': round(cost, 4)}
+        print(f"Scanned {len(to_scan)} files in {time.time() - start_time:.2f}s ({len(file_paths) - len(to_scan)} from cache)")
+        
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, cache_path)
+    
+    return results
+
+def create_file_groups_by_page_count(file_paths, max_pages_per_group, cache_path=None):
+    """
+    Create file groups based on total page count limit
+    
+    Files are packed first-fit decreasing by estimated recognition cost, so
+    that the groups carry a similar load: every group holds at most
+    max_pages_per_group pages and about max_pages_per_group average pages of
+    cost. A file over the limits gets a group of its own.
+    
+    Args:
+        file_paths: List of file paths
+        max_pages_per_group: Maximum total pages per group
+        cache_path: JSON file caching the page counts and costs, see scan_file_costs
+        
+    Returns:
+        List of file groups, heaviest first, files in their input order within a group
+    """
+    if not file_paths:
+        return []
+    
+    costs = scan_file_costs(file_paths, cache_path)
+    total_pages = sum(pages for pages, _ in costs.values())
+    total_cost = sum(cost for _, cost in costs.values())
+    max_cost_per_group = max_pages_per_group * total_cost / max(total_pages, 1)
+    
+    order = {file_path: i for i, file_path in enumerate(file_paths)}
+    groups = []  # [pages, cost, files]
+    for file_path in sorted(file_paths, key=lambda path: (-costs[path][1], order[path])):
+        pages, cost = costs[file_path]
+        for group in groups:
+            if group[0] + pages <= max_pages_per_group and group[1] + cost <= max_cost_per_group:
+                break
+        else:
+            group = [0, 0.0, []]
+            groups.append(group)
+        group[0] += pages
+        group[1] += cost
+        group[2].append(file_path)
+    
+    groups.sort(key=lambda group: -group[1])
+    print(f"Group costs from {groups[-1][1]:.1f} to {groups[0][1]:.1f} (limit {max_cost_per_group:.1f}), "
+              f"pages from {min(group[0] for group in groups)} to {max(group[0] for group in groups)}")
+    return [sorted(group[2], key=order.get) for group in groups]
 
 def parse_multi_file_group(file_paths, output_dir, MonkeyOCR_model, base_folder_path, split_pages=False, pred_abandon=False):
     """
@@ -265,7 +556,7 @@ def parse_multi_file_group(file_paths, output_dir, MonkeyOCR_model, base_folder_
                 os.makedirs(page_local_md_dir, exist_ok=True)
                 
                 # Create page-specific writers
-                page_image_writer = FileBasedDataWriter(page_local_image_dir)
+                page_image_writer = BufferedDataWriter(FileBasedDataWriter(page_local_image_dir))
                 page_md_writer = FileBasedDataWriter(page_local_md_dir)
                 
                 # Pipeline processing for this page
@@ -280,7 +571,7 @@ def parse_multi_file_group(file_paths, output_dir, MonkeyOCR_model, base_folder_
                 page_pipe_result.dump_middle_json(page_md_writer, f'{file_name}_page_{page_idx}_middle.json')
         else:
             # Create file-specific writers
-            file_image_writer = FileBasedDataWriter(file_local_image_dir)
+            file_image_writer = BufferedDataWriter(FileBasedDataWriter(file_local_image_dir))
             file_md_writer = FileBasedDataWriter(file_local_md_dir)
             
             # Pipeline processing for this file
@@ -497,7 +788,8 @@ def single_task_recognition(input_file, output_dir, MonkeyOCR_model, task):
     except Exception as e:
         raise RuntimeError(f"Single task recognition failed: {str(e)}")
 
-def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_abandon=False):
+def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_abandon=False, trace=False, otlp_endpoint=None,
+               profile=False):
     """
     Parse PDF or image and save results
     
@@ -506,6 +798,55 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
         output_dir: Output directory
         MonkeyOCR_model: Pre-initialized model instance
         split_pages: Whether to split result by pages
+        trace: Write a Chrome trace (chrome://tracing, Perfetto) of the parsing next to the results
+        otlp_endpoint: Also send the trace to this OTLP/HTTP collector, e.g. http://localhost:4318
+        profile: Write per-stage cProfile stats and tracemalloc snapshots into <results>/profile
+    """
+    if not trace and not otlp_endpoint and not profile:
+        return _parse_file(input_file, output_dir, MonkeyOCR_model, split_pages, pred_abandon)
+    
+    name_without_suff = '.'.join(os.path.basename(input_file).split(".")[:-1])
+    with ExitStack() as stack:
+        if trace or otlp_endpoint:
+            doc_trace = stack.enter_context(tracing.trace(name_without_suff, file=input_file))
+        if profile:
+            doc_profile = stack.enter_context(profiling.profile(name_without_suff))
+        result_dir = _parse_file(input_file, output_dir, MonkeyOCR_model, split_pages, pred_abandon)
+    
+    if profile:
+        summary_path = doc_profile.write(os.path.join(result_dir, "profile"))
+        print("Profile saved to ", os.path.dirname(summary_path))
+        with open(summary_path, 'r', encoding='utf-8') as f:
+            print(f.read())
+    if trace:
+        trace_path = doc_trace.write_chrome(os.path.join(result_dir, f"{name_without_suff}_trace.json"))
+        print("Trace saved to ", trace_path)
+    if otlp_endpoint:
+        try:
+            doc_trace.export_otlp(otlp_endpoint)
+        except Exception as e:
+            print(f"Warning: failed to export the trace to {otlp_endpoint}: {e}")
+    return result_dir
+
+def _parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_abandon=False):
+    job = _prepare_file(input_file, output_dir, MonkeyOCR_model, split_pages, pred_abandon)
+    if job['ds'] is None:
+        return job['local_md_dir']
+    _analyze_file(job, MonkeyOCR_model)
+    return _finish_file(job, MonkeyOCR_model)
+
+def _prepare_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_abandon=False, prerender=None):
+    """
+    Read the file and build its dataset, the first stage of _parse_file
+    
+    Args:
+        prerender: Semaphore of the pages that may be rendered ahead, so that
+            doc_analyze_llm finds them ready. Every rendered page takes one,
+            job['prerendered'] counts them and the caller releases them.
+    
+    Returns:
+        The job passed on to _analyze_file and _finish_file, job['ds'] is None
+        when the results were restored from the result cache
     """
     print(f"Starting to parse file: {input_file}")
     
@@ -519,30 +860,82 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
     # Prepare output directory
     local_image_dir = os.path.join(output_dir, name_without_suff, "images")
     local_md_dir = os.path.join(output_dir, name_without_suff)
-    image_dir = os.path.basename(local_image_dir)
     os.makedirs(local_image_dir, exist_ok=True)
     os.makedirs(local_md_dir, exist_ok=True)
     
     print(f"Output dir: {local_md_dir}")
-    image_writer = FileBasedDataWriter(local_image_dir)
-    md_writer = FileBasedDataWriter(local_md_dir)
+    job = {
+        'name': name_without_suff,
+        'output_dir': output_dir,
+        'local_image_dir': local_image_dir,
+        'local_md_dir': local_md_dir,
+        'split_pages': split_pages,
+        'pred_abandon': pred_abandon,
+        'cache_key': None,
+        'ds': None,
+        'prerendered': 0,
+    }
     
     # Read file content
     reader = FileBasedDataReader()
     file_bytes = reader.read(input_file)
     
+    # Documents already parsed with the same config are served from the result cache
+    result_cache = MonkeyOCR_model.result_cache
+    if result_cache is not None:
+        job['cache_key'] = result_cache.make_key(file_bytes, split_pages=split_pages, pred_abandon=pred_abandon)
+        cached_files = result_cache.get(job['cache_key'], name_without_suff)
+        if cached_files is not None:
+            with BufferedDataWriter(FileBasedDataWriter(local_md_dir)) as cache_writer:
+                for path, data in cached_files.items():
+                    cache_writer.write(path, data)
+            print("Results restored from the result cache to ", local_md_dir)
+            return job
+    
     # Create dataset instance
     file_extension = input_file.split(".")[-1].lower()
-    if file_extension == "pdf":
-        ds = PymuDocDataset(file_bytes)
-    else:
-        ds = ImageDataset(file_bytes)
+    with fitz_lock:
+        if file_extension == "pdf":
+            ds = PymuDocDataset(file_bytes)
+        else:
+            ds = ImageDataset(file_bytes)
+    
+    if prerender is not None:
+        try:
+            # Pages beyond the budget are rendered by doc_analyze_llm
+            for page in ds:
+                if not prerender.acquire(blocking=False):
+                    break
+                job['prerendered'] += 1
+                page.prerender()
+        except Exception:
+            prerender.release(job['prerendered'])
+            raise
     
+    job['ds'] = ds
+    return job
+
+def _analyze_file(job, MonkeyOCR_model):
+    """Run the models on the dataset of a prepared job, the GPU stage of _parse_file"""
     # Start inference
-    print("Performing document parsing...")
-    start_time = time.time()
+    print(f"Performing document parsing: {job['name']}")
+    job['start_time'] = time.time()
     
-    infer_result = ds.apply(doc_analyze_llm, MonkeyOCR_model=MonkeyOCR_model, split_pages=split_pages, pred_abandon=pred_abandon)
+    job['infer_result'] = job['ds'].apply(doc_analyze_llm, MonkeyOCR_model=MonkeyOCR_model,
+                                          split_pages=job['split_pages'], pred_abandon=job['pred_abandon'])
+    return job
+
+def _finish_file(job, MonkeyOCR_model):
+    """Post-process an analyzed job and save its results, the last stage of _parse_file"""
+    name_without_suff = job['name']
+    local_md_dir = job['local_md_dir']
+    image_dir = os.path.basename(job['local_image_dir'])
+    infer_result = job['infer_result']
+    
+    image_writer = BufferedDataWriter(FileBasedDataWriter(job['local_image_dir']))
+    md_writer = FileBasedDataWriter(local_md_dir)
+    # files of this document below local_md_dir, the entry of the result cache
+    result_paths = []
     
     # Check if infer_result is a list type
     if isinstance(infer_result, list):
@@ -551,8 +944,8 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
         # Process each page result separately
         for page_idx, page_infer_result in enumerate(infer_result):
             page_dir_name = f"page_{page_idx}"
-            page_local_image_dir = os.path.join(output_dir, name_without_suff, page_dir_name, "images")
-            page_local_md_dir = os.path.join(output_dir, name_without_suff, page_dir_name)
+            page_local_image_dir = os.path.join(job['output_dir'], name_without_suff, page_dir_name, "images")
+            page_local_md_dir = os.path.join(job['output_dir'], name_without_suff, page_dir_name)
             page_image_dir = os.path.basename(page_local_image_dir)
             
             # Create page-specific directories
@@ -560,7 +953,7 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
             os.makedirs(page_local_md_dir, exist_ok=True)
             
             # Create page-specific writers
-            page_image_writer = FileBasedDataWriter(page_local_image_dir)
+            page_image_writer = BufferedDataWriter(FileBasedDataWriter(page_local_image_dir))
             page_md_writer = FileBasedDataWriter(page_local_md_dir)
             
             print(f"Processing page {page_idx} - Output dir: {page_local_md_dir}")
@@ -569,12 +962,18 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
             page_pipe_result = page_infer_result.pipe_ocr_mode(page_image_writer, MonkeyOCR_model=MonkeyOCR_model)
             
             # Save page-specific results
-            page_infer_result.draw_model(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_model.pdf"))
-            page_pipe_result.draw_layout(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_layout.pdf"))
-            page_pipe_result.draw_span(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_spans.pdf"))
-            page_pipe_result.dump_md(page_md_writer, f"{name_without_suff}_page_{page_idx}.md", page_image_dir)
-            page_pipe_result.dump_content_list(page_md_writer, f"{name_without_suff}_page_{page_idx}_content_list.json", page_image_dir)
-            page_pipe_result.dump_middle_json(page_md_writer, f'{name_without_suff}_page_{page_idx}_middle.json')
+            with tracing.span('draw', page=page_idx):
+                page_infer_result.draw_model(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_model.pdf"))
+                page_pipe_result.draw_layout(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_layout.pdf"))
+                page_pipe_result.draw_span(os.path.join(page_local_md_dir, f"{name_without_suff}_page_{page_idx}_spans.pdf"))
+            with tracing.span('dump', page=page_idx):
+                page_pipe_result.dump_md(page_md_writer, f"{name_without_suff}_page_{page_idx}.md", page_image_dir)
+                page_pipe_result.dump_content_list(page_md_writer, f"{name_without_suff}_page_{page_idx}_content_list.json", page_image_dir)
+                page_pipe_result.dump_middle_json(page_md_writer, f'{name_without_suff}_page_{page_idx}_middle.json')
+            result_paths += [
+                f'{page_dir_name}/{path}'
+                for path in _result_paths(f'{name_without_suff}_page_{page_idx}', page_pipe_result, page_image_dir)
+            ]
         
         print(f"All {len(infer_result)} pages processed and saved in separate subdirectories")
     else:
@@ -584,24 +983,50 @@ def parse_file(input_file, output_dir, MonkeyOCR_model, split_pages=False, pred_
         pipe_result = infer_result.pipe_ocr_mode(image_writer, MonkeyOCR_model=MonkeyOCR_model)
         
         # Save single result (original logic)
-        infer_result.draw_model(os.path.join(local_md_dir, f"{name_without_suff}_model.pdf"))
-        
-        pipe_result.draw_layout(os.path.join(local_md_dir, f"{name_without_suff}_layout.pdf"))
+        with tracing.span('draw'):
+            infer_result.draw_model(os.path.join(local_md_dir, f"{name_without_suff}_model.pdf"))
+            
+            pipe_result.draw_layout(os.path.join(local_md_dir, f"{name_without_suff}_layout.pdf"))
 
-        pipe_result.draw_span(os.path.join(local_md_dir, f"{name_without_suff}_spans.pdf"))
+            pipe_result.draw_span(os.path.join(local_md_dir, f"{name_without_suff}_spans.pdf"))
 
-        pipe_result.dump_md(md_writer, f"{name_without_suff}.md", image_dir)
-        
-        pipe_result.dump_content_list(md_writer, f"{name_without_suff}_content_list.json", image_dir)
+        with tracing.span('dump'):
+            pipe_result.dump_md(md_writer, f"{name_without_suff}.md", image_dir)
+            
+            pipe_result.dump_content_list(md_writer, f"{name_without_suff}_content_list.json", image_dir)
 
-        pipe_result.dump_middle_json(md_writer, f'{name_without_suff}_middle.json')
+            pipe_result.dump_middle_json(md_writer, f'{name_without_suff}_middle.json')
+        result_paths += _result_paths(name_without_suff, pipe_result, image_dir)
 
-    parsing_time = time.time() - start_time
+    image_writer.flush()
+    parsing_time = time.time() - job['start_time']
     print(f"Parsing and saving time: {parsing_time:.2f}s")
     
+    result_cache = MonkeyOCR_model.result_cache
+    if result_cache is not None:
+        result_cache.put(job['cache_key'], name_without_suff, collect_result_files(local_md_dir, result_paths))
+    
     print("Results saved to ", local_md_dir)
     return local_md_dir
 
+def _result_paths(name, pipe_result, image_dir):
+    """Files _finish_file saves for one result, relative to its directory:
+    the dumps, the drawings and every image the results reference, including
+    images an earlier document wrote already"""
+    paths = [
+        f"{name}_model.pdf", f"{name}_layout.pdf", f"{name}_spans.pdf",
+        f"{name}.md", f"{name}_content_list.json", f"{name}_middle.json",
+    ]
+    return paths + [f"{image_dir}/{path}" for path in pipe_result.get_image_paths()]
+
+def collect_result_files(result_dir, paths):
+    """Contents of the given files below result_dir, by relative path"""
+    files = {}
+    for path in paths:
+        with open(os.path.join(result_dir, path), 'rb') as f:
+            files[path] = f.read()
+    return files
+
 def main():
     parser = argparse.ArgumentParser(
         description="PDF Document Parsing Tool",
@@ -624,6 +1049,8 @@ Usage examples:
   python parse.py /path/to/folder                     # Parse all files in folder
   python parse.py /path/to/folder -s                  # Parse with page splitting
   python parse.py /path/to/folder -t text             # Single task recognition for all files
+  python parse.py /path/to/folder --workers 4         # Prefetch and save files while the next one is analyzed
+  python parse.py /path/to/folder --resume            # Skip files completed by an earlier run
   
   # Multi-file grouping (batch processing by page count)
   python parse.py /path/to/folder -g 5                # Group files with max 5 total pages
@@ -634,6 +1061,8 @@ Usage examples:
   python parse.py input.pdf -c model_configs.yaml     # Custom model configuration
   python parse.py /path/to/folder -g 15 -s -o ./out   # Group files, split pages, custom output
   python parse.py input.pdf --pred-abandon            # Enable predicting abandon elements
+  python parse.py input.pdf --trace                   # Write input_trace.json (open in Perfetto)
+  python parse.py input.pdf --profile                 # Write per-stage CPU / memory profiles
   python parse.py /path/to/folder -g 10 -m            # Group files and merge text blocks in output
         """
     )
@@ -684,6 +1113,38 @@ Usage examples:
         action='store_true',
         help="Enable predicting abandon elements like footer and header (default: False)"
     )
+
+    parser.add_argument(
+        "--trace",
+        action='store_true',
+        help="Write a per-document trace of the parsing stages (<name>_trace.json, Chrome trace / Perfetto format) next to the results"
+    )
+
+    parser.add_argument(
+        "--otlp-endpoint",
+        help="Also send the per-document traces to an OTLP/HTTP collector, e.g. http://localhost:4318"
+    )
+
+    parser.add_argument(
+        "--profile",
+        action='store_true',
+        help="Write per-stage cProfile stats (.pstats) and tracemalloc top allocations of every document into <results>/profile"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Post-processing threads when parsing a folder file by file. Above 1, the next files are read and rendered "
+             "and the finished ones saved while the current file is analyzed (default: 1, one file at a time)"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action='store_true',
+        help="When processing folders, skip the files an earlier run into the same output directory completed "
+             "with the same content, options and config (recorded in <output>/.manifest.jsonl)"
+    )
     
     args = parser.parse_args()
 
@@ -703,7 +1164,12 @@ Usage examples:
                 task = args.task,
                 split_pages = args.split_pages,
                 group_size = args.group_size,
-                pred_abandon = args.pred_abandon
+                pred_abandon = args.pred_abandon,
+                trace = args.trace,
+                otlp_endpoint = args.otlp_endpoint,
+                profile = args.profile,
+                workers = args.workers,
+                resume = args.resume
             )
             
             if args.task:
@@ -735,7 +1201,10 @@ Usage examples:
                     output_dir = args.output,
                     MonkeyOCR_model = MonkeyOCR_model,
                     split_pages = args.split_pages,
-                    pred_abandon = args.pred_abandon
+                    pred_abandon = args.pred_abandon,
+                    trace = args.trace,
+                    otlp_endpoint = args.otlp_endpoint,
+                    profile = args.profile
                 )
                 print(f"\n✅ Parsing completed! Results saved in: {result_dir}")
         else:
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip('torch')
+transformers = pytest.importorskip('transformers')
+
+from magic_pdf.model.sub_modules.reading_oreder.layoutreader.helpers import (  # noqa: E402
+    INT8_MIN_PARITY, order_parity, parity_pages, quantize_for_cpu)
+
+MODEL_DIR = os.getenv('LAYOUTREADER_MODEL_DIR', os.path.join('model_weight', 'Relation'))
+
+needs_weights = pytest.mark.skipif(not os.path.isdir(MODEL_DIR), reason=f'no layoutreader weights in {MODEL_DIR}')
+
+
+@pytest.fixture(scope='module')
+def eager():
+    return transformers.LayoutLMv3ForTokenClassification.from_pretrained(MODEL_DIR).eval()
+
+
+def test_parity_pages_are_fixed():
+    assert parity_pages() == parity_pages()
+    assert all(0 <= value <= 1000 for boxes in parity_pages() for box in boxes for value in box)
+
+
+@needs_weights
+@pytest.mark.parametrize('num_boxes', [20, 60, 200])
+def test_int8_orders_like_eager(eager, num_boxes):
+    quantized = quantize_for_cpu(transformers.LayoutLMv3ForTokenClassification.from_pretrained(MODEL_DIR).eval())
+    assert order_parity(eager, quantized, parity_pages(num_boxes=num_boxes)) >= INT8_MIN_PARITY
@@ -0,0 +1,115 @@
+import hashlib
+import pickle
+import threading
+
+import boto3
+import pytest
+
+moto = pytest.importorskip('moto')
+
+from magic_pdf.data.data_reader_writer import PrefetchDataReader, S3DataReader, S3DataWriter  # noqa: E402
+from magic_pdf.data.read_api import read_jsonl  # noqa: E402
+from magic_pdf.data.io import s3 as s3_io  # noqa: E402
+
+BUCKET = 'monkeyocr-test'
+ENDPOINT = 'https://s3.us-east-1.amazonaws.com'
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setattr(s3_io, '_s3_clients', {})
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def make_writer():
+    return S3DataWriter('results', BUCKET, 'ak', 'sk', ENDPOINT)
+
+
+def make_reader():
+    return S3DataReader('results', BUCKET, 'ak', 'sk', ENDPOINT)
+
+
+def test_round_trip(bucket):
+    make_writer().write('doc/page.md', b'# title\n')
+    assert make_reader().read('doc/page.md') == b'# title\n'
+    assert make_reader().read_at('doc/page.md', 2, 5) == b'title'
+
+
+def test_clients_are_shared(bucket):
+    make_writer().write('a.txt', b'a')
+    make_reader().read('a.txt')
+    assert len(s3_io._s3_clients) == 1
+
+
+def test_large_objects_are_multipart(bucket, monkeypatch):
+    monkeypatch.setattr(s3_io, 'MULTIPART_THRESHOLD', 5 * 1024 * 1024)
+    monkeypatch.setattr(s3_io, 'MULTIPART_CHUNKSIZE', 5 * 1024 * 1024)
+    data = bytes(range(256)) * (11 * 1024 * 1024 // 256)
+    make_writer().write('big.bin', data)
+
+    head = bucket.head_object(Bucket=BUCKET, Key='results/big.bin')
+    # multipart ETags are the md5 of the part md5s followed by the part count
+    assert head['ETag'].strip('"').endswith('-3')
+    assert hashlib.md5(make_reader().read('big.bin')).digest() == hashlib.md5(data).digest()
+
+
+def test_pickled_writer_gets_a_client(bucket):
+    writer = pickle.loads(pickle.dumps(make_writer()))
+    writer.write('pickled.txt', b'ok')
+    assert make_reader().read('pickled.txt') == b'ok'
+
+
+class CountingReader:
+    """S3 reader that records the keys fetched."""
+
+    def __init__(self):
+        self.reader = make_reader()
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def read(self, key):
+        with self.lock:
+            self.keys.append(key)
+        return self.reader.read(key)
+
+
+def test_prefetch_reads_in_order(bucket):
+    keys = [f'doc_{i}.pdf' for i in range(10)]
+    for key in keys:
+        make_writer().write(key, key.encode())
+    reader = PrefetchDataReader(CountingReader(), prefetch=3)
+    assert [(key, key.encode()) for key in keys] == list(reader.read_iter(keys))
+
+
+def test_prefetch_stops_with_the_consumer(bucket):
+    keys = [f'doc_{i}.pdf' for i in range(10)]
+    for key in keys:
+        make_writer().write(key, key.encode())
+    counting = CountingReader()
+    reads = PrefetchDataReader(counting, prefetch=2).read_iter(keys)
+    assert next(reads) == ('doc_0.pdf', b'doc_0.pdf')
+    reads.close()
+    # the key read and a window of two, nothing after the consumer stopped
+    assert set(counting.keys) <= {'doc_0.pdf', 'doc_1.pdf', 'doc_2.pdf'}
+
+
+def test_read_jsonl_from_s3(bucket):
+    import fitz
+
+    pdfs = []
+    for i in range(3):
+        with fitz.open() as doc:
+            for _ in range(i + 1):
+                doc.new_page()
+            pdfs.append(doc.tobytes())
+        make_writer().write(f'pdfs/{i}.pdf', pdfs[-1])
+    make_writer().write('batch.jsonl', ''.join(
+        f'{{"file_location": "s3://{BUCKET}/results/pdfs/{i}.pdf"}}\n' for i in range(3)).encode())
+
+    s3_reader = make_reader()
+    datasets = read_jsonl(f's3://{BUCKET}/results/batch.jsonl', s3_reader)
+    assert [len(ds) for ds in datasets] == [1, 2, 3]
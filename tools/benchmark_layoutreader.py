@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Parity check and cpu benchmark of the int8 layoutreader against the eager model.
+
+    python tools/benchmark_layoutreader.py -m model_weight/Relation -n 50
+
+Exits with status 1 when fewer reading order positions than --min-parity
+match the eager model. `cpu_optimize: auto` runs the same check on the
+first parity pages when the model is loaded, tests/test_layoutreader_int8.py
+runs it in the test suite.
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from magic_pdf.model.sub_modules.reading_oreder.layoutreader.helpers import (  # noqa: E402
+    INT8_MIN_PARITY, parity_pages, predict_order, quantize_for_cpu)
+
+
+def run(model, pages):
+    start = time.time()
+    orders = [predict_order(model, boxes) for boxes in pages]
+    return orders, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--model-dir', '-m', type=str, default='model_weight/Relation')
+    parser.add_argument('--pages', '-n', type=int, default=50)
+    parser.add_argument('--boxes', '-b', type=int, default=60)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--min-parity', type=float, default=INT8_MIN_PARITY,
+                        help='fraction of reading order positions that must match the eager model')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    from transformers import LayoutLMv3ForTokenClassification
+    eager = LayoutLMv3ForTokenClassification.from_pretrained(args.model_dir).eval()
+    quantized = quantize_for_cpu(LayoutLMv3ForTokenClassification.from_pretrained(args.model_dir).eval())
+
+    pages = parity_pages(args.pages, args.boxes)
+
+    # warm up both models before timing
+    predict_order(eager, pages[0])
+    predict_order(quantized, pages[0])
+
+    eager_orders, eager_time = run(eager, pages)
+    int8_orders, int8_time = run(quantized, pages)
+
+    exact = sum(a == b for a, b in zip(eager_orders, int8_orders))
+    same_pos = sum(x == y for a, b in zip(eager_orders, int8_orders) for x, y in zip(a, b))
+    total_pos = sum(len(a) for a in eager_orders)
+
+    print(f'pages: {args.pages}, boxes per page: {args.boxes}, threads: {torch.get_num_threads()}')
+    print(f'eager: {eager_time:.2f}s ({args.pages / eager_time:.1f} pages/s)')
+    print(f'int8:  {int8_time:.2f}s ({args.pages / int8_time:.1f} pages/s), speedup x{eager_time / int8_time:.2f}')
+    print(f'parity: {exact}/{args.pages} pages identical, {same_pos / total_pos:.2%} positions identical')
+
+    if same_pos / total_pos < args.min_parity:
+        print(f'parity below {args.min_parity:.2%}, keep cpu_optimize: none or auto for this model')
+        sys.exit(1)